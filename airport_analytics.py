@@ -0,0 +1,370 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import matplotlib
+# Графики рисуются в рабочих потоках и только сохраняются в файлы
+matplotlib.use('Agg')
+
+import extract
+import tracing
+from connection import close_pool, print_query_stats
+from report_filter import ReportFilter, add_filter_arguments, filter_from_args
+
+# Сколько задач графа выполняется одновременно
+ANALYTICS_WORKERS = int(os.environ.get('AIRPORT_ANALYTICS_WORKERS', '4'))
+# Ключи готовых артефактов: если данные и код не изменились, артефакт не пересобирается
+ANALYTICS_MANIFEST = os.path.join('exports', 'analytics_manifest.json')
+
+# Модули, через которые проходят данные любого артефакта: выгрузка, подключение,
+# приведение типов, фильтры, кэш запросов и перевод SQL для DuckDB
+COMMON_MODULES = ('extract', 'connection', 'compact_dtypes', 'report_filter', 'query_cache', 'duckdb_backend')
+
+# Артефакты: таблицы базовой выгрузки (extract.EXTRACT_QUERIES) и модули, от которых они зависят
+OUTPUTS = {
+    'report': {'tables': ('airlines', 'airports', 'flights', 'booking_legs'),
+               'modules': COMMON_MODULES + ('db',)},
+    'charts': {'tables': ('airlines', 'airports', 'flights', 'booking_legs'),
+               'modules': COMMON_MODULES + ('import', 'render_cache')},
+    'timeline': {'tables': ('airlines', 'flights'), 'modules': COMMON_MODULES + ('airport_timeline',)},
+}
+
+
+class Task:
+    """Узел графа: функция от результатов зависимостей {имя задачи: результат}"""
+
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+
+    @property
+    def seconds(self):
+        return self.end - self.start if self.end is not None else 0.0
+
+
+def _tables(inputs):
+    """Результаты задач query:<таблица> -> {таблица: DataFrame} для функций extract.py"""
+    return {name.split(':', 1)[1]: df for name, df in inputs.items() if name.startswith('query:')}
+
+
+def _only(inputs):
+    return next(iter(inputs.values()))
+
+
+def _source_hash(module_name):
+    # Модули лежат рядом с этим файлом - путь не зависит от текущей папки
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{module_name}.py"), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def output_keys(outputs, report_filter, options):
+    """
+    Ключи артефактов: версии таблиц, которые они читают, параметры фильтра,
+    настройки и исходный код модулей
+
+    Версии таблиц - те же пробы, что в инкрементальном отчете (db.sheet_probes);
+    если они недоступны, ключ None и артефакт собирается заново.
+    """
+    import db
+    params = report_filter.params()
+    probes = db.sheet_probes(extract.EXTRACT_QUERIES, params)
+    keys = {}
+    for output in outputs:
+        spec = OUTPUTS[output]
+        if not all(table in probes for table in spec['tables']):
+            keys[output] = None
+            continue
+        payload = {
+            'tables': {table: probes[table] for table in spec['tables']},
+            'code': {module: _source_hash(module) for module in spec['modules']},
+            'options': options.get(output),
+        }
+        keys[output] = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+    return keys
+
+
+def _load_manifest():
+    try:
+        with open(ANALYTICS_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest):
+    os.makedirs(os.path.dirname(ANALYTICS_MANIFEST), exist_ok=True)
+    tmp_path = ANALYTICS_MANIFEST + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, ANALYTICS_MANIFEST)
+
+
+def _is_up_to_date(entry, key):
+    return (key is not None and entry is not None and entry.get('key') == key
+            and entry.get('paths') and all(os.path.exists(path) for path in entry['paths']))
+
+
+def build_graph(outputs, report_filter, chart_jobs=1, html_dir='exports'):
+    """
+    Строит граф задач query -> transform -> render/export для выбранных артефактов
+
+    Запросы базовой выгрузки общие: таблица, нужная нескольким артефактам,
+    читается из базы один раз.
+
+    Returns:
+        dict: {имя задачи: Task}
+    """
+    tasks = {}
+    tables = sorted({table for output in outputs for table in OUTPUTS[output]['tables']})
+    for table in tables:
+        tasks[f"query:{table}"] = Task(f"query:{table}",
+                                       lambda inputs, t=table: extract.load_table(t, report_filter=report_filter))
+
+    def add(name, fn, deps):
+        tasks[name] = Task(name, fn, deps)
+
+    def queries(output):
+        return [f"query:{table}" for table in OUTPUTS[output]['tables']]
+
+    if 'report' in outputs:
+        import db
+
+        def export_report(inputs):
+            filename = f"airport_analytics_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            if not db.export_to_excel(_only(inputs), filename):
+                raise RuntimeError("отчет не записан")
+            return [os.path.join('exports', filename)]
+
+        add('transform:report', lambda inputs: extract.report_frames(_tables(inputs)), queries('report'))
+        add('export:report', export_report, ['transform:report'])
+
+    if 'charts' in outputs:
+        # import.py нельзя импортировать обычным import - имя совпадает с ключевым словом
+        charts = importlib.import_module('import')
+
+        def render_charts(inputs):
+            timings = charts.create_visualizations(frames=_only(inputs), jobs=chart_jobs, report_filter=report_filter)
+            return [os.path.join(charts.CHARTS_DIR, stat['file']) for stat in timings.values() if stat['file']]
+
+        add('transform:charts', lambda inputs: extract.chart_frames(_tables(inputs)), queries('charts'))
+        add('render:charts', render_charts, ['transform:charts'])
+
+    if 'timeline' in outputs:
+        import airport_timeline
+
+        def timeline_frame(inputs):
+            if airport_timeline.TIMELINE_MODE == 'aggregated':
+                return {'monthly': extract.timeline_monthly_frame(_tables(inputs))}
+            return {'df': extract.timeline_frame(_tables(inputs))}
+
+        def render_timeline(inputs):
+            airport_timeline.create_correct_timeline(**_only(inputs), export_html=html_dir, report_filter=report_filter)
+            # Дашборд без своей копии plotly.js считается устаревшим
+            return [os.path.join(html_dir, airport_timeline.DASHBOARD_FILE),
+                    os.path.join(html_dir, airport_timeline.PLOTLY_JS_FILE)]
+
+        add('transform:timeline', timeline_frame, queries('timeline'))
+        add('render:timeline', render_timeline, ['transform:timeline'])
+
+    return tasks
+
+
+def _execute(task, inputs, origin):
+    task.start = time.perf_counter() - origin
+    try:
+        with tracing.span(f"dag:{task.name}"):
+            task.result = task.fn(inputs)
+    except Exception as e:
+        task.error = str(e) or type(e).__name__
+        print(f"❌ Задача {task.name}: {task.error}")
+    finally:
+        task.end = time.perf_counter() - origin
+    return task
+
+
+def run_graph(tasks, workers=None):
+    """
+    Выполняет граф: задача запускается, как только готовы все ее зависимости
+
+    Задачи, зависящие от упавшей, не запускаются.
+
+    Returns:
+        float: Общее время выполнения графа
+    """
+    pending = dict(tasks)
+    running = {}
+    done = set()
+    failed = set()
+    origin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or ANALYTICS_WORKERS) as executor:
+        while pending or running:
+            # Отказ зависимости распространяется по цепочке за несколько проходов
+            progressed = True
+            while progressed:
+                progressed = False
+                for task in list(pending.values()):
+                    if any(dep in failed for dep in task.deps):
+                        task.error = "не выполнена зависимость"
+                        failed.add(task.name)
+                    elif all(dep in done for dep in task.deps):
+                        inputs = {dep: tasks[dep].result for dep in task.deps}
+                        running[executor.submit(_execute, task, inputs, origin)] = task
+                    else:
+                        continue
+                    del pending[task.name]
+                    progressed = True
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                (done if task.error is None else failed).add(task.name)
+                # Промежуточные данные освобождаются, когда все потребители уже получили их
+                for dep in task.deps:
+                    if not any(dep in other.deps for other in pending.values()):
+                        tasks[dep].result = None
+    for task in pending.values():
+        task.error = "цикл в графе задач"
+    return time.perf_counter() - origin
+
+
+def critical_path(tasks):
+    """
+    Критический путь по фактическому времени: от задачи, завершившейся последней,
+    назад через зависимость, которая завершилась позже остальных
+    """
+    finished = [task for task in tasks.values() if task.end is not None]
+    if not finished:
+        return []
+    task = max(finished, key=lambda t: t.end)
+    path = [task]
+    while task.deps:
+        deps = [tasks[dep] for dep in task.deps if tasks[dep].end is not None]
+        if not deps:
+            break
+        task = max(deps, key=lambda t: t.end)
+        path.append(task)
+    return path[::-1]
+
+
+def print_graph_report(tasks, elapsed):
+    """Выводит время задач, их статус и критический путь"""
+    print("\n" + "="*80)
+    print("⏱️  ЗАДАЧИ ГРАФА:")
+    print(f"   {'Задача':<22} {'Старт (с)':>10} {'Время (с)':>10}  Статус")
+    for task in sorted(tasks.values(), key=lambda t: (t.start is None, t.start or 0)):
+        start = f"{task.start:.2f}" if task.start is not None else '—'
+        status = '✓' if task.error is None else f"❌ {task.error}"
+        print(f"   {task.name:<22} {start:>10} {task.seconds:>10.2f}  {status}")
+
+    busy = sum(task.seconds for task in tasks.values())
+    print(f"\n   Общее время: {elapsed:.2f} с, сумма задач: {busy:.2f} с "
+          f"(параллельность {busy / elapsed if elapsed else 0:.1f}x)")
+
+    path = critical_path(tasks)
+    if path:
+        print("\n🧭 КРИТИЧЕСКИЙ ПУТЬ:")
+        for task in path:
+            print(f"   {task.name:<22} {task.seconds:>8.2f} с")
+        print(f"   {'итого':<22} {sum(task.seconds for task in path):>8.2f} с")
+
+
+def run(outputs, report_filter=None, workers=None, force=False, chart_jobs=1, html_dir='exports'):
+    """
+    Строит выбранные артефакты одним графом задач
+
+    Args:
+        outputs (list): Артефакты: 'report', 'charts', 'timeline'
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+        workers (int): Сколько задач выполнять одновременно
+        force (bool): Пересобрать артефакты, даже если данные и код не изменились
+        chart_jobs (int): Число процессов для отрисовки графиков
+        html_dir (str): Папка для HTML-дашборда анимаций
+
+    Returns:
+        bool: Все артефакты собраны без ошибок
+    """
+    report_filter = report_filter or ReportFilter()
+    print("🚀 ЗАПУСК ГРАФА ЗАДАЧ...")
+    print(f"🔎 Фильтр: {report_filter.describe()}")
+    print("="*80)
+
+    import airport_timeline
+    import db
+    import render_cache
+    charts = importlib.import_module('import')
+    options = {
+        'report': {'width_mode': db.WIDTH_MODE},
+        'charts': {'hist_mode': charts.HIST_MODE, 'render_cache': render_cache.CACHE_ENABLED},
+        'timeline': {'mode': airport_timeline.TIMELINE_MODE, 'html_dir': html_dir},
+    }
+    keys = output_keys(outputs, report_filter, options)
+    manifest = _load_manifest()
+    stale = []
+    for output in outputs:
+        entry = manifest.get(output)
+        if not force and _is_up_to_date(entry, keys[output]):
+            print(f"♻️  {output}: данные и код не изменились, используется {', '.join(entry['paths'])}")
+        else:
+            stale.append(output)
+    if not stale:
+        print("\n✅ ВСЕ АРТЕФАКТЫ АКТУАЛЬНЫ")
+        return True
+
+    tasks = build_graph(stale, report_filter, chart_jobs=chart_jobs, html_dir=html_dir)
+    queries = [name for name in tasks if name.startswith('query:')]
+    print(f"\n🧩 Граф: {len(tasks)} задач, общих запросов: {len(queries)} ({', '.join(stale)})")
+    elapsed = run_graph(tasks, workers)
+
+    final_tasks = {'report': 'export:report', 'charts': 'render:charts', 'timeline': 'render:timeline'}
+    for output in stale:
+        task = tasks[final_tasks[output]]
+        if task.error is None:
+            manifest[output] = {'key': keys[output], 'paths': task.result,
+                                'built_at': datetime.now().isoformat(timespec='seconds')}
+            print(f"✓ {output}: {', '.join(task.result) or 'нет файлов'}")
+    _save_manifest(manifest)
+
+    print_graph_report(tasks, elapsed)
+    return all(task.error is None for task in tasks.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчет, графики и анимации одним графом задач")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="построить артефакты (без флагов - все)")
+    run_parser.add_argument('--report', action='store_true', help="построить Excel-отчет")
+    run_parser.add_argument('--charts', action='store_true', help="построить статичные графики")
+    run_parser.add_argument('--timeline', action='store_true', help="построить HTML-дашборд анимаций")
+    run_parser.add_argument('--workers', type=int, default=ANALYTICS_WORKERS,
+                            help="сколько задач выполнять одновременно")
+    run_parser.add_argument('--chart-jobs', type=int, default=1,
+                            help="число процессов для отрисовки графиков")
+    run_parser.add_argument('--export-html', metavar='DIR', default='exports',
+                            help="папка для dashboard.html и plotly-<версия>.min.js")
+    run_parser.add_argument('--force', action='store_true',
+                            help="пересобрать артефакты, даже если данные и код не изменились")
+    add_filter_arguments(run_parser)
+    args = parser.parse_args()
+    report_filter = filter_from_args(run_parser, args)
+
+    selected = [name for name in OUTPUTS if getattr(args, name)] or list(OUTPUTS)
+    try:
+        success = run(selected, report_filter=report_filter, workers=max(1, args.workers), force=args.force,
+                      chart_jobs=max(1, args.chart_jobs), html_dir=args.export_html)
+        print_query_stats()
+        tracing.print_trace_summary()
+    finally:
+        close_pool()
+    if not success:
+        raise SystemExit(1)
@@ -0,0 +1,318 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # На Windows модуля resource нет - пиковая память не измеряется
+    resource = None
+
+import connection
+import query_cache
+import tracing
+from connection import get_connection, run_query, close_pool
+from report_filter import ReportFilter
+
+BENCHMARK_DIR = 'benchmarks'
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# Этап считается замедлившимся, если он медленнее базового замера больше чем на порог
+REGRESSION_THRESHOLD = float(os.environ.get('AIRPORT_BENCH_THRESHOLD', '0.2'))
+# Изменения быстрее этого значения (в секундах) считаются шумом
+MIN_REGRESSION_SECONDS = 0.05
+# Отдельная база для --generate: генератор очищает в ней все таблицы
+BENCH_DB = os.environ.get('AIRPORT_BENCH_DB')
+# Как часто (в секундах) опрашивается память процесса во время этапа
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+def bench_db_error(db_name):
+    """Текст ошибки, если база для --generate не задана или совпадает с рабочей (AIRPORT_DB_NAME)"""
+    if not db_name:
+        return "--generate очищает таблицы базы: укажите отдельную базу через --db-name или AIRPORT_BENCH_DB"
+    if db_name == connection.DB_CONFIG['database']:
+        return f"база для замеров {db_name} совпадает с AIRPORT_DB_NAME - ее таблицы были бы очищены"
+    return None
+
+
+def process_peak_rss_mb():
+    """Пиковый объем памяти процесса с его запуска в MB (ru_maxrss: KB в Linux, байты в macOS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.uname().sysname == 'Darwin':
+        peak /= 1024
+    return peak / 1024
+
+
+class RssSampler:
+    """
+    Пиковая память за время этапа: фоновый поток опрашивает текущий RSS
+
+    Всплески короче RSS_SAMPLE_INTERVAL могут быть пропущены.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = tracing.current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+class StageRunner:
+    """Замеряет этапы: время (минимум и медиана по повторам), пиковую память и число строк"""
+
+    def __init__(self, repeat=1, verbose=False):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = {}
+
+    def measure(self, stage, fn):
+        """
+        Выполняет fn() repeat раз и сохраняет результат замера
+
+        fn возвращает количество обработанных строк или кортеж (строки, результат) - см. counted.
+        Возвращает значение последнего вызова fn, чтобы его можно было передать дальше.
+        peak_rss_mb - пиковая память за время самого этапа (см. RssSampler),
+        process_peak_rss_mb - максимум процесса с запуска (ru_maxrss не сбрасывается).
+        """
+        timings = []
+        value = None
+        with RssSampler() as sampler:
+            for _ in range(self.repeat):
+                output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+                with output:
+                    start = time.perf_counter()
+                    value = fn()
+                    timings.append(time.perf_counter() - start)
+
+        rows = value[0] if isinstance(value, tuple) else value
+        self.results[stage] = {
+            'seconds': min(timings),
+            'median_seconds': statistics.median(timings),
+            'peak_rss_mb': sampler.peak,
+            'process_peak_rss_mb': process_peak_rss_mb(),
+            'rows': int(rows) if isinstance(rows, (int, float)) else None,
+        }
+        print(f"   {stage:<45} {min(timings):>9.3f} с  {self.results[stage]['rows'] or '':>10}")
+        return value
+
+
+def _rows(frames):
+    return sum(len(df) for df in frames.values() if df is not None)
+
+
+def counted(fn, count, *args, **kwargs):
+    """Оборачивает fn для StageRunner.measure: возвращает (число строк, результат fn)"""
+    def stage():
+        result = fn(*args, **kwargs)
+        return count(result), result
+    return stage
+
+
+def run_stages(runner, stages):
+    """Запускает все этапы запросов, преобразований, отрисовки и экспорта"""
+    import db
+    import extract
+    import airport_timeline
+    charts = importlib.import_module('import')
+
+    if 'query' in stages:
+        # Запросы замеряются без фильтра, но с теми же (пустыми) параметрами, что в отчетах
+        params = ReportFilter().params()
+        for name, query in db.REPORT_QUERIES.items():
+            runner.measure(f"query:report:{name}",
+                           lambda q=query, n=name: len(run_query(q, n, params=params, use_cache=False)))
+        for name, query in charts.CHART_QUERIES.items():
+            runner.measure(f"query:chart:{name}",
+                           lambda q=query, n=name: len(run_query(q, n, params=params, use_cache=False)))
+        runner.measure("query:timeline:aggregated",
+                       lambda: len(run_query(airport_timeline.TIMELINE_AGG_QUERY, "timeline",
+                                             params=params, use_cache=False)))
+
+    # Данные для остальных этапов берутся из единой выгрузки
+    base = runner.measure("query:extract:load_base_extract", counted(extract.load_base_extract, _rows))[1]
+
+    report = runner.measure("transform:report_frames", counted(extract.report_frames, _rows, base))[1]
+    chart_data = runner.measure("transform:chart_frames", counted(extract.chart_frames, _rows, base))[1]
+    monthly = runner.measure("transform:timeline_monthly", counted(extract.timeline_monthly_frame, len, base))[1]
+
+    if 'render' in stages:
+        # Графики пишутся во временную папку, чтобы не затереть графики пользователя в charts/
+        charts_dir, charts.CHARTS_DIR = charts.CHARTS_DIR, tempfile.mkdtemp(prefix='airport_bench_charts_')
+        try:
+            for name, _, _, render in charts.CHART_JOBS:
+                df = chart_data.get(name)
+                if df is not None and len(df) > 0:
+                    runner.measure(f"render:savefig:{name}", counted(render, lambda _: len(df), df))
+        finally:
+            shutil.rmtree(charts.CHARTS_DIR, ignore_errors=True)
+            charts.CHARTS_DIR = charts_dir
+
+    if 'export' in stages:
+        runner.measure("export:excel",
+                       counted(db.export_to_excel, lambda _: _rows(report), report, 'benchmark.xlsx'))
+        runner.measure("export:excel_streaming",
+                       counted(db.export_to_excel, lambda _: _rows(report), report, 'benchmark_streaming.xlsx',
+                               streaming=True))
+        for filename in ('benchmark.xlsx', 'benchmark_streaming.xlsx'):
+            path = os.path.join('exports', filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    if 'plotly' in stages:
+        html_dir = tempfile.mkdtemp(prefix='airport_bench_')
+        try:
+            runner.measure("plotly:timeline_dashboard",
+                           counted(airport_timeline.create_correct_timeline, lambda _: len(monthly),
+                                   monthly=monthly, export_html=html_dir))
+        finally:
+            shutil.rmtree(html_dir, ignore_errors=True)
+
+
+def compare_with_baseline(current, baseline, threshold):
+    """
+    Сравнивает замеры с базовыми и возвращает список замедлившихся этапов
+
+    Returns:
+        list: (масштаб, этап, базовое время, текущее время)
+    """
+    regressions = []
+    print(f"\n📏 СРАВНЕНИЕ С БАЗОВЫМ ЗАМЕРОМ (порог {threshold:.0%}):")
+    print(f"   {'Этап':<45} {'База (с)':>9} {'Сейчас (с)':>11} {'Изм.':>8}")
+    for scale, stages in current['scales'].items():
+        base_stages = baseline.get('scales', {}).get(scale)
+        if base_stages is None:
+            print(f"   Масштаб {scale}: нет базового замера")
+            continue
+        print(f"   Масштаб {scale}:")
+        for stage, result in stages.items():
+            base = base_stages.get(stage)
+            if base is None:
+                continue
+            change = (result['seconds'] - base['seconds']) / base['seconds'] if base['seconds'] else 0.0
+            regressed = (change > threshold
+                         and result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS)
+            mark = '❌' if regressed else '  '
+            print(f" {mark}{stage:<45} {base['seconds']:>9.3f} {result['seconds']:>11.3f} {change:>+8.0%}")
+            if regressed:
+                regressions.append((scale, stage, base['seconds'], result['seconds']))
+    return regressions
+
+
+def run_benchmark(scales, stages, repeat=1, generate=False, verbose=False, db_name=None):
+    """
+    Прогоняет этапы на каждом масштабе данных
+
+    Args:
+        scales (list): Объемы данных ('10k', '1M', ...); без generate - одна метка для текущей базы
+        stages (set): Группы этапов: query, render, export, plotly
+        repeat (int): Число повторов каждого этапа
+        generate (bool): Перед каждым масштабом пересоздавать данные через generate_data.py
+        db_name (str): Отдельная база для generate (ее таблицы очищаются); все этапы
+            замеряются на ней. Рабочая база AIRPORT_DB_NAME не принимается
+    """
+    if generate:
+        error = bench_db_error(db_name)
+        if error:
+            raise ValueError(error)
+        close_pool()
+        connection.DB_CONFIG['database'] = db_name
+        print(f"🧪 База для замеров: {db_name}")
+    # Кэш результатов исказил бы замеры запросов
+    query_cache.CACHE_ENABLED = False
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'scales': {},
+    }
+    for scale in scales:
+        print("\n" + "="*80)
+        print(f"🏁 МАСШТАБ: {scale}")
+        if generate:
+            import generate_data
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_data.generate(generate_data.parse_size(scale), target='postgres',
+                                       create_schema=True, truncate=True)
+            with get_connection() as conn, conn.cursor() as cursor:
+                cursor.execute("ANALYZE;")
+        runner = StageRunner(repeat=repeat, verbose=verbose)
+        run_stages(runner, stages)
+        report['scales'][scale] = runner.results
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры производительности отчета, графиков и анимаций")
+    parser.add_argument('--scales', nargs='+', default=['current'],
+                        help="объемы данных (10k 1M 100M); имеют смысл вместе с --generate")
+    parser.add_argument('--generate', action='store_true',
+                        help="перед каждым масштабом загружать синтетические данные (generate_data.py)")
+    parser.add_argument('--stages', nargs='+', default=['query', 'render', 'export', 'plotly'],
+                        choices=['query', 'render', 'export', 'plotly'])
+    parser.add_argument('--repeat', type=int, default=1, help="число повторов каждого этапа")
+    parser.add_argument('--output', help="файл результатов (по умолчанию benchmarks/results_<время>.json)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="файл базового замера для сравнения")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить результат как базовый замер")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="допустимое замедление относительно базового замера (0.2 = 20%%)")
+    parser.add_argument('--verbose', action='store_true', help="не скрывать вывод самих скриптов")
+    parser.add_argument('--db-name', default=BENCH_DB,
+                        help="отдельная база для --generate (AIRPORT_BENCH_DB); ее таблицы очищаются")
+    args = parser.parse_args()
+    if args.generate and bench_db_error(args.db_name):
+        parser.error(bench_db_error(args.db_name))
+
+    try:
+        results = run_benchmark(args.scales, set(args.stages), repeat=max(1, args.repeat),
+                                generate=args.generate, verbose=args.verbose, db_name=args.db_name)
+    finally:
+        close_pool()
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    output = args.output or os.path.join(BENCHMARK_DIR, f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Результаты сохранены: {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"📌 Базовый замер обновлен: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ Замедлились этапы: {len(regressions)}")
+            raise SystemExit(1)
+        print("\n✅ Замедлений относительно базового замера нет")
@@ -0,0 +1,80 @@
+import datetime as dt
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# Приведение результатов запросов к компактным типам включено по умолчанию
+COMPACT_ENABLED = os.environ.get('AIRPORT_COMPACT_DTYPES', '1').lower() in ('1', 'true', 'yes')
+# Текстовая колонка становится категориальной, если уникальных значений
+# не больше этой доли строк...
+CATEGORY_MAX_RATIO = float(os.environ.get('AIRPORT_CATEGORY_MAX_RATIO', '0.5'))
+# ...и в результате не меньше этого числа строк (маленькие таблицы отчета не трогаем)
+CATEGORY_MIN_ROWS = int(os.environ.get('AIRPORT_CATEGORY_MIN_ROWS', '1000'))
+
+
+def memory_bytes(df):
+    """Полный объем памяти DataFrame, включая строки в object-колонках"""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _first_value(series):
+    non_null = series.dropna()
+    return non_null.iloc[0] if len(non_null) else None
+
+
+def _convert_object(series, n_rows):
+    """Подбирает тип для object- или строковой колонки по ее значениям"""
+    sample = _first_value(series)
+    if sample is None:
+        return series
+
+    if isinstance(sample, Decimal):
+        return pd.to_numeric(series, errors='coerce').astype('float64')
+    if isinstance(sample, (dt.datetime, dt.date)):
+        converted = pd.to_datetime(series, errors='coerce')
+        # Значения с часовыми поясами или вне диапазона datetime64 оставляем как есть
+        return converted if converted.notna().sum() == series.notna().sum() else series
+    if isinstance(sample, str) and n_rows >= CATEGORY_MIN_ROWS:
+        if series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * n_rows:
+            # Упорядоченные категории (по алфавиту) сохраняют min/max и сортировку как у строк
+            categories = sorted(series.dropna().unique())
+            return pd.Categorical(series, categories=categories, ordered=True)
+    return series
+
+
+def _downcast_integer(series):
+    """Уменьшает разрядность целых, но не ниже int32 (суммы и счетчики не переполнятся)"""
+    if series.empty:
+        return series
+    low, high = series.min(), series.max()
+    if np.iinfo(np.int32).min <= low and high <= np.iinfo(np.int32).max:
+        return series.astype('int32')
+    return series
+
+
+def compact_dtypes(df):
+    """
+    Приводит колонки DataFrame к компактным типам
+
+    - текст с небольшим числом уникальных значений -> category (упорядоченная)
+    - int64 -> int32, если значения помещаются
+    - Decimal -> float64
+    - даты и время -> datetime64
+
+    Returns:
+        DataFrame: новый DataFrame (исходный не меняется)
+    """
+    n_rows = len(df)
+    columns = {}
+    for name in df.columns:
+        series = df[name]
+        # С pandas 3 текст из запросов приходит строковым типом 'str', а не object
+        if series.dtype == object or isinstance(series.dtype, pd.StringDtype):
+            columns[name] = _convert_object(series, n_rows)
+        elif pd.api.types.is_integer_dtype(series) and series.dtype.itemsize > 4:
+            columns[name] = _downcast_integer(series)
+        else:
+            columns[name] = series
+    return pd.DataFrame(columns, index=df.index, columns=df.columns)
@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from psycopg2 import pool
+
+import compact_dtypes
+import duckdb_backend
+import query_cache
+
+# Источник данных: postgres - рабочая база, duckdb - встроенная аналитическая база
+# над снимком таблиц в Parquet (см. duckdb_backend.py)
+BACKEND = os.environ.get('AIRPORT_BACKEND', 'postgres')
+BACKENDS = ('postgres', 'duckdb')
+if BACKEND not in BACKENDS:
+    raise ValueError(f"Неизвестный AIRPORT_BACKEND: {BACKEND} (ожидается {', '.join(BACKENDS)})")
+
+# Параметры подключения читаются из переменных окружения,
+# значения по умолчанию совпадают с прежними настройками скриптов
+DB_CONFIG = {
+    'host': os.environ.get('AIRPORT_DB_HOST', 'localhost'),
+    'database': os.environ.get('AIRPORT_DB_NAME', 'airport_db'),
+    'user': os.environ.get('AIRPORT_DB_USER', 'postgres'),
+    'password': os.environ.get('AIRPORT_DB_PASSWORD', 'farida'),
+    'port': os.environ.get('AIRPORT_DB_PORT', '5432'),
+}
+
+POOL_MIN_CONN = int(os.environ.get('AIRPORT_DB_POOL_MIN', '1'))
+POOL_MAX_CONN = int(os.environ.get('AIRPORT_DB_POOL_MAX', '8'))
+# Размер пачки строк при потоковом чтении с серверного курсора
+FETCH_BATCH_SIZE = int(os.environ.get('AIRPORT_FETCH_BATCH', '10000'))
+# Читать результаты run_query пачками с серверного курсора вместо fetchall
+STREAM_FETCH = os.environ.get('AIRPORT_STREAM_FETCH', '0').lower() in ('1', 'true', 'yes')
+
+_pool = None
+_pool_lock = threading.Lock()
+# Ограничивает число одновременно выданных подключений: при исчерпании пула
+# потоки ждут освобождения подключения вместо ошибки PoolError
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+
+# Статистика по выполненным запросам: описание, время, количество строк
+QUERY_STATS = []
+_stats_lock = threading.Lock()
+
+
+def get_pool():
+    """Возвращает общий пул подключений (создается при первом обращении)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pool.ThreadedConnectionPool(POOL_MIN_CONN, POOL_MAX_CONN, **DB_CONFIG)
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """
+    Выдает подключение из пула и возвращает его обратно после использования
+
+    При AIRPORT_BACKEND=duckdb выдается подключение к встроенной базе DuckDB.
+    """
+    if BACKEND == 'duckdb':
+        with duckdb_backend.connect() as conn:
+            yield conn
+        return
+
+    db_pool = get_pool()
+    _pool_slots.acquire()
+    try:
+        conn = db_pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            db_pool.putconn(conn)
+    finally:
+        _pool_slots.release()
+
+
+def close_pool():
+    """Закрывает все подключения пула (и встроенную базу DuckDB)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+    duckdb_backend.close()
+
+
+def _record_query_stats(description, elapsed, rows, memory_before=None, memory_after=None):
+    with _stats_lock:
+        QUERY_STATS.append({
+            'description': description,
+            'seconds': elapsed,
+            'rows': rows,
+            'memory_before': memory_before,
+            'memory_after': memory_after,
+        })
+
+
+def _fetch_batches(conn, query, params, batch_size):
+    """Выполняет запрос на именованном (серверном) курсоре и отдает (колонки, строки) пачками"""
+    with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = [desc[0] for desc in cursor.description]
+            yield columns, rows
+
+
+def _fetch_columnar(conn, query, params, batch_size):
+    """
+    Собирает результат серверного курсора в DataFrame по колонкам
+
+    Каждая пачка сразу раскладывается в массивы колонок, а кортежи строк
+    освобождаются, поэтому в памяти одновременно нет полного списка строк
+    и готового DataFrame.
+    """
+    with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        rows = cursor.fetchmany(batch_size)
+        # У именованного курсора описание колонок появляется после первой выборки
+        columns = [desc[0] for desc in cursor.description]
+        chunks = {name: [] for name in columns}
+        while rows:
+            # coerce_float преобразует Decimal в float, как и в обычном режиме
+            batch = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            for name in columns:
+                chunks[name].append(batch[name].to_numpy())
+            del batch
+            rows = cursor.fetchmany(batch_size)
+
+    if not chunks or not chunks[columns[0]]:
+        return pd.DataFrame(columns=columns)
+
+    data = {}
+    for name in columns:
+        parts = chunks.pop(name)
+        data[name] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+    return pd.DataFrame(data, columns=columns)
+
+
+def run_query(query, description, conn=None, params=None, use_cache=None, stream=None, batch_size=None,
+              compact=None):
+    """
+    Выполняет SQL-запрос и возвращает DataFrame, замеряя время выполнения
+
+    Args:
+        query (str): Текст SQL-запроса
+        description (str): Название запроса для логов и статистики
+        conn: Открытое подключение (get_connection); если не задано, берется из пула
+        params: Параметры запроса для cursor.execute
+        use_cache (bool): Использовать кэш результатов (по умолчанию AIRPORT_QUERY_CACHE)
+        stream (bool): Читать пачками с серверного курсора (по умолчанию AIRPORT_STREAM_FETCH)
+        batch_size (int): Размер пачки при потоковом чтении (по умолчанию AIRPORT_FETCH_BATCH)
+        compact (bool): Привести колонки к компактным типам (по умолчанию AIRPORT_COMPACT_DTYPES,
+            см. compact_dtypes.py)
+
+    Ошибки не перехватываются - обработка остается на вызывающем коде.
+    """
+    if conn is None:
+        with get_connection() as pooled_conn:
+            return run_query(query, description, conn=pooled_conn, params=params, use_cache=use_cache,
+                             stream=stream, batch_size=batch_size, compact=compact)
+
+    if use_cache is None:
+        use_cache = query_cache.CACHE_ENABLED
+    if compact is None:
+        compact = compact_dtypes.COMPACT_ENABLED
+
+    start = time.perf_counter()
+    if use_cache:
+        # Ошибка кэша (поврежденный индекс, диск, версия данных) не должна ронять запрос
+        try:
+            key = query_cache.cache_key(query, params, context={'backend': BACKEND, 'compact': compact})
+            version = duckdb_backend.data_version() if BACKEND == 'duckdb' else query_cache.data_version(conn)
+            df = query_cache.get(key, version)
+        except Exception as e:
+            print(f"⚠️  Кэш запросов недоступен для '{description}': {e}")
+            if BACKEND == 'postgres':
+                # Ошибка запроса версии данных прерывает транзакцию
+                conn.rollback()
+            use_cache = False
+            df = None
+        if df is not None:
+            _record_query_stats(f"{description} (кэш)", time.perf_counter() - start, len(df),
+                                memory_after=compact_dtypes.memory_bytes(df))
+            return df
+
+    if stream is None:
+        stream = STREAM_FETCH
+
+    if BACKEND == 'duckdb':
+        # DuckDB отдает результат сразу по колонкам - потоковое чтение не нужно
+        df = duckdb_backend.query_df(conn, query, params)
+    elif stream:
+        df = _fetch_columnar(conn, query, params, batch_size or FETCH_BATCH_SIZE)
+    else:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            results = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
+
+        # coerce_float преобразует Decimal в float, как это делает pd.read_sql_query
+        df = pd.DataFrame.from_records(results, columns=columns, coerce_float=True)
+        del results
+
+    memory_before = compact_dtypes.memory_bytes(df)
+    if compact:
+        df = compact_dtypes.compact_dtypes(df)
+    memory_after = compact_dtypes.memory_bytes(df)
+    _record_query_stats(description, time.perf_counter() - start, len(df), memory_before, memory_after)
+
+    if use_cache:
+        try:
+            query_cache.put(key, version, df, description)
+        except Exception as e:
+            # Например, колонки, которые Parquet не умеет сериализовать, или нехватка места
+            print(f"⚠️  Результат '{description}' не сохранен в кэш: {e}")
+    return df
+
+
+def iter_query_batches(query, description, batch_size=None, params=None):
+    """
+    Выполняет запрос на серверном (именованном) курсоре и отдает результат пачками
+
+    Память клиента ограничена размером пачки независимо от числа строк в результате.
+
+    Yields:
+        tuple: (список названий колонок, список кортежей строк)
+    """
+    batch_size = batch_size or FETCH_BATCH_SIZE
+    start = time.perf_counter()
+    total_rows = 0
+    with get_connection() as conn:
+        if BACKEND == 'duckdb':
+            batches = duckdb_backend.fetch_batches(conn, query, params, batch_size)
+        else:
+            batches = _fetch_batches(conn, query, params, batch_size)
+        for columns, rows in batches:
+            total_rows += len(rows)
+            yield columns, rows
+    _record_query_stats(description, time.perf_counter() - start, total_rows)
+
+
+def print_query_stats():
+    """Выводит сводную таблицу по времени выполнения запросов"""
+    if not QUERY_STATS:
+        return
+
+    def kb(value):
+        return f"{value / 1024:.1f}" if value is not None else '—'
+
+    total_time = sum(stat['seconds'] for stat in QUERY_STATS)
+    print("\n⏱️  СТАТИСТИКА ЗАПРОСОВ:")
+    print(f"   {'Запрос':<40} {'Время (с)':>10} {'Строк':>10} {'Память до, KB':>14} {'после, KB':>10}")
+    for stat in sorted(QUERY_STATS, key=lambda s: s['seconds'], reverse=True):
+        print(f"   {stat['description'][:40]:<40} {stat['seconds']:>10.3f} {stat['rows']:>10} "
+              f"{kb(stat['memory_before']):>14} {kb(stat['memory_after']):>10}")
+    measured = [s for s in QUERY_STATS if s['memory_before'] is not None]
+    total_before = sum(s['memory_before'] for s in measured) if measured else None
+    total_after = sum(s['memory_after'] for s in measured) if measured else None
+    print(f"   {'ВСЕГО':<40} {total_time:>10.3f} {sum(s['rows'] for s in QUERY_STATS):>10} "
+          f"{kb(total_before):>14} {kb(total_after):>10}")
@@ -1,129 +1,298 @@
-import psycopg2 
+import argparse
+import hashlib
+import itertools
+import json
 import pandas as pd
 import os
+import re
+import shutil
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.formatting.rule import ColorScaleRule, Rule
 from openpyxl.worksheet.dimensions import DimensionHolder, ColumnDimension
 import numpy as np
 from datetime import datetime
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from connection import get_connection, run_query, iter_query_batches, print_query_stats, close_pool, POOL_MAX_CONN, BACKEND
+import duckdb_backend
+from query_cache import normalize_sql
+from report_filter import ReportFilter, flight_filter, booking_filter, add_filter_arguments, filter_from_args
+from summary import SUMMARY_REPORT_QUERIES
+from tracing import span, print_trace_summary
 
 # Создаем папку для экспорта
 if not os.path.exists('exports'):
     os.makedirs('exports')
 
-def execute_complex_queries(conn):
-    """Выполняет комплексные SQL-запросы для экспорта"""
+# Комплексные SQL-запросы для листов отчета; параметры фильтра - ReportFilter.params()
+REPORT_QUERIES = {
+    'airline_performance': f"""
+    SELECT 
+        al.airline_name as "Авиакомпания",
+        al.airline_country as "Страна",
+        COUNT(f.flight_id) as "Всего рейсов",
+        COUNT(CASE WHEN f.status = 'On Time' THEN 1 END) as "Пунктуальные рейсы",
+        ROUND(COUNT(CASE WHEN f.status = 'On Time' THEN 1 END) * 100.0 / COUNT(f.flight_id), 2) as "Пунктуальность %%",
+        COUNT(CASE WHEN f.status = 'Delayed' THEN 1 END) as "Задержанные рейсы",
+        COUNT(CASE WHEN f.status = 'Cancelled' THEN 1 END) as "Отмененные рейсы",
+        ROUND(AVG(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600), 2) as "Ср. продолжительность (ч)"
+    FROM flights f
+    JOIN airline al ON f.airline_id = al.airline_id
+    WHERE {flight_filter('f')}
+    GROUP BY al.airline_id, al.airline_name, al.airline_country
+    HAVING COUNT(f.flight_id) > 0
+    ORDER BY "Всего рейсов" DESC;
+    """,
     
-    queries = {
-        'airline_performance': """
-        SELECT 
-            al.airline_name as "Авиакомпания",
-            al.airline_country as "Страна",
-            COUNT(f.flight_id) as "Всего рейсов",
-            COUNT(CASE WHEN f.status = 'On Time' THEN 1 END) as "Пунктуальные рейсы",
-            ROUND(COUNT(CASE WHEN f.status = 'On Time' THEN 1 END) * 100.0 / COUNT(f.flight_id), 2) as "Пунктуальность %",
-            COUNT(CASE WHEN f.status = 'Delayed' THEN 1 END) as "Задержанные рейсы",
-            COUNT(CASE WHEN f.status = 'Cancelled' THEN 1 END) as "Отмененные рейсы",
-            ROUND(AVG(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600), 2) as "Ср. продолжительность (ч)"
+    'airport_traffic': f"""
+    WITH legs AS (
+        -- Вылеты и прилеты агрегируются отдельно по аэропорту и авиакомпании, что позволяет
+        -- использовать индексы по каждому полю. flight_id - первичный ключ, поэтому COUNT(*)
+        -- равен числу разных рейсов; рейс с вылетом и прилетом в одном аэропорту учитывается один раз
+        SELECT f.departure_airport_id as airport_id, f.airline_id,
+               COUNT(*) as departures, 0 as arrivals, COUNT(*) as flights_count
         FROM flights f
-        JOIN airline al ON f.airline_id = al.airline_id
-        GROUP BY al.airline_id, al.airline_name, al.airline_country
-        HAVING COUNT(f.flight_id) > 0
-        ORDER BY "Всего рейсов" DESC;
-        """,
-        
-        'airport_traffic': """
-        SELECT 
-            a.airport_name as "Аэропорт",
-            a.city as "Город",
-            a.country as "Страна",
-            COUNT(DISTINCT CASE WHEN f.departure_airport_id = a.airport_id THEN f.flight_id END) as "Рейсы на вылет",
-            COUNT(DISTINCT CASE WHEN f.arrival_airport_id = a.airport_id THEN f.flight_id END) as "Рейсы на прилет",
-            COUNT(DISTINCT f.flight_id) as "Общее количество рейсов",
-            COUNT(DISTINCT al.airline_id) as "Количество авиакомпаний"
-        FROM airport a
-        LEFT JOIN flights f ON a.airport_id = f.departure_airport_id OR a.airport_id = f.arrival_airport_id
-        LEFT JOIN airline al ON f.airline_id = al.airline_id
-        GROUP BY a.airport_id, a.airport_name, a.city, a.country
-        HAVING COUNT(DISTINCT f.flight_id) > 0
-        ORDER BY "Общее количество рейсов" DESC;
-        """,
-        
-        'passenger_activity': """
-        SELECT 
-            p.country_of_residence as "Страна проживания",
-            COUNT(DISTINCT p.passenger_id) as "Количество пассажиров",
-            COUNT(b.booking_id) as "Всего бронирований",
-            COUNT(DISTINCT bf.flight_id) as "Уникальных рейсов",
-            ROUND(COUNT(b.booking_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Ср. бронирований на пассажира",
-            ROUND(COUNT(DISTINCT bf.flight_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Ср. рейсов на пассажира"
-        FROM passengers p
-        JOIN booking b ON p.passenger_id = b.passenger_id
-        JOIN booking_flight bf ON b.booking_id = bf.booking_id
-        GROUP BY p.country_of_residence
-        HAVING COUNT(DISTINCT p.passenger_id) > 1
-        ORDER BY "Всего бронирований" DESC;
-        """,
-        
-        'monthly_statistics': """
+        WHERE {flight_filter('f')}
+        GROUP BY f.departure_airport_id, f.airline_id
+        UNION ALL
+        SELECT f.arrival_airport_id as airport_id, f.airline_id,
+               0 as departures, COUNT(*) as arrivals,
+               COUNT(*) FILTER (WHERE f.departure_airport_id IS DISTINCT FROM f.arrival_airport_id) as flights_count
+        FROM flights f
+        WHERE {flight_filter('f')}
+        GROUP BY f.arrival_airport_id, f.airline_id
+    ),
+    traffic AS (
         SELECT 
-            TO_CHAR(b.created_at, 'YYYY-MM') as "Месяц",
-            TO_CHAR(b.created_at, 'Month YYYY') as "Период",
-            COUNT(DISTINCT b.booking_id) as "Количество бронирований",
-            COUNT(DISTINCT p.passenger_id) as "Уникальные пассажиры",
-            COUNT(DISTINCT bf.flight_id) as "Уникальные рейсы",
-            ROUND(COUNT(DISTINCT b.booking_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Активность пассажиров"
-        FROM booking b
-        JOIN passengers p ON b.passenger_id = p.passenger_id
-        JOIN booking_flight bf ON b.booking_id = bf.booking_id
-        WHERE b.created_at IS NOT NULL
-        GROUP BY "Месяц", "Период"
-        ORDER BY "Месяц";
-        """,
+            l.airport_id,
+            SUM(l.departures)::bigint as departures,
+            SUM(l.arrivals)::bigint as arrivals,
+            SUM(l.flights_count)::bigint as total_flights,
+            COUNT(DISTINCT al.airline_id) as airlines_count
+        FROM legs l
+        LEFT JOIN airline al ON l.airline_id = al.airline_id
+        GROUP BY l.airport_id
+    )
+    SELECT 
+        a.airport_name as "Аэропорт",
+        a.city as "Город",
+        a.country as "Страна",
+        t.departures as "Рейсы на вылет",
+        t.arrivals as "Рейсы на прилет",
+        t.total_flights as "Общее количество рейсов",
+        t.airlines_count as "Количество авиакомпаний"
+    FROM traffic t
+    JOIN airport a ON a.airport_id = t.airport_id
+    ORDER BY "Общее количество рейсов" DESC;
+    """,
+    
+    'passenger_activity': f"""
+    SELECT 
+        p.country_of_residence as "Страна проживания",
+        COUNT(DISTINCT p.passenger_id) as "Количество пассажиров",
+        COUNT(b.booking_id) as "Всего бронирований",
+        COUNT(DISTINCT bf.flight_id) as "Уникальных рейсов",
+        ROUND(COUNT(b.booking_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Ср. бронирований на пассажира",
+        ROUND(COUNT(DISTINCT bf.flight_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Ср. рейсов на пассажира"
+    FROM passengers p
+    JOIN booking b ON p.passenger_id = b.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE {booking_filter()}
+    GROUP BY p.country_of_residence
+    HAVING COUNT(DISTINCT p.passenger_id) > 1
+    ORDER BY "Всего бронирований" DESC;
+    """,
+    
+    'monthly_statistics': f"""
+    SELECT 
+        TO_CHAR(b.created_at, 'YYYY-MM') as "Месяц",
+        TO_CHAR(b.created_at, 'Month YYYY') as "Период",
+        COUNT(DISTINCT b.booking_id) as "Количество бронирований",
+        COUNT(DISTINCT p.passenger_id) as "Уникальные пассажиры",
+        COUNT(DISTINCT bf.flight_id) as "Уникальные рейсы",
+        ROUND(COUNT(DISTINCT b.booking_id) * 1.0 / COUNT(DISTINCT p.passenger_id), 2) as "Активность пассажиров"
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE b.created_at IS NOT NULL
+      AND {booking_filter()}
+    GROUP BY "Месяц", "Период"
+    ORDER BY "Месяц";
+    """,
+    
+    'route_popularity': f"""
+    SELECT 
+        dep.airport_name as "Аэропорт вылета",
+        dep.city as "Город вылета",
+        arr.airport_name as "Аэропорт прилета", 
+        arr.city as "Город прилета",
+        COUNT(f.flight_id) as "Количество рейсов",
+        COUNT(DISTINCT al.airline_id) as "Количество авиакомпаний",
+        ROUND(AVG(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600), 2) as "Ср. время в пути (ч)"
+    FROM flights f
+    JOIN airport dep ON f.departure_airport_id = dep.airport_id
+    JOIN airport arr ON f.arrival_airport_id = arr.airport_id
+    JOIN airline al ON f.airline_id = al.airline_id
+    WHERE {flight_filter('f')}
+    GROUP BY dep.airport_name, dep.city, arr.airport_name, arr.city
+    HAVING COUNT(f.flight_id) > 1
+    ORDER BY "Количество рейсов" DESC
+    LIMIT 50;
+    """
+}
+
+# Максимальное число одновременно выполняемых запросов в параллельном режиме
+REPORT_MAX_WORKERS = int(os.environ.get('AIRPORT_REPORT_WORKERS', '5'))
+
+def _run_report_query(name, query, conn=None, params=None):
+    """Выполняет один запрос отчета; при ошибке возвращает пустой DataFrame"""
+    try:
+        df = run_query(query, name, conn=conn, params=params)
+        print(f"✓ Запрос '{name}': {len(df)} строк")
+        return df
+    except Exception as e:
+        print(f"✗ Ошибка в запросе '{name}': {e}")
+        if conn is not None and BACKEND == 'postgres':
+            # Сбрасываем прерванную транзакцию, чтобы следующие запросы выполнились
+            conn.rollback()
+        # Создаем пустой DataFrame для продолжения работы
+        return pd.DataFrame()
+
+def execute_complex_queries(conn=None, parallel=False, max_workers=None, use_summary=False, queries=None,
+                            report_filter=None):
+    """
+    Выполняет комплексные SQL-запросы для экспорта
+    
+    Args:
+        conn: Подключение для последовательного режима; если не задано, берется из пула
+        parallel (bool): Выполнять запросы одновременно на разных подключениях пула
+        max_workers (int): Максимальное число одновременных запросов
+        use_summary (bool): Читать данные из сводных таблиц (см. summary.py)
+        queries (dict): Выполнить только эти запросы {название_листа: SQL}
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+    """
+    
+    params = (report_filter or ReportFilter()).params()
+    if queries is None:
+        queries = SUMMARY_REPORT_QUERIES if use_summary else REPORT_QUERIES
+    if not queries:
+        return {}
+    
+    with span('report:queries') as stage:
+        if not parallel:
+            results = {name: _run_report_query(name, query, conn, params) for name, query in queries.items()}
+        else:
+            # Каждый поток берет собственное подключение из пула
+            workers = min(max_workers or REPORT_MAX_WORKERS, len(queries), POOL_MAX_CONN)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {name: executor.submit(_run_report_query, name, query, None, params)
+                           for name, query in queries.items()}
+                # Сохраняем порядок листов независимо от порядка завершения запросов
+                results = {name: future.result() for name, future in futures.items()}
+        stage['rows'] = sum(len(df) for df in results.values())
+    return results
+
+# Русские названия для листов
+SHEET_TITLES = {
+    'airline_performance': 'Эффективность авиакомпаний',
+    'airport_traffic': 'Трафик аэропортов', 
+    'passenger_activity': 'Активность пассажиров',
+    'monthly_statistics': 'Месячная статистика',
+    'route_popularity': 'Популярность маршрутов'
+}
+
+# Стили для форматирования заголовков
+HEADER_FILL = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+HEADER_FONT = Font(color="FFFFFF", bold=True, size=12)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), 
+                       top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="center", wrap_text=True)
+
+# Размер пачки строк при потоковой записи листов
+EXPORT_BATCH_SIZE = int(os.environ.get('AIRPORT_EXPORT_BATCH', '10000'))
+
+def _add_conditional_formatting(worksheet, col_letter, n_rows):
+    """Добавляет цветовую шкалу и выделение минимумов/максимумов для числовой колонки"""
+    data_range = f"{col_letter}2:{col_letter}{n_rows + 1}"
+    
+    # Градиентная заливка (зеленый-желтый-красный)
+    color_scale_rule = ColorScaleRule(
+        start_type="min", start_color="FF63BE7B",  # Зеленый
+        mid_type="percentile", mid_value=50, mid_color="FFFFEB84",  # Желтый
+        end_type="max", end_color="FFF8696B"  # Красный
+    )
+    worksheet.conditional_formatting.add(data_range, color_scale_rule)
+    
+    # Выделение максимумов и минимумов
+    if n_rows > 1:
+        # Максимумы - синий
+        max_rule = Rule(type="expression", formula=[f"={col_letter}2=MAX(${col_letter}$2:${col_letter}${n_rows+1})"])
+        max_rule.font = Font(color="FF0000FF", bold=True)  # Синий
+        worksheet.conditional_formatting.add(data_range, max_rule)
         
-        'route_popularity': """
-        SELECT 
-            dep.airport_name as "Аэропорт вылета",
-            dep.city as "Город вылета",
-            arr.airport_name as "Аэропорт прилета", 
-            arr.city as "Город прилета",
-            COUNT(f.flight_id) as "Количество рейсов",
-            COUNT(DISTINCT al.airline_id) as "Количество авиакомпаний",
-            ROUND(AVG(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600), 2) as "Ср. время в пути (ч)"
-        FROM flights f
-        JOIN airport dep ON f.departure_airport_id = dep.airport_id
-        JOIN airport arr ON f.arrival_airport_id = arr.airport_id
-        JOIN airline al ON f.airline_id = al.airline_id
-        GROUP BY dep.airport_name, dep.city, arr.airport_name, arr.city
-        HAVING COUNT(f.flight_id) > 1
-        ORDER BY "Количество рейсов" DESC
-        LIMIT 50;
-        """
-    }
-    
-    dataframes = {}
-    for name, query in queries.items():
-        try:
-            df = pd.read_sql_query(query, conn)
-            dataframes[name] = df
-            print(f"✓ Запрос '{name}': {len(df)} строк")
-        except Exception as e:
-            print(f"✗ Ошибка в запросе '{name}': {e}")
-            # Создаем пустой DataFrame для продолжения работы
-            dataframes[name] = pd.DataFrame()
-    
-    return dataframes
-
-def apply_excel_formatting(writer, dataframes_dict):
-    """Применяет продвинутое форматирование к Excel файлу"""
-    
-    # Стили для форматирования
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True, size=12)
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), 
-                   top=Side(style='thin'), bottom=Side(style='thin'))
-    alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        # Минимумы - зеленый
+        min_rule = Rule(type="expression", formula=[f"={col_letter}2=MIN(${col_letter}$2:${col_letter}${n_rows+1})"])
+        min_rule.font = Font(color="FF00FF00", bold=True)  # Зеленый
+        worksheet.conditional_formatting.add(data_range, min_rule)
+
+# Режим расчета ширины колонок: exact - по всем строкам, sampled - по выборке, off - не задавать
+WIDTH_MODE = os.environ.get('AIRPORT_WIDTH_MODE', 'exact')
+WIDTH_MODES = ('exact', 'sampled', 'off')
+# Начиная с какого числа строк режим sampled использует выборку
+WIDTH_SAMPLE_ROWS = int(os.environ.get('AIRPORT_WIDTH_SAMPLE_ROWS', '10000'))
+
+def _max_text_length(series):
+    """Длина самого длинного текстового представления значений колонки (пустые ячейки - 0)"""
+    series = series.dropna()
+    if series.empty:
+        return 0
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        # Для целых чисел самое длинное значение - минимум или максимум
+        return max(len(str(series.min())), len(str(series.max())))
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        used = series.cat.remove_unused_categories().cat.categories
+        return int(pd.Series(used).astype(str).str.len().max())
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # openpyxl хранит datetime, str() которого включает время
+        return int(series.dt.strftime('%Y-%m-%d %H:%M:%S').str.len().max())
+    return int(series.astype(str).str.len().max())
+
+def compute_column_widths(df, mode=None):
+    """
+    Вычисляет ширину колонок Excel по данным DataFrame
+    
+    Args:
+        df (DataFrame): Данные листа
+        mode (str): exact - по всем значениям, sampled - по случайной выборке
+            из WIDTH_SAMPLE_ROWS строк для больших таблиц, off - ширина не задается
+    
+    Returns:
+        list: Ширины колонок (пустой список в режиме off)
+    """
+    mode = mode or WIDTH_MODE
+    if mode not in WIDTH_MODES:
+        raise ValueError(f"Неизвестный режим ширины колонок: {mode}")
+    if mode == 'off':
+        return []
+    
+    if mode == 'sampled' and len(df) > WIDTH_SAMPLE_ROWS:
+        df = df.sample(n=WIDTH_SAMPLE_ROWS, random_state=0)
+    
+    return [min(max(len(str(col_name)), _max_text_length(df[col_name])) + 3, 50)
+            for col_name in df.columns]
+
+def apply_excel_formatting(writer, dataframes_dict, width_mode=None):
+    """
+    Применяет продвинутое форматирование к Excel файлу
+    
+    Args:
+        writer: pd.ExcelWriter с движком openpyxl
+        dataframes_dict (dict): Словарь {название_листа: DataFrame}
+        width_mode (str): Режим расчета ширины колонок (exact, sampled, off)
+    """
     
     for sheet_name, df in dataframes_dict.items():
         if df.empty:
@@ -135,37 +304,19 @@ def apply_excel_formatting(writer, dataframes_dict):
         # Получаем лист
         worksheet = writer.sheets[sheet_name]
         
-        # Русские названия для листов
-        sheet_titles = {
-            'airline_performance': 'Эффективность авиакомпаний',
-            'airport_traffic': 'Трафик аэропортов', 
-            'passenger_activity': 'Активность пассажиров',
-            'monthly_statistics': 'Месячная статистика',
-            'route_popularity': 'Популярность маршрутов'
-        }
-        
-        worksheet.title = sheet_titles.get(sheet_name, sheet_name)
+        worksheet.title = SHEET_TITLES.get(sheet_name, sheet_name)
         
         # Форматируем заголовки
         for col in range(1, len(df.columns) + 1):
             cell = worksheet.cell(row=1, column=col)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-            cell.alignment = alignment
+            cell.fill = HEADER_FILL
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
         
-        # Автоматическая ширина колонок
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 3, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+        # Автоматическая ширина колонок (считается по DataFrame, а не по ячейкам листа)
+        for col_idx, width in enumerate(compute_column_widths(df, width_mode), 1):
+            worksheet.column_dimensions[get_column_letter(col_idx)].width = width
         
         # Закрепляем первую строку и столбец
         worksheet.freeze_panes = "A2"
@@ -174,37 +325,14 @@ def apply_excel_formatting(writer, dataframes_dict):
         worksheet.auto_filter.ref = worksheet.dimensions
         
         # Условное форматирование для числовых колонок
-        numeric_columns = []
-        for col_idx, col_name in enumerate(df.columns, 1):
-            if df[col_name].dtype in ['int64', 'float64']:
-                numeric_columns.append(col_idx)
+        numeric_columns = _numeric_columns(df)
         
         for col_idx in numeric_columns:
             if col_idx > len(df.columns):
                 continue
                 
             col_letter = worksheet.cell(row=1, column=col_idx).column_letter
-            data_range = f"{col_letter}2:{col_letter}{len(df) + 1}"
-            
-            # Градиентная заливка (зеленый-желтый-красный)
-            color_scale_rule = ColorScaleRule(
-                start_type="min", start_color="FF63BE7B",  # Зеленый
-                mid_type="percentile", mid_value=50, mid_color="FFFFEB84",  # Желтый
-                end_type="max", end_color="FFF8696B"  # Красный
-            )
-            worksheet.conditional_formatting.add(data_range, color_scale_rule)
-            
-            # Выделение максимумов и минимумов
-            if len(df) > 1:
-                # Максимумы - синий
-                max_rule = Rule(type="expression", formula=[f"={col_letter}2=MAX(${col_letter}$2:${col_letter}${len(df)+1})"])
-                max_rule.font = Font(color="FF0000FF", bold=True)  # Синий
-                worksheet.conditional_formatting.add(data_range, max_rule)
-                
-                # Минимумы - зеленый
-                min_rule = Rule(type="expression", formula=[f"={col_letter}2=MIN(${col_letter}$2:${col_letter}${len(df)+1})"])
-                min_rule.font = Font(color="FF00FF00", bold=True)  # Зеленый
-                worksheet.conditional_formatting.add(data_range, min_rule)
+            _add_conditional_formatting(worksheet, col_letter, len(df))
         
         # Добавляем итоговую строку для числовых колонок
         if numeric_columns:
@@ -220,33 +348,201 @@ def apply_excel_formatting(writer, dataframes_dict):
         
         print(f"✓ Лист '{worksheet.title}': {len(df)} строк, {len(df.columns)} колонок")
 
-def export_to_excel(dataframes_dict, filename):
+def _numeric_columns(df):
+    """Номера (с 1) числовых колонок DataFrame"""
+    return [col_idx for col_idx, col_name in enumerate(df.columns, 1)
+            if pd.api.types.is_numeric_dtype(df[col_name]) and not pd.api.types.is_bool_dtype(df[col_name])]
+
+def _detect_numeric_columns(rows):
+    """Номера (с 1) колонок, в которых все непустые значения пачки - числа"""
+    numeric_columns = []
+    for col_idx, values in enumerate(zip(*rows), 1):
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+                           for value in present):
+            numeric_columns.append(col_idx)
+    return numeric_columns
+
+def _column_widths(columns, rows):
+    """Ширины колонок по самому длинному значению (включая заголовок)"""
+    widths = []
+    for col_idx, name in enumerate(columns):
+        max_length = max([len(str(name))] + [len(str(row[col_idx])) for row in rows])
+        widths.append(min(max_length + 3, 50))
+    return widths
+
+def _dataframe_batches(df, batch_size=None):
+    """Отдает строки DataFrame пачками; NaN заменяется на пустую ячейку"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size].astype(object)
+        yield list(chunk.where(chunk.notna(), None).itertuples(index=False, name=None))
+
+def write_streaming_sheet(workbook, sheet_name, columns, batches, numeric_columns=None, widths=None):
+    """
+    Записывает лист в книгу в режиме write-only: строки пишутся по мере поступления,
+    поэтому память не зависит от количества строк
+    
+    Args:
+        workbook: Книга openpyxl, созданная с write_only=True
+        sheet_name (str): Ключ листа (заголовок берется из SHEET_TITLES)
+        columns (list): Названия колонок
+        batches: Итератор пачек строк (списков кортежей)
+        numeric_columns (list): Номера числовых колонок; по умолчанию определяются по первой пачке
+        widths (list): Ширины колонок; по умолчанию оцениваются по первой пачке
+    
+    Returns:
+        int: Количество записанных строк данных (0 - лист не создан)
+    """
+    batches = iter(batches)
+    first_batch = next(batches, [])
+    if not first_batch:
+        return 0
+    
+    if numeric_columns is None:
+        numeric_columns = _detect_numeric_columns(first_batch)
+    if widths is None:
+        widths = _column_widths(columns, first_batch)
+    
+    worksheet = workbook.create_sheet(title=SHEET_TITLES.get(sheet_name, sheet_name))
+    
+    # В режиме write-only ширины и закрепление задаются до записи первой строки
+    for col_idx, width in enumerate(widths, 1):
+        worksheet.column_dimensions[get_column_letter(col_idx)].width = width
+    worksheet.freeze_panes = "A2"
+    
+    # Заголовки с оформлением
+    header = []
+    for name in columns:
+        cell = WriteOnlyCell(worksheet, value=name)
+        cell.fill = HEADER_FILL
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        header.append(cell)
+    worksheet.append(header)
+    
+    n_rows = 0
+    for batch in itertools.chain([first_batch], batches):
+        for row in batch:
+            worksheet.append(row)
+        n_rows += len(batch)
+    
+    # Фильтры, условное форматирование и итоги записываются в конец листа
+    worksheet.auto_filter.ref = f"A1:{get_column_letter(len(columns))}{n_rows + 1}"
+    for col_idx in numeric_columns:
+        _add_conditional_formatting(worksheet, get_column_letter(col_idx), n_rows)
+    
+    if numeric_columns:
+        totals = [None] * len(columns)
+        totals[0] = WriteOnlyCell(worksheet, value="ИТОГО:")
+        totals[0].font = Font(bold=True)
+        for col_idx in numeric_columns:
+            col_letter = get_column_letter(col_idx)
+            cell = WriteOnlyCell(worksheet, value=f"=SUM({col_letter}2:{col_letter}{n_rows + 1})")
+            cell.font = Font(bold=True)
+            totals[col_idx - 1] = cell
+        worksheet.append([])
+        worksheet.append(totals)
+    
+    print(f"✓ Лист '{worksheet.title}': {n_rows} строк, {len(columns)} колонок")
+    return n_rows
+
+def _print_file_stats(filename, full_path, total_sheets, total_rows, total_columns):
+    print(f"\n✅ Создан файл {filename}")
+    print(f"   📊 Листов: {total_sheets}")
+    print(f"   📈 Строк: {total_rows}")
+    print(f"   📋 Колонок: {total_columns}")
+    print(f"   💾 Размер: {os.path.getsize(full_path) / 1024:.1f} KB")
+    print(f"   📁 Путь: {os.path.abspath(full_path)}")
+
+def export_queries_streaming(queries, filename, batch_size=None, width_mode=None, params=None):
+    """
+    Записывает результаты запросов в Excel напрямую с серверного курсора, без DataFrame
+    
+    Args:
+        queries (dict): Словарь {название_листа: SQL}
+        filename (str): Имя файла для сохранения
+        batch_size (int): Размер пачки строк
+        width_mode (str): off - не задавать ширину; иначе оценка по первой пачке
+        params (dict): Параметры запросов (ReportFilter.params())
+    """
+    
+    full_path = f"exports/{filename}"
+    
+    try:
+        with span('report:export_excel_streaming') as stage:
+            workbook = Workbook(write_only=True)
+            total_sheets = total_rows = total_columns = 0
+        
+            for name, query in queries.items():
+                batches = iter_query_batches(query, name, batch_size=batch_size, params=params)
+                try:
+                    first = next(batches, None)
+                    if first is None:
+                        print(f"✓ Запрос '{name}': 0 строк")
+                        continue
+                    columns, first_rows = first
+                    rows = itertools.chain([first_rows], (batch for _, batch in batches))
+                    # До записи строк известна только первая пачка - по ней и оцениваем ширину
+                    widths = [] if (width_mode or WIDTH_MODE) == 'off' else None
+                    n_rows = write_streaming_sheet(workbook, name, columns, rows, widths=widths)
+                    total_sheets += 1
+                    total_rows += n_rows
+                    total_columns += len(columns)
+                except Exception as e:
+                    print(f"✗ Ошибка в запросе '{name}': {e}")
+                finally:
+                    # Возвращаем подключение в пул, даже если лист не дописан
+                    batches.close()
+        
+            workbook.save(full_path)
+            stage['rows'] = total_rows
+            stage['bytes'] = os.path.getsize(full_path)
+        _print_file_stats(filename, full_path, total_sheets, total_rows, total_columns)
+        return True
+        
+    except Exception as e:
+        print(f"❌ Ошибка при создании файла {filename}: {e}")
+        return False
+
+def export_to_excel(dataframes_dict, filename, streaming=False, width_mode=None):
     """
     Экспортирует словарь DataFrame в форматированный Excel файл
     
     Args:
         dataframes_dict (dict): Словарь {название_листа: DataFrame}
         filename (str): Имя файла для сохранения
+        streaming (bool): Писать листы в режиме write-only пачками строк
+        width_mode (str): Режим расчета ширины колонок (exact, sampled, off)
     """
     
     full_path = f"exports/{filename}"
     
     try:
-        with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
-            # Применяем форматирование
-            apply_excel_formatting(writer, dataframes_dict)
-        
         # Статистика файла
         total_sheets = len(dataframes_dict)
         total_rows = sum(len(df) for df in dataframes_dict.values() if not df.empty)
         total_columns = sum(len(df.columns) for df in dataframes_dict.values() if not df.empty)
         
-        print(f"\n✅ Создан файл {filename}")
-        print(f"   📊 Листов: {total_sheets}")
-        print(f"   📈 Строк: {total_rows}")
-        print(f"   📋 Колонок: {total_columns}")
-        print(f"   💾 Размер: {os.path.getsize(full_path) / 1024:.1f} KB")
-        print(f"   📁 Путь: {os.path.abspath(full_path)}")
+        with span('report:export_excel') as stage:
+            if streaming:
+                workbook = Workbook(write_only=True)
+                for sheet_name, df in dataframes_dict.items():
+                    if df.empty:
+                        continue
+                    write_streaming_sheet(workbook, sheet_name, list(df.columns), _dataframe_batches(df),
+                                          numeric_columns=_numeric_columns(df),
+                                          widths=compute_column_widths(df, width_mode))
+                workbook.save(full_path)
+            else:
+                with pd.ExcelWriter(full_path, engine='openpyxl') as writer:
+                    # Применяем форматирование
+                    apply_excel_formatting(writer, dataframes_dict, width_mode=width_mode)
+            stage['rows'] = total_rows
+            stage['bytes'] = os.path.getsize(full_path)
+        
+        _print_file_stats(filename, full_path, total_sheets, total_rows, total_columns)
         
         return True
         
@@ -254,34 +550,283 @@ def export_to_excel(dataframes_dict, filename):
         print(f"❌ Ошибка при создании файла {filename}: {e}")
         return False
 
-def generate_comprehensive_report():
-    """Генерирует комплексный отчет по авиаперевозкам"""
+# Манифест инкрементального режима: последняя книга и отпечатки данных каждого ее листа
+REPORT_MANIFEST = os.path.join('exports', 'report_manifest.json')
+
+# Счетчики изменений таблиц - дешевая проверка, изменились ли данные листа, без выполнения его запроса
+# Счетчики секций (schema_tuning.py --partition) суммируются в родительскую таблицу
+SHEET_PROBE_QUERY = """
+SELECT COALESCE(parent.relname, s.relname) as relname,
+       SUM(s.n_tup_ins), SUM(s.n_tup_upd), SUM(s.n_tup_del)
+FROM pg_stat_user_tables s
+LEFT JOIN pg_inherits i ON i.inhrelid = s.relid
+LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+WHERE COALESCE(parent.relname, s.relname) = ANY(%(tables)s)
+GROUP BY 1;
+"""
+
+# Счетчики pg_stat_user_tables обновляются асинхронно и вне транзакций: только что
+# закоммиченное изменение может быть еще не учтено. Поэтому к ним добавляются
+# транзакционные отметки - число строк и максимальный идентификатор таблицы
+# (как в query_cache.DATA_VERSION_QUERY). Изменение строки без вставки или удаления
+# по-прежнему видно только по счетчикам
+TABLE_MARKERS = {
+    'flights': 'flight_id',
+    'booking': 'booking_id',
+    'booking_flight': None,
+    'passengers': 'passenger_id',
+    'airline': 'airline_id',
+    'airport': 'airport_id',
+}
+
+def _table_markers(cursor, tables):
+    """Число строк и максимальный идентификатор для таблиц из TABLE_MARKERS"""
+    parts = [f"SELECT '{table}', COUNT(*), "
+             f"{f'MAX({TABLE_MARKERS[table]})::bigint' if TABLE_MARKERS[table] else 'NULL::bigint'} FROM {table}"
+             for table in tables if table in TABLE_MARKERS]
+    if not parts:
+        return {}
+    cursor.execute(" UNION ALL ".join(parts))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+def _query_tables(query):
+    """Имена таблиц после FROM/JOIN (имена CTE тоже попадают, но в pg_stat_user_tables их нет)"""
+    return sorted(set(re.findall(r'\b(?:FROM|JOIN)\s+([a-z_][a-z0-9_]*)', query, flags=re.IGNORECASE)))
+
+def sheet_probes(queries, params=None):
+    """
+    Версии данных листов: текст запроса плюс счетчики изменений таблиц, которые он читает,
+    и их отметки TABLE_MARKERS (для DuckDB - число, размер и время изменения файлов снимка)
     
-    print("🚀 ЗАПУСК ГЕНЕРАЦИИ КОМПЛЕКСНОГО ОТЧЕТА...")
-    print("="*80)
+    Returns:
+        dict: {название_листа: версия}; пустой словарь, если счетчики недоступны
+            (тогда все листы перезапрашиваются и сравниваются по отпечаткам)
+    """
+    tables = sorted({table for query in queries.values() for table in _query_tables(query)})
+    try:
+        if BACKEND == 'duckdb':
+            counters = duckdb_backend.table_versions(tables)
+        else:
+            with get_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(SHEET_PROBE_QUERY, {'tables': tables})
+                counters = {row[0]: row[1:] for row in cursor.fetchall()}
+                for table, marker in _table_markers(cursor, tables).items():
+                    counters[table] = counters.get(table, ()) + marker
+    except Exception as e:
+        print(f"⚠️  Счетчики изменений таблиц недоступны: {e}")
+        return {}
     
+    probes = {}
+    for name, query in queries.items():
+        state = [(table, counters[table]) for table in _query_tables(query) if table in counters]
+        payload = normalize_sql(query) + '\n' + repr(sorted((params or {}).items())) + '\n' + repr(state)
+        probes[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+    return probes
+
+def sheet_fingerprint(df):
+    """Отпечаток данных листа: названия колонок и значения всех строк"""
+    digest = hashlib.sha256('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def _load_manifest():
     try:
-        # Подключаемся к базе данных
-        conn = psycopg2.connect( 
-            host="localhost",
-            database="airport_db",
-            user="postgres",
-            password="farida",  
-            port="5432"
-        )
-        print("✓ Подключение к базе данных установлено")
+        with open(REPORT_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_manifest(manifest):
+    tmp_path = REPORT_MANIFEST + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, REPORT_MANIFEST)
+
+def _replace_sheets(full_path, changed, order, width_mode=None):
+    """
+    Пересобирает в готовой книге только измененные листы
+    
+    Args:
+        full_path (str): Книга (копия предыдущего отчета)
+        changed (dict): {название_листа: DataFrame} - листы для пересборки; пустой DataFrame удаляет лист
+        order (list): Итоговый порядок листов; листы не из этого списка удаляются
+    """
+    with pd.ExcelWriter(full_path, engine='openpyxl', mode='a') as writer:
+        book = writer.book
+        for name in changed:
+            title = SHEET_TITLES.get(name, name)
+            if title in book.sheetnames:
+                book.remove(book[title])
         
-        # Выполняем комплексные запросы
-        print("\n📊 ВЫПОЛНЯЕМ SQL-ЗАПРОСЫ...")
-        dataframes = execute_complex_queries(conn)
+        apply_excel_formatting(writer, changed, width_mode=width_mode)
         
-        # Создаем временную метку для имени файла
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"airport_analytics_report_{timestamp}.xlsx"
+        titles = [SHEET_TITLES.get(name, name) for name in order]
+        for worksheet in list(book.worksheets):
+            if worksheet.title not in titles:
+                book.remove(worksheet)
+        for position, title in enumerate(title for title in titles if title in book.sheetnames):
+            book.move_sheet(title, offset=position - book.sheetnames.index(title))
+        book.active = 0
+
+def export_incremental(filename, queries, dataframes=None, parallel=False, max_workers=None, width_mode=None,
+                       report_filter=None):
+    """
+    Строит отчет на основе предыдущего: листы с прежними данными копируются вместе
+    с оформлением, перезапрашиваются и пересобираются только измененные
+    
+    Лист перезапрашивается, если изменились текст его запроса, фильтр или счетчики изменений
+    его таблиц (sheet_probes). Пересобирается он, только если отпечаток новых данных
+    (sheet_fingerprint) отличается от сохраненного в манифесте.
+    
+    Args:
+        filename (str): Имя новой книги
+        queries (dict): Словарь {название_листа: SQL}
+        dataframes (dict): Готовые данные листов; тогда запросы не выполняются и
+            листы сравниваются только по отпечаткам
+        parallel (bool): Выполнять перезапросы параллельно
+        max_workers (int): Максимальное число одновременных запросов
+        width_mode (str): Режим расчета ширины колонок (exact, sampled, off)
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+    """
+    full_path = f"exports/{filename}"
+    format_key = width_mode or WIDTH_MODE
+    
+    manifest = _load_manifest()
+    previous_path = os.path.join('exports', manifest['workbook']) if manifest.get('workbook') else None
+    # Оформление прежних листов можно переиспользовать, только если книга на месте и режим тот же
+    reusable = previous_path is not None and os.path.exists(previous_path) and manifest.get('format') == format_key
+    old_sheets = manifest.get('sheets', {}) if reusable else {}
+    
+    if dataframes is None:
+        probes = sheet_probes(queries, (report_filter or ReportFilter()).params())
+        stale = {name: query for name, query in queries.items()
+                 if name not in old_sheets or probes.get(name) is None
+                 or probes[name] != old_sheets[name].get('probe')}
+        print(f"🔎 Изменились данные листов: {len(stale)} из {len(queries)}")
+        fresh = execute_complex_queries(parallel=parallel, max_workers=max_workers, queries=stale,
+                                        report_filter=report_filter)
+        order = list(queries)
+    else:
+        probes = {}
+        fresh = dataframes
+        order = list(dataframes)
+    
+    sheets = {}
+    changed = {}
+    for name in order:
+        if name not in fresh:
+            sheets[name] = old_sheets[name]
+            continue
+        df = fresh[name]
+        if len(df.columns) == 0:
+            # Запрос завершился ошибкой: лист пропускается, как при полной сборке,
+            # и в манифест не попадает, чтобы в следующий раз запрос повторился
+            changed[name] = df
+            continue
+        sheets[name] = {'probe': probes.get(name), 'fingerprint': sheet_fingerprint(df),
+                        'rows': len(df), 'columns': len(df.columns)}
+        if old_sheets.get(name, {}).get('fingerprint') != sheets[name]['fingerprint']:
+            changed[name] = df
+    
+    try:
+        if not old_sheets:
+            print("🎨 Предыдущего отчета нет - собираем все листы")
+            if not export_to_excel(changed, filename, width_mode=width_mode):
+                return False
+        else:
+            with span('report:export_excel_incremental') as stage:
+                shutil.copy2(previous_path, full_path)
+                if changed:
+                    _replace_sheets(full_path, changed, order, width_mode=width_mode)
+                stage['rows'] = sum(len(df) for df in changed.values())
+                stage['bytes'] = os.path.getsize(full_path)
+            rebuilt = [SHEET_TITLES.get(name, name) for name in changed]
+            print(f"♻️  Листов без изменений: {len(order) - len(changed)}, пересобрано: {len(changed)}"
+                  + (f" ({', '.join(rebuilt)})" if rebuilt else ""))
+            _print_file_stats(filename, full_path, len(sheets), sum(entry['rows'] for entry in sheets.values()),
+                              sum(entry['columns'] for entry in sheets.values()))
+    except Exception as e:
+        print(f"❌ Ошибка при обновлении файла {filename}: {e}")
+        return False
+    
+    _save_manifest({
+        'workbook': filename,
+        'format': format_key,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'sheets': sheets,
+    })
+    return True
+
+def generate_comprehensive_report(parallel=False, max_workers=None, use_summary=False, dataframes=None,
+                                  streaming=False, width_mode=None, incremental=False, report_filter=None):
+    """
+    Генерирует комплексный отчет по авиаперевозкам
+    
+    Args:
+        parallel (bool): Выполнять SQL-запросы отчета параллельно
+        max_workers (int): Максимальное число одновременных запросов
+        use_summary (bool): Строить отчет по сводным таблицам вместо исходных
+        dataframes (dict): Готовые данные листов (например, из extract.report_frames);
+            если заданы, SQL-запросы не выполняются
+        streaming (bool): Писать Excel в режиме write-only; в последовательном режиме
+            строки идут в файл прямо с серверного курсора, минуя DataFrame
+        width_mode (str): Режим расчета ширины колонок (exact, sampled, off)
+        incremental (bool): Строить отчет на основе предыдущего, пересобирая только
+            листы с изменившимися данными (см. export_incremental)
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+            (для dataframes фильтр уже должен быть применен при выгрузке)
+    """
+    
+    report_filter = report_filter or ReportFilter()
+    if use_summary and not report_filter.is_empty:
+        # В сводных таблицах нет отдельных рейсов и бронирований, к которым применим фильтр
+        raise ValueError("Фильтры не поддерживаются для отчета по сводным таблицам (--use-summary)")
+    
+    print("🚀 ЗАПУСК ГЕНЕРАЦИИ КОМПЛЕКСНОГО ОТЧЕТА...")
+    print(f"🔎 Фильтр: {report_filter.describe()}")
+    print("="*80)
+    
+    # Создаем временную метку для имени файла
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"airport_analytics_report_{timestamp}.xlsx"
+    
+    # Последовательный потоковый режим пишет строки прямо с курсора, без DataFrame
+    stream_from_cursor = streaming and dataframes is None and not parallel and not incremental
+    
+    try:
+        if incremental:
+            print("\n♻️  ОБНОВЛЯЕМ ОТЧЕТ ИНКРЕМЕНТАЛЬНО...")
+            queries = SUMMARY_REPORT_QUERIES if use_summary else REPORT_QUERIES
+            success = export_incremental(filename, queries, dataframes=dataframes, parallel=parallel,
+                                         max_workers=max_workers, width_mode=width_mode,
+                                         report_filter=report_filter)
+        elif stream_from_cursor:
+            print("\n📊 ВЫПОЛНЯЕМ SQL-ЗАПРОСЫ И ПИШЕМ EXCEL ПОТОКОМ...")
+            queries = SUMMARY_REPORT_QUERIES if use_summary else REPORT_QUERIES
+            success = export_queries_streaming(queries, filename, width_mode=width_mode,
+                                               params=report_filter.params())
+        elif dataframes is not None:
+            print("\n📊 ИСПОЛЬЗУЕМ ДАННЫЕ ИЗ БАЗОВОЙ ВЫГРУЗКИ...")
+        elif parallel:
+            # Каждый запрос получает собственное подключение из пула
+            print("\n📊 ВЫПОЛНЯЕМ SQL-ЗАПРОСЫ ПАРАЛЛЕЛЬНО...")
+            dataframes = execute_complex_queries(parallel=True, max_workers=max_workers,
+                                                 use_summary=use_summary, report_filter=report_filter)
+        else:
+            # Берем подключение из общего пула
+            with get_connection() as conn:
+                print("✓ Подключение к базе данных установлено")
+                
+                # Выполняем комплексные запросы
+                print("\n📊 ВЫПОЛНЯЕМ SQL-ЗАПРОСЫ...")
+                dataframes = execute_complex_queries(conn, use_summary=use_summary, report_filter=report_filter)
+            print("\n🔒 Подключение возвращено в пул")
         
-        # Экспортируем в Excel с форматированием
-        print("\n🎨 СОЗДАЕМ ФАЙЛ EXCEL С ФОРМАТИРОВАНИЕМ...")
-        success = export_to_excel(dataframes, filename)
+        if not (stream_from_cursor or incremental):
+            # Экспортируем в Excel с форматированием
+            print("\n🎨 СОЗДАЕМ ФАЙЛ EXCEL С ФОРМАТИРОВАНИЕМ...")
+            success = export_to_excel(dataframes, filename, streaming=streaming, width_mode=width_mode)
         
         if success:
             print("\n🎉 ОТЧЕТ УСПЕШНО СОЗДАН!")
@@ -305,10 +850,6 @@ def generate_comprehensive_report():
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
         return False
-    finally:
-        if 'conn' in locals():
-            conn.close()
-            print("\n🔒 Подключение к базе данных закрыто")
 
 # Дополнительная функция для быстрого экспорта отдельных DataFrame
 def quick_export_single_df(df, sheet_name, filename_prefix="quick_export"):
@@ -338,6 +879,35 @@ def quick_export_single_df(df, sheet_name, filename_prefix="quick_export"):
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генерация комплексного Excel-отчета")
+    parser.add_argument('--parallel', action='store_true',
+                        help="выполнять SQL-запросы отчета параллельно")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"максимум одновременных запросов (по умолчанию {REPORT_MAX_WORKERS})")
+    parser.add_argument('--use-summary', action='store_true',
+                        help="читать данные из сводных таблиц (обновляются командой python summary.py)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="писать Excel потоково (write-only), память не зависит от числа строк")
+    parser.add_argument('--width-mode', choices=WIDTH_MODES, default=None,
+                        help=f"расчет ширины колонок (по умолчанию {WIDTH_MODE})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="пересобрать только листы с изменившимися данными на основе предыдущего отчета")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    report_filter = filter_from_args(parser, args)
+    if args.use_summary and not report_filter.is_empty:
+        parser.error("фильтры не поддерживаются вместе с --use-summary")
+    if args.incremental and args.streaming:
+        parser.error("--incremental дописывает листы в готовую книгу и не сочетается с --streaming")
+    
     # Генерируем комплексный отчет
-    generate_comprehensive_report()
+    try:
+        generate_comprehensive_report(parallel=args.parallel, max_workers=args.workers,
+                                      use_summary=args.use_summary, streaming=args.streaming,
+                                      width_mode=args.width_mode, incremental=args.incremental,
+                                      report_filter=report_filter)
+        print_query_stats()
+        print_trace_summary()
+    finally:
+        close_pool()
     
@@ -0,0 +1,261 @@
+import glob
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import duckdb
+except ImportError:
+    # DuckDB нужен только при AIRPORT_BACKEND=duckdb
+    duckdb = None
+
+# Снимок таблиц: <папка>/<таблица>/**/*.parquet (snapshot.py или generate_data.py --target parquet)
+SNAPSHOT_DIR = os.environ.get('AIRPORT_SNAPSHOT_DIR', 'data')
+# По умолчанию DuckDB использует все ядра
+THREADS = int(os.environ.get('AIRPORT_DUCKDB_THREADS', str(os.cpu_count() or 1)))
+# Ограничение памяти DuckDB, например '4GB' (по умолчанию - 80% памяти машины)
+MEMORY_LIMIT = os.environ.get('AIRPORT_DUCKDB_MEMORY_LIMIT')
+
+_database = None
+_lock = threading.Lock()
+
+
+# --- Перевод SQL из диалекта PostgreSQL ---
+
+# Элементы шаблонов TO_CHAR и их аналоги в strftime.
+# 'Month' в PostgreSQL дополняется пробелами до 9 символов, 'FMMonth' - без дополнения
+_TO_CHAR_TOKENS = [
+    ('FMMonth', '%B'),
+    ('Month', None),
+    ('YYYY', '%Y'),
+    ('HH24', '%H'),
+    ('MM', '%m'),
+    ('DD', '%d'),
+    ('MI', '%M'),
+    ('SS', '%S'),
+]
+
+
+def _call_args(sql, open_paren):
+    """
+    Разбирает аргументы вызова функции, sql[open_paren] - открывающая скобка
+
+    Returns:
+        tuple: (список аргументов, индекс после закрывающей скобки)
+    """
+    args = []
+    depth = 0
+    in_string = False
+    arg_start = open_paren + 1
+    for i in range(open_paren, len(sql)):
+        char = sql[i]
+        if char == "'":
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                args.append(sql[arg_start:i].strip())
+                return args, i + 1
+        elif char == ',' and depth == 1:
+            args.append(sql[arg_start:i].strip())
+            arg_start = i + 1
+    raise ValueError(f"Незакрытая скобка в SQL: {sql[open_paren:open_paren + 40]}...")
+
+
+def _rewrite_calls(sql, name, rewrite):
+    """Заменяет каждый вызов функции name(...) на rewrite(*аргументы); вложенные вызовы тоже"""
+    pattern = re.compile(rf'\b{name}\s*\(', re.IGNORECASE)
+    parts = []
+    position = 0
+    while True:
+        match = pattern.search(sql, position)
+        if match is None:
+            parts.append(sql[position:])
+            return ''.join(parts)
+        args, end = _call_args(sql, match.end() - 1)
+        args = [_rewrite_calls(arg, name, rewrite) for arg in args]
+        parts.append(sql[position:match.start()])
+        replacement = rewrite(*args)
+        parts.append(replacement if replacement is not None else sql[match.start():end])
+        position = end
+
+
+def _to_char(value, template):
+    """TO_CHAR(value, 'шаблон') -> strftime(...) с дополнением 'Month' пробелами, как в PostgreSQL"""
+    if not (template.startswith("'") and template.endswith("'")):
+        return None
+    template = template[1:-1]
+    parts = []
+    pattern = ''
+    i = 0
+    while i < len(template):
+        for token, directive in _TO_CHAR_TOKENS:
+            if template.startswith(token, i):
+                break
+        else:
+            token, directive = template[i], template[i].replace('%', '%%')
+        if token == 'Month':
+            if pattern:
+                parts.append(f"strftime({value}, '{pattern}')")
+                pattern = ''
+            parts.append(f"rpad(strftime({value}, '%B'), 9, ' ')")
+        else:
+            pattern += directive
+        i += len(token)
+    if pattern:
+        parts.append(f"strftime({value}, '{pattern}')")
+    return '(' + ' || '.join(parts) + ')'
+
+
+def _extract(argument):
+    """EXTRACT(EPOCH FROM интервал) -> epoch(интервал); остальные поля DuckDB понимает сам"""
+    match = re.match(r'EPOCH\s+FROM\s+(.*)$', argument, flags=re.IGNORECASE | re.DOTALL)
+    return f"epoch({match.group(1)})" if match else None
+
+
+def _width_bucket(value, low, high, buckets):
+    """width_bucket(x, min, max, n) с теми же краевыми значениями 0 и n + 1, что в PostgreSQL"""
+    return (f"(CASE WHEN ({value}) < ({low}) THEN 0 "
+            f"WHEN ({value}) >= ({high}) THEN ({buckets}) + 1 "
+            f"ELSE CAST(floor((({value}) - ({low})) * 1.0 * ({buckets}) / (({high}) - ({low}))) AS INTEGER) + 1 END)")
+
+
+def translate(query, params=None):
+    """
+    Переводит запрос из диалекта PostgreSQL в DuckDB
+
+    - параметры psycopg2 %(name)s -> $name (%s -> ?), %% -> %; неиспользуемые
+      именованные параметры отбрасываются - DuckDB на них ругается
+    - x = ANY($список) -> list_contains($список, x)
+    - TO_CHAR с шаблонами YYYY, MM, DD, HH24, MI, SS, Month, FMMonth -> strftime
+    - EXTRACT(EPOCH FROM ...) -> epoch(...)
+    - width_bucket -> CASE с той же нумерацией интервалов
+    - percentile_cont(p) WITHIN GROUP (ORDER BY x) -> quantile_cont(x, p)
+
+    Returns:
+        tuple: (текст запроса, параметры для duckdb execute)
+    """
+    if params is not None:
+        if isinstance(params, dict):
+            names = set(re.findall(r'%\((\w+)\)s', query))
+            query = re.sub(r'%\((\w+)\)s', r'$\1', query)
+            params = {name: value for name, value in params.items() if name in names}
+        else:
+            query = query.replace('%s', '?')
+            params = list(params)
+        query = query.replace('%%', '%')
+
+    query = re.sub(r'([\w.]+)\s*=\s*ANY\(\s*(\$\w+)\s*\)', r'list_contains(\2, \1)', query)
+    query = _rewrite_calls(query, 'TO_CHAR', _to_char)
+    query = _rewrite_calls(query, 'EXTRACT', _extract)
+    query = _rewrite_calls(query, 'width_bucket', _width_bucket)
+    query = re.sub(r'percentile_cont\s*\(([^()]*)\)\s*WITHIN\s+GROUP\s*\(\s*ORDER\s+BY\s+([^()]+?)\s*\)',
+                   r'quantile_cont(\2, \1)', query, flags=re.IGNORECASE)
+    return query, params
+
+
+# --- Снимок таблиц ---
+
+def _parquet_files(table=None):
+    pattern = os.path.join(SNAPSHOT_DIR, table or '*', '**', '*.parquet')
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def snapshot_tables():
+    """Таблицы снимка: подпапки SNAPSHOT_DIR с Parquet-файлами (служебные папки '_...' пропускаются)"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(name for name in os.listdir(SNAPSHOT_DIR)
+                  if not name.startswith(('_', '.')) and os.path.isdir(os.path.join(SNAPSHOT_DIR, name))
+                  and _parquet_files(name))
+
+
+def table_versions(tables=None):
+    """
+    Версии таблиц снимка по их файлам
+
+    Returns:
+        dict: {таблица: (число файлов, общий размер, время последнего изменения)}
+    """
+    versions = {}
+    for table in tables if tables is not None else snapshot_tables():
+        files = _parquet_files(table)
+        if files:
+            stats = [os.stat(path) for path in files]
+            versions[table] = (len(files), sum(s.st_size for s in stats), max(s.st_mtime_ns for s in stats))
+    return versions
+
+
+def data_version():
+    """Версия всего снимка для кэша результатов запросов"""
+    return hashlib.sha256(repr(sorted(table_versions().items())).encode('utf-8')).hexdigest()[:16]
+
+
+def _get_database():
+    """Встроенная база DuckDB с представлениями над файлами снимка (создается при первом обращении)"""
+    global _database
+    with _lock:
+        if _database is None:
+            if duckdb is None:
+                raise RuntimeError("Для AIRPORT_BACKEND=duckdb нужен пакет duckdb: pip install duckdb")
+            tables = snapshot_tables()
+            if not tables:
+                raise RuntimeError(f"В папке {SNAPSHOT_DIR} нет снимка таблиц "
+                                   f"(см. snapshot.py или generate_data.py --target parquet)")
+
+            config = {'threads': THREADS}
+            if MEMORY_LIMIT:
+                config['memory_limit'] = MEMORY_LIMIT
+            database = duckdb.connect(database=':memory:', config=config)
+            for table in tables:
+                # Список файлов раскрывается при каждом запросе - новый снимок виден без перезапуска
+                files = os.path.join(SNAPSHOT_DIR, table, '**', '*.parquet').replace("'", "''")
+                database.execute(f"CREATE OR REPLACE VIEW {table} AS "
+                                 f"SELECT * FROM read_parquet('{files}', hive_partitioning = false, "
+                                 f"union_by_name = true)")
+            print(f"🦆 DuckDB: {len(tables)} таблиц из снимка {os.path.abspath(SNAPSHOT_DIR)}, потоков: {THREADS}")
+            _database = database
+        return _database
+
+
+@contextmanager
+def connect():
+    """Выдает собственное подключение к общей базе DuckDB (по одному на поток)"""
+    conn = _get_database().cursor()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def close():
+    """Закрывает встроенную базу"""
+    global _database
+    with _lock:
+        if _database is not None:
+            _database.close()
+            _database = None
+
+
+def query_df(conn, query, params=None):
+    """Выполняет запрос PostgreSQL-диалекта в DuckDB и возвращает DataFrame"""
+    sql, values = translate(query, params)
+    return conn.execute(sql, values).df()
+
+
+def fetch_batches(conn, query, params, batch_size):
+    """Отдает результат запроса пачками (колонки, строки), как серверный курсор PostgreSQL"""
+    sql, values = translate(query, params)
+    conn.execute(sql, values)
+    columns = [desc[0] for desc in conn.description]
+    while True:
+        rows = conn.fetchmany(batch_size)
+        if not rows:
+            break
+        yield columns, rows
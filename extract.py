@@ -0,0 +1,355 @@
+import argparse
+import importlib
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from connection import get_connection, run_query, print_query_stats, close_pool
+from report_filter import ReportFilter, flight_filter, booking_filter, add_filter_arguments, filter_from_args
+from tracing import print_trace_summary
+
+# Базовая выгрузка: каждая таблица читается один раз, все отчеты,
+# графики и анимации считаются из нее в памяти.
+# Рейсы и сегменты бронирований ограничиваются тем же ReportFilter, что и запросы отчетов
+EXTRACT_QUERIES = {
+    'airlines': """
+    SELECT airline_id, airline_name, airline_country
+    FROM airline;
+    """,
+
+    'airports': """
+    SELECT airport_id, airport_name, city, country
+    FROM airport;
+    """,
+
+    'flights': f"""
+    SELECT
+        flight_id,
+        flight_no,
+        airline_id,
+        departure_airport_id,
+        arrival_airport_id,
+        status,
+        scheduled_departure,
+        scheduled_arrival
+    FROM flights f
+    WHERE {flight_filter('f')};
+    """,
+
+    # Сегменты бронирований: те же внутренние соединения, что и в запросах отчетов.
+    # has_flight - рейс сегмента есть в таблице flights (без фильтра рейсов: сезонность
+    # соединяется со всеми рейсами, а не только с попавшими в выгрузку 'flights')
+    'booking_legs': f"""
+    SELECT
+        b.booking_id,
+        b.passenger_id,
+        p.country_of_residence,
+        b.created_at,
+        bf.flight_id,
+        EXISTS (SELECT 1 FROM flights fl WHERE fl.flight_id = bf.flight_id) as has_flight
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE {booking_filter()};
+    """
+}
+
+
+def load_base_extract(conn=None, report_filter=None):
+    """
+    Загружает компактную выгрузку фактов за один проход по каждой таблице
+
+    Args:
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+
+    Returns:
+        dict: {'airlines', 'airports', 'flights', 'booking_legs'} -> DataFrame
+    """
+    if conn is None:
+        with get_connection() as pooled_conn:
+            return load_base_extract(pooled_conn, report_filter)
+
+    return {name: load_table(name, conn, report_filter) for name in EXTRACT_QUERIES}
+
+
+def load_table(name, conn=None, report_filter=None):
+    """Загружает одну таблицу выгрузки (EXTRACT_QUERIES[name]) и приводит типы дат"""
+    df = run_query(EXTRACT_QUERIES[name], f"Выгрузка: {name}", conn=conn,
+                   params=(report_filter or ReportFilter()).params())
+    print(f"✓ Выгрузка '{name}': {len(df)} строк")
+
+    if name == 'flights':
+        for column in ('scheduled_departure', 'scheduled_arrival'):
+            df[column] = pd.to_datetime(df[column])
+        df['duration_hours'] = (df['scheduled_arrival'] - df['scheduled_departure']).dt.total_seconds() / 3600
+    elif name == 'booking_legs':
+        df['created_at'] = pd.to_datetime(df['created_at'])
+    return df
+
+
+def _pg_round(values, decimals):
+    """ROUND как в PostgreSQL: половина округляется от нуля"""
+    factor = 10 ** decimals
+    values = np.asarray(values, dtype=float)
+    return np.sign(values) * np.floor(np.abs(values) * factor + 0.5) / factor
+
+
+def _pg_month_name(dates):
+    """Аналог TO_CHAR(..., 'Month'): английское название, дополненное пробелами до 9 символов"""
+    return dates.dt.strftime('%B').str.ljust(9)
+
+
+def _sort_desc(df, column):
+    # Устойчивая сортировка сохраняет исходный порядок при равенстве значений
+    return df.sort_values(column, ascending=False, kind='mergesort').reset_index(drop=True)
+
+
+def _airline_stats(extract):
+    """Рейсы, пунктуальность и длительность по авиакомпаниям"""
+    flights = extract['flights']
+    stats = flights.assign(
+        on_time=flights['status'].eq('On Time'),
+        delayed=flights['status'].eq('Delayed'),
+        cancelled=flights['status'].eq('Cancelled'),
+    ).groupby('airline_id', observed=True).agg(
+        total_flights=('flight_id', 'count'),
+        on_time=('on_time', 'sum'),
+        delayed=('delayed', 'sum'),
+        cancelled=('cancelled', 'sum'),
+        duration_hours=('duration_hours', 'mean'),
+    ).reset_index()
+    return extract['airlines'].merge(stats, on='airline_id', how='inner')
+
+
+def _airport_traffic(extract):
+    """Вылеты, прилеты, уникальные рейсы и авиакомпании по аэропортам"""
+    flights = extract['flights']
+    legs = pd.concat([
+        flights[['departure_airport_id', 'flight_id', 'airline_id']]
+            .rename(columns={'departure_airport_id': 'airport_id'}).assign(is_departure=True),
+        flights[['arrival_airport_id', 'flight_id', 'airline_id']]
+            .rename(columns={'arrival_airport_id': 'airport_id'}).assign(is_departure=False),
+    ], ignore_index=True).dropna(subset=['airport_id'])
+
+    known_airline = legs['airline_id'].isin(extract['airlines']['airline_id'])
+    traffic = pd.DataFrame({
+        'departures': legs[legs['is_departure']].groupby('airport_id', observed=True)['flight_id'].nunique(),
+        'arrivals': legs[~legs['is_departure']].groupby('airport_id', observed=True)['flight_id'].nunique(),
+        'total_flights': legs.groupby('airport_id', observed=True)['flight_id'].nunique(),
+        'airlines_count': legs[known_airline].groupby('airport_id', observed=True)['airline_id'].nunique(),
+    }).fillna(0).astype('int64').reset_index(names='airport_id')
+    return extract['airports'].merge(traffic, on='airport_id', how='inner')
+
+
+def _country_activity(extract):
+    """Пассажиры, сегменты и уникальные рейсы по странам проживания"""
+    return extract['booking_legs'].groupby('country_of_residence', dropna=False, sort=False, observed=True).agg(
+        passengers_count=('passenger_id', 'nunique'),
+        total_bookings=('booking_id', 'count'),
+        unique_flights=('flight_id', 'nunique'),
+    ).reset_index()
+
+
+def report_frames(extract):
+    """Строит DataFrame для всех листов Excel-отчета (те же колонки, что и REPORT_QUERIES в db.py)"""
+    frames = {}
+
+    airlines = _sort_desc(_airline_stats(extract), 'total_flights')
+    frames['airline_performance'] = pd.DataFrame({
+        "Авиакомпания": airlines['airline_name'],
+        "Страна": airlines['airline_country'],
+        "Всего рейсов": airlines['total_flights'],
+        "Пунктуальные рейсы": airlines['on_time'],
+        "Пунктуальность %": _pg_round(airlines['on_time'] * 100.0 / airlines['total_flights'], 2),
+        "Задержанные рейсы": airlines['delayed'],
+        "Отмененные рейсы": airlines['cancelled'],
+        "Ср. продолжительность (ч)": _pg_round(airlines['duration_hours'], 2),
+    })
+
+    traffic = _sort_desc(_airport_traffic(extract), 'total_flights')
+    frames['airport_traffic'] = pd.DataFrame({
+        "Аэропорт": traffic['airport_name'],
+        "Город": traffic['city'],
+        "Страна": traffic['country'],
+        "Рейсы на вылет": traffic['departures'],
+        "Рейсы на прилет": traffic['arrivals'],
+        "Общее количество рейсов": traffic['total_flights'],
+        "Количество авиакомпаний": traffic['airlines_count'],
+    })
+
+    countries = _country_activity(extract)
+    countries = _sort_desc(countries[countries['passengers_count'] > 1], 'total_bookings')
+    frames['passenger_activity'] = pd.DataFrame({
+        "Страна проживания": countries['country_of_residence'],
+        "Количество пассажиров": countries['passengers_count'],
+        "Всего бронирований": countries['total_bookings'],
+        "Уникальных рейсов": countries['unique_flights'],
+        "Ср. бронирований на пассажира": _pg_round(countries['total_bookings'] / countries['passengers_count'], 2),
+        "Ср. рейсов на пассажира": _pg_round(countries['unique_flights'] / countries['passengers_count'], 2),
+    })
+
+    legs = extract['booking_legs'].dropna(subset=['created_at'])
+    monthly = legs.assign(
+        month=legs['created_at'].dt.strftime('%Y-%m'),
+        period=_pg_month_name(legs['created_at']) + ' ' + legs['created_at'].dt.strftime('%Y'),
+    ).groupby(['month', 'period'], observed=True).agg(
+        bookings=('booking_id', 'nunique'),
+        passengers=('passenger_id', 'nunique'),
+        flights=('flight_id', 'nunique'),
+    ).reset_index().sort_values('month', kind='mergesort').reset_index(drop=True)
+    frames['monthly_statistics'] = pd.DataFrame({
+        "Месяц": monthly['month'],
+        "Период": monthly['period'],
+        "Количество бронирований": monthly['bookings'],
+        "Уникальные пассажиры": monthly['passengers'],
+        "Уникальные рейсы": monthly['flights'],
+        "Активность пассажиров": _pg_round(monthly['bookings'] / monthly['passengers'], 2),
+    })
+
+    airports = extract['airports']
+    routes = extract['flights'].merge(
+        airports.add_prefix('dep_'), left_on='departure_airport_id', right_on='dep_airport_id'
+    ).merge(
+        airports.add_prefix('arr_'), left_on='arrival_airport_id', right_on='arr_airport_id'
+    ).merge(extract['airlines'][['airline_id']], on='airline_id')
+    routes = routes.groupby(['dep_airport_name', 'dep_city', 'arr_airport_name', 'arr_city'], dropna=False, observed=True).agg(
+        flights=('flight_id', 'count'),
+        airlines=('airline_id', 'nunique'),
+        duration_hours=('duration_hours', 'mean'),
+    ).reset_index()
+    routes = _sort_desc(routes[routes['flights'] > 1], 'flights').head(50)
+    frames['route_popularity'] = pd.DataFrame({
+        "Аэропорт вылета": routes['dep_airport_name'],
+        "Город вылета": routes['dep_city'],
+        "Аэропорт прилета": routes['arr_airport_name'],
+        "Город прилета": routes['arr_city'],
+        "Количество рейсов": routes['flights'],
+        "Количество авиакомпаний": routes['airlines'],
+        "Ср. время в пути (ч)": _pg_round(routes['duration_hours'], 2),
+    })
+
+    return frames
+
+
+def chart_frames(extract):
+    """Строит DataFrame для всех графиков import.py (те же колонки, что и CHART_QUERIES)"""
+    frames = {}
+    flights = extract['flights']
+
+    status_counts = flights['status'].value_counts(sort=True)
+    frames['status_distribution'] = pd.DataFrame({
+        'status': status_counts.index,
+        'count_flights': status_counts.values,
+        'percentage': _pg_round(status_counts.values * 100.0 / len(flights), 1),
+    })
+
+    airlines = _airline_stats(extract)
+    airlines = _sort_desc(airlines[airlines['total_flights'] >= 5], 'total_flights').head(10)
+    frames['top_airlines'] = pd.DataFrame({
+        'airline_name': airlines['airline_name'],
+        'airline_country': airlines['airline_country'],
+        'total_flights': airlines['total_flights'],
+        'on_time_percent': _pg_round(airlines['on_time'] * 100.0 / airlines['total_flights'], 1),
+    })
+
+    traffic = _sort_desc(_airport_traffic(extract), 'total_flights').head(15)
+    frames['busiest_airports'] = traffic[['airport_name', 'city', 'country', 'total_flights', 'departures', 'arrivals']]
+
+    legs = extract['booking_legs']
+    legs = legs[legs['created_at'].notna() & legs['has_flight'].astype(bool)]
+    frames['seasonality'] = legs.assign(
+        month_num=legs['created_at'].dt.month,
+        month_name=_pg_month_name(legs['created_at']),
+    ).groupby(['month_num', 'month_name'], observed=True).agg(
+        bookings_count=('booking_id', 'nunique'),
+    ).reset_index().sort_values('month_num', kind='mergesort').reset_index(drop=True)
+
+    per_passenger = extract['booking_legs'].groupby('passenger_id', observed=True)['flight_id'].nunique()
+    per_passenger = per_passenger[per_passenger > 0]
+    frames['passenger_activity'] = pd.DataFrame({
+        'passenger_id': per_passenger.index,
+        'flights_count': per_passenger.values,
+    })
+
+    countries = _country_activity(extract)
+    countries = _sort_desc(countries[countries['passengers_count'] >= 3], 'passengers_count')
+    frames['country_activity'] = countries.rename(columns={'country_of_residence': 'country'})[
+        ['country', 'passengers_count', 'unique_flights', 'total_bookings']]
+
+    return frames
+
+
+def timeline_frame(extract, limit=1000):
+    """Строит выборку рейсов для airport_timeline.py (как запрос с LIMIT 1000)"""
+    flights = extract['flights'].merge(extract['airlines'][['airline_id', 'airline_name']], on='airline_id')
+    timeline = flights[['flight_id', 'flight_no', 'airline_name', 'status',
+                        'scheduled_departure', 'scheduled_arrival']].head(limit).copy()
+    timeline['current_year'] = datetime.now().year
+    return timeline
+
+
+def timeline_monthly_frame(extract):
+    """Строит помесячную агрегацию рейсов (как airport_timeline.TIMELINE_AGG_QUERY)"""
+    flights = extract['flights'].merge(extract['airlines'][['airline_id', 'airline_name']], on='airline_id')
+    flights = flights[flights['scheduled_departure'].notna()]
+    departure = pd.to_datetime(flights['scheduled_departure'])
+    monthly = flights.assign(
+        year_month=departure.dt.strftime('%Y-%m'),
+        month_name=departure.dt.strftime('%B'),
+    ).groupby(['year_month', 'month_name', 'airline_name', 'status'], dropna=False, observed=True) \
+     .size().reset_index(name='flights_count')
+    return monthly.sort_values('year_month', kind='mergesort').reset_index(drop=True)
+
+
+def run_all(report=True, charts=True, timeline=True, report_filter=None):
+    """Загружает выгрузку один раз и строит из нее отчет, графики и анимации"""
+    report_filter = report_filter or ReportFilter()
+    print("🚀 ЗАГРУЖАЕМ БАЗОВУЮ ВЫГРУЗКУ...")
+    print(f"🔎 Фильтр: {report_filter.describe()}")
+    print("="*80)
+    start = time.perf_counter()
+    extract = load_base_extract(report_filter=report_filter)
+    print(f"✓ Выгрузка загружена за {time.perf_counter() - start:.2f} с")
+
+    if report:
+        import db
+        db.generate_comprehensive_report(dataframes=report_frames(extract), report_filter=report_filter)
+
+    if charts:
+        # import.py нельзя импортировать обычным import - имя совпадает с ключевым словом
+        charts_module = importlib.import_module('import')
+        charts_module.create_visualizations(frames=chart_frames(extract), report_filter=report_filter)
+
+    if timeline:
+        import airport_timeline
+        if airport_timeline.TIMELINE_MODE == 'aggregated':
+            airport_timeline.create_correct_timeline(monthly=timeline_monthly_frame(extract),
+                                                     report_filter=report_filter)
+        else:
+            airport_timeline.create_correct_timeline(df=timeline_frame(extract), report_filter=report_filter)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отчет, графики и анимации из одной выгрузки базы данных")
+    parser.add_argument('--report', action='store_true', help="построить Excel-отчет")
+    parser.add_argument('--charts', action='store_true', help="построить статичные графики")
+    parser.add_argument('--timeline', action='store_true', help="построить интерактивные графики")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    report_filter = filter_from_args(parser, args)
+
+    # Без флагов строится все
+    build_all = not (args.report or args.charts or args.timeline)
+    try:
+        run_all(report=args.report or build_all,
+                charts=args.charts or build_all,
+                timeline=args.timeline or build_all,
+                report_filter=report_filter)
+        print_query_stats()
+        print_trace_summary()
+    except Exception as e:
+        print(f"❌ Критическая ошибка: {e}")
+    finally:
+        close_pool()
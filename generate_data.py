@@ -0,0 +1,358 @@
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Синтетическая база airport_db для замеров производительности.
+# Все таблицы генерируются векторно (NumPy) пачками по CHUNK_ROWS строк,
+# поэтому даже 100M строк не требуют держать таблицу целиком в памяти.
+
+CHUNK_ROWS = int(os.environ.get('AIRPORT_GEN_CHUNK', '1000000'))
+
+# Сколько строк каждой таблицы приходится на один рейс
+ROWS_PER_FLIGHT = {
+    'passengers': 0.25,
+    'booking': 1.0,
+    'booking_flight': 1.5,   # в среднем 1.5 сегмента на бронирование
+}
+
+# Сезонность по месяцам: летний пик и зимний спад
+MONTH_WEIGHTS = np.array([0.70, 0.65, 0.80, 0.90, 1.00, 1.25,
+                          1.40, 1.35, 1.05, 0.90, 0.75, 0.95])
+
+# Доля статусов рейсов
+STATUS_MIX = {
+    'On Time': 0.74,
+    'Delayed': 0.19,
+    'Cancelled': 0.04,
+    'Scheduled': 0.03,
+}
+
+COUNTRIES = ['Russia', 'Kazakhstan', 'Turkey', 'Germany', 'France', 'Italy', 'Spain', 'China',
+             'United Arab Emirates', 'Uzbekistan', 'Armenia', 'Georgia', 'Serbia', 'Thailand',
+             'India', 'Egypt', 'United Kingdom', 'Netherlands', 'Japan', 'United States']
+CITIES = ['Moscow', 'Saint Petersburg', 'Almaty', 'Istanbul', 'Berlin', 'Paris', 'Rome', 'Madrid',
+          'Beijing', 'Dubai', 'Tashkent', 'Yerevan', 'Tbilisi', 'Belgrade', 'Bangkok', 'Delhi',
+          'Cairo', 'London', 'Amsterdam', 'Tokyo', 'New York', 'Kazan', 'Sochi', 'Novosibirsk']
+AIRLINE_NAMES = ['AeroFlot', 'S7 Airlines', 'Ural Airlines', 'Pobeda', 'Rossiya', 'Turkish Airlines',
+                 'Lufthansa', 'Air France', 'Emirates', 'Air Astana', 'Uzbekistan Airways', 'Air China']
+FIRST_NAMES = ['Ivan', 'Anna', 'Farida', 'Alexey', 'Maria', 'Timur', 'Elena', 'Arman', 'Olga', 'Dmitry',
+               'Aigerim', 'Sergey', 'Natalia', 'Ruslan', 'Dana', 'Pavel']
+LAST_NAMES = ['Ivanov', 'Petrova', 'Sidorov', 'Akhmetova', 'Smirnov', 'Kuznetsova', 'Nurlanov',
+              'Popova', 'Volkov', 'Sokolova', 'Lebedev', 'Kozlova']
+
+# Порядок колонок совпадает с COPY и с Parquet-файлами
+TABLE_COLUMNS = {
+    'airline': ['airline_id', 'airline_code', 'airline_name', 'airline_country'],
+    'airport': ['airport_id', 'airport_name', 'city', 'country'],
+    'passengers': ['passenger_id', 'first_name', 'last_name', 'country_of_residence'],
+    'flights': ['flight_id', 'flight_no', 'airline_id', 'departure_airport_id', 'arrival_airport_id',
+                'scheduled_departure', 'scheduled_arrival', 'status'],
+    'booking': ['booking_id', 'passenger_id', 'created_at'],
+    'booking_flight': ['booking_id', 'flight_id'],
+}
+
+# Схема для пустой локальной базы (без внешних ключей, чтобы COPY шел быстрее)
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS airline (
+    airline_id integer PRIMARY KEY,
+    airline_code varchar(3),
+    airline_name varchar(100),
+    airline_country varchar(50)
+);
+CREATE TABLE IF NOT EXISTS airport (
+    airport_id integer PRIMARY KEY,
+    airport_name varchar(100),
+    city varchar(50),
+    country varchar(50)
+);
+CREATE TABLE IF NOT EXISTS passengers (
+    passenger_id integer PRIMARY KEY,
+    first_name varchar(50),
+    last_name varchar(50),
+    country_of_residence varchar(50)
+);
+CREATE TABLE IF NOT EXISTS flights (
+    flight_id bigint PRIMARY KEY,
+    flight_no varchar(10),
+    airline_id integer,
+    departure_airport_id integer,
+    arrival_airport_id integer,
+    scheduled_departure timestamp,
+    scheduled_arrival timestamp,
+    status varchar(20)
+);
+CREATE TABLE IF NOT EXISTS booking (
+    booking_id bigint PRIMARY KEY,
+    passenger_id integer,
+    created_at timestamp
+);
+CREATE TABLE IF NOT EXISTS booking_flight (
+    booking_id bigint,
+    flight_id bigint
+);
+"""
+
+
+def parse_size(value):
+    """Разбирает размер вида 10000, 10k, 2.5M"""
+    value = str(value).strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000, 'b': 1_000_000_000}.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def table_sizes(total_rows):
+    """Число строк в каждой таблице для заданного общего объема"""
+    flights = max(100, int(total_rows / (1 + sum(ROWS_PER_FLIGHT.values()))))
+    return {
+        'airline': max(5, min(200, flights // 2000)),
+        'airport': max(10, min(2000, flights // 500)),
+        'passengers': max(50, int(flights * ROWS_PER_FLIGHT['passengers'])),
+        'flights': flights,
+        'booking': max(50, int(flights * ROWS_PER_FLIGHT['booking'])),
+    }
+
+
+def _rng(seed, table, chunk):
+    """Отдельный поток случайных чисел на пачку: результат воспроизводим при том же seed"""
+    return np.random.default_rng([seed, list(TABLE_COLUMNS).index(table), chunk])
+
+
+def _zipf_weights(n, a=1.1):
+    """Веса популярности: немногие крупные аэропорты/авиакомпании и длинный хвост"""
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    return weights / weights.sum()
+
+
+def _pick(values, index):
+    """Векторный выбор строк из списка по индексам (с суффиксом для повторов)"""
+    values = np.asarray(values, dtype=object)
+    base = values[index % len(values)]
+    round_no = index // len(values)
+    if not round_no.any():
+        return base
+    return np.where(round_no > 0, base + ' ' + (round_no + 1).astype(str).astype(object), base)
+
+
+def _seasonal_days(rng, size, start_year, years):
+    """Случайные дни периода с учетом сезонности"""
+    days = pd.date_range(f'{start_year}-01-01', periods=365 * years + years // 4, freq='D')
+    weights = MONTH_WEIGHTS[days.month.to_numpy() - 1]
+    day_index = rng.choice(len(days), size=size, p=weights / weights.sum())
+    return days.to_numpy()[day_index]
+
+
+def _id_chunks(total):
+    """Диапазоны идентификаторов (1-based) по CHUNK_ROWS"""
+    for chunk_no, start in enumerate(range(0, total, CHUNK_ROWS)):
+        yield chunk_no, np.arange(start + 1, min(start + CHUNK_ROWS, total) + 1, dtype=np.int64)
+
+
+def gen_airline(sizes, seed, **_):
+    """Авиакомпании: двухбуквенный код, название, страна"""
+    n = sizes['airline']
+    index = np.arange(n)
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    codes = letters[index // 26 % 26].astype(object) + letters[index % 26].astype(object)
+    yield pd.DataFrame({
+        'airline_id': index + 1,
+        'airline_code': codes,
+        'airline_name': _pick(AIRLINE_NAMES, index),
+        'airline_country': _pick(COUNTRIES, index),
+    })
+
+
+def gen_airport(sizes, seed, **_):
+    """Аэропорты: по одному на город (с суффиксом при повторе)"""
+    n = sizes['airport']
+    index = np.arange(n)
+    cities = _pick(CITIES, index)
+    yield pd.DataFrame({
+        'airport_id': index + 1,
+        'airport_name': cities + ' International',
+        'city': cities,
+        'country': _pick(COUNTRIES, index),
+    })
+
+
+def gen_passengers(sizes, seed, **_):
+    """Пассажиры; страны распределены неравномерно"""
+    country_weights = _zipf_weights(len(COUNTRIES), a=0.9)
+    for chunk_no, ids in _id_chunks(sizes['passengers']):
+        rng = _rng(seed, 'passengers', chunk_no)
+        yield pd.DataFrame({
+            'passenger_id': ids,
+            'first_name': np.asarray(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), len(ids))],
+            'last_name': np.asarray(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), len(ids))],
+            'country_of_residence': np.asarray(COUNTRIES, dtype=object)[
+                rng.choice(len(COUNTRIES), size=len(ids), p=country_weights)],
+        })
+
+
+def gen_flights(sizes, seed, start_year, years, **_):
+    """Рейсы с сезонностью, популярными маршрутами и долями статусов STATUS_MIX"""
+    airline_weights = _zipf_weights(sizes['airline'])
+    airport_weights = _zipf_weights(sizes['airport'])
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    statuses = np.array(list(STATUS_MIX), dtype=object)
+    status_p = np.array(list(STATUS_MIX.values()))
+    for chunk_no, ids in _id_chunks(sizes['flights']):
+        rng = _rng(seed, 'flights', chunk_no)
+        n = len(ids)
+        airline_index = rng.choice(sizes['airline'], size=n, p=airline_weights)
+        departure = rng.choice(sizes['airport'], size=n, p=airport_weights)
+        # Аэропорт прилета всегда отличается от аэропорта вылета
+        arrival = (departure + rng.integers(1, sizes['airport'], size=n)) % sizes['airport']
+        scheduled_departure = (_seasonal_days(rng, n, start_year, years)
+                               + rng.integers(0, 24 * 60, size=n).astype('timedelta64[m]'))
+        duration = np.clip(rng.lognormal(np.log(150), 0.5, size=n), 40, 14 * 60).astype('int64')
+        codes = letters[airline_index // 26 % 26].astype(object) + letters[airline_index % 26].astype(object)
+        yield pd.DataFrame({
+            'flight_id': ids,
+            'flight_no': codes + rng.integers(100, 10000, size=n).astype(str).astype(object),
+            'airline_id': airline_index + 1,
+            'departure_airport_id': departure + 1,
+            'arrival_airport_id': arrival + 1,
+            'scheduled_departure': scheduled_departure,
+            'scheduled_arrival': scheduled_departure + duration.astype('timedelta64[m]'),
+            'status': statuses[rng.choice(len(statuses), size=n, p=status_p)],
+        })
+
+
+def gen_booking(sizes, seed, start_year, years, **_):
+    """Бронирования; дата создания с той же сезонностью, что и у рейсов"""
+    for chunk_no, ids in _id_chunks(sizes['booking']):
+        rng = _rng(seed, 'booking', chunk_no)
+        n = len(ids)
+        created_at = (_seasonal_days(rng, n, start_year, years)
+                      + rng.integers(0, 24 * 3600, size=n).astype('timedelta64[s]'))
+        yield pd.DataFrame({
+            'booking_id': ids,
+            'passenger_id': rng.integers(1, sizes['passengers'] + 1, size=n),
+            'created_at': created_at,
+        })
+
+
+def gen_booking_flight(sizes, seed, **_):
+    """Сегменты бронирований: 1 или 2 рейса на бронирование"""
+    extra_legs = ROWS_PER_FLIGHT['booking_flight'] / ROWS_PER_FLIGHT['booking'] - 1
+    for chunk_no, ids in _id_chunks(sizes['booking']):
+        rng = _rng(seed, 'booking_flight', chunk_no)
+        legs = 1 + (rng.random(len(ids)) < extra_legs)
+        booking_ids = np.repeat(ids, legs)
+        yield pd.DataFrame({
+            'booking_id': booking_ids,
+            'flight_id': rng.integers(1, sizes['flights'] + 1, size=len(booking_ids)),
+        })
+
+
+GENERATORS = {
+    'airline': gen_airline,
+    'airport': gen_airport,
+    'passengers': gen_passengers,
+    'flights': gen_flights,
+    'booking': gen_booking,
+    'booking_flight': gen_booking_flight,
+}
+
+
+def copy_chunk(conn, table, df):
+    """Загружает пачку в PostgreSQL через COPY ... FROM STDIN"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(TABLE_COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def write_parquet_chunk(output_dir, table, chunk_no, df):
+    """Сохраняет пачку как <output_dir>/<table>/part-NNNNN.parquet"""
+    table_dir = os.path.join(output_dir, table)
+    os.makedirs(table_dir, exist_ok=True)
+    df.to_parquet(os.path.join(table_dir, f"part-{chunk_no:05d}.parquet"), index=False)
+
+
+def _load_tables(tables, sizes, seed, start_year, years, write_chunk):
+    """Генерирует таблицы пачками и передает каждую пачку в write_chunk(table, chunk_no, df)"""
+    for table in tables:
+        start = time.perf_counter()
+        rows = 0
+        chunks = GENERATORS[table](sizes, seed, start_year=start_year, years=years)
+        for chunk_no, df in enumerate(chunks):
+            write_chunk(table, chunk_no, df[TABLE_COLUMNS[table]])
+            rows += len(df)
+        elapsed = time.perf_counter() - start
+        print(f"✓ {table}: {rows:,} строк за {elapsed:.1f} с ({rows / max(elapsed, 1e-9):,.0f} строк/с)")
+
+
+def generate(total_rows, target='postgres', output_dir='data', seed=42, start_year=2024, years=2,
+             tables=None, create_schema=False, truncate=False):
+    """
+    Генерирует синтетическую базу и загружает ее в PostgreSQL или в Parquet
+
+    Args:
+        total_rows (int): Примерный общий объем по всем таблицам
+        target (str): 'postgres' (COPY в AIRPORT_DB_*) или 'parquet'
+        output_dir (str): Папка для Parquet-файлов
+        seed (int): Зерно генератора - одинаковое зерно дает одинаковые данные
+        start_year (int), years (int): Период рейсов и бронирований
+        tables (list): Какие таблицы генерировать (по умолчанию все)
+        create_schema (bool): Создать таблицы, если их нет (только postgres)
+        truncate (bool): Очистить таблицы перед загрузкой (только postgres)
+    """
+    sizes = table_sizes(total_rows)
+    tables = tables or list(GENERATORS)
+    print(f"🧪 ГЕНЕРАЦИЯ ДАННЫХ: ~{total_rows:,} строк, seed={seed}, {start_year}-{start_year + years - 1}")
+    for table, rows in sizes.items():
+        print(f"   • {table:<15} {rows:>14,}")
+    print(f"   • {'booking_flight':<15} {int(sizes['booking'] * ROWS_PER_FLIGHT['booking_flight'] / ROWS_PER_FLIGHT['booking']):>14,} (≈)")
+
+    if target == 'postgres':
+        from connection import get_connection
+        # Вся загрузка - одна транзакция: при ошибке база остается в прежнем состоянии
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                if create_schema:
+                    cursor.execute(SCHEMA_DDL)
+                if truncate:
+                    cursor.execute(f"TRUNCATE {', '.join(tables)};")
+            _load_tables(tables, sizes, seed, start_year, years,
+                         lambda table, chunk_no, df: copy_chunk(conn, table, df))
+    else:
+        _load_tables(tables, sizes, seed, start_year, years,
+                     lambda table, chunk_no, df: write_parquet_chunk(output_dir, table, chunk_no, df))
+
+    if target == 'postgres':
+        print("💾 Данные загружены в PostgreSQL (выполните ANALYZE перед замерами)")
+    else:
+        print(f"💾 Parquet-файлы сохранены в папку: {output_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетической базы airport_db")
+    parser.add_argument('--rows', default='100k',
+                        help="примерный общий объем по всем таблицам: 10k, 1M, 100M")
+    parser.add_argument('--target', choices=['postgres', 'parquet'], default='postgres',
+                        help="postgres - COPY в базу из AIRPORT_DB_*, parquet - файлы <output>/<table>/part-*.parquet")
+    parser.add_argument('--output', default='data', help="папка для Parquet-файлов")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start-year', type=int, default=2024)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--tables', nargs='+', choices=list(GENERATORS), help="генерировать только эти таблицы")
+    parser.add_argument('--create-schema', action='store_true', help="создать таблицы, если их нет")
+    parser.add_argument('--truncate', action='store_true', help="очистить таблицы перед загрузкой")
+    args = parser.parse_args()
+
+    try:
+        generate(parse_size(args.rows), target=args.target, output_dir=args.output, seed=args.seed,
+                 start_year=args.start_year, years=args.years, tables=args.tables,
+                 create_schema=args.create_schema, truncate=args.truncate)
+    finally:
+        if args.target == 'postgres':
+            from connection import close_pool
+            close_pool()
@@ -1,91 +1,44 @@
-import psycopg2 
-import pandas as pd
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import numpy as np
 from datetime import datetime
+from connection import run_query, print_query_stats, close_pool
+from summary import SUMMARY_CHART_QUERIES
+import render_cache
+from report_filter import ReportFilter, flight_filter, booking_filter, add_filter_arguments, filter_from_args
+import tracing
 
-# Удаляем старую папку и создаем новую
-if os.path.exists('charts'):
-    import shutil
-    shutil.rmtree('charts')
-os.makedirs('charts')
+# Число процессов для отрисовки графиков (1 - последовательно в текущем процессе)
+CHART_JOBS_DEFAULT = int(os.environ.get('AIRPORT_CHART_JOBS', '1'))
+# Папка для PNG-графиков и манифеста кэша отрисовки (benchmark.py подменяет ее временной)
+CHARTS_DIR = 'charts'
 
-# Настройка стиля графиков
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+# Настройка стиля графиков (входит в ключ кэша отрисовки)
+CHART_STYLE = {'style': 'seaborn-v0_8', 'palette': 'husl', 'dpi': 300, 'matplotlib': matplotlib.__version__}
+plt.style.use(CHART_STYLE['style'])
+sns.set_palette(CHART_STYLE['palette'])
 
-def execute_query_to_df(query, description):
-    """Выполняет SQL-запрос и возвращает DataFrame"""
-    try:
-        with psycopg2.connect( 
-            host="localhost",
-            database="airport_db",
-            user="postgres",
-            password="farida",  
-            port="5432"
-        ) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
-                results = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                
-                df = pd.DataFrame(results, columns=columns)
-                print(f"✓ {description}: получено {len(df)} строк")
-                return df
-    except Exception as e:
-        print(f"✗ Ошибка в запросе '{description}': {e}")
-        return None
-
-def create_visualizations():
-    """Создает 6 различных визуализаций"""
-    
-    # 1. КРУГОВАЯ ДИАГРАММА - Распределение статусов рейсов
-    print("\n" + "="*80)
-    print("1. КРУГОВАЯ ДИАГРАММА: Распределение статусов рейсов")
-    
-    query_pie = """
+# SQL-запросы для графиков; параметры фильтра - ReportFilter.params()
+CHART_QUERIES = {
+    'status_distribution': f"""
     SELECT 
-        status,
+        f.status,
         COUNT(*) as count_flights,
-        ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM flights), 1) as percentage
-    FROM flights 
-    WHERE status IS NOT NULL
-    GROUP BY status
+        ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM flights fa WHERE {flight_filter('fa')}), 1) as percentage
+    FROM flights f
+    WHERE f.status IS NOT NULL
+      AND {flight_filter('f')}
+    GROUP BY f.status
     ORDER BY count_flights DESC;
-    """
-    
-    df_pie = execute_query_to_df(query_pie, "Статусы рейсов")
-    if df_pie is not None and len(df_pie) > 0:
-        plt.figure(figsize=(12, 8))
-        
-        # Создаем круговую диаграмму
-        colors = ['#4CAF50', '#FF9800', '#F44336', '#2196F3']  # Зеленый, оранжевый, красный, синий
-        wedges, texts, autotexts = plt.pie(df_pie['count_flights'], 
-                                          labels=df_pie['status'],
-                                          autopct='%1.1f%%',
-                                          startangle=90,
-                                          colors=colors[:len(df_pie)],
-                                          explode=[0.05] * len(df_pie))
-        
-        # Улучшаем подписи
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-            autotext.set_fontsize(10)
-        
-        plt.title('РАСПРЕДЕЛЕНИЕ СТАТУСОВ РЕЙСОВ\n(все авиакомпании)', 
-                 fontsize=16, fontweight='bold', pad=20)
-        plt.savefig('charts/pie_chart_status_distribution.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: pie_chart_status_distribution.png")
-
-    # 2. СТОЛБЧАТАЯ ДИАГРАММА - Топ авиакомпаний по количеству рейсов
-    print("\n" + "="*80)
-    print("2. СТОЛБЧАТАЯ ДИАГРАММА: Топ авиакомпаний по рейсам")
+    """,
     
-    query_bar = """
+    'top_airlines': f"""
     SELECT 
         a.airline_name,
         a.airline_country,
@@ -93,88 +46,52 @@ def create_visualizations():
         ROUND(COUNT(CASE WHEN f.status = 'On Time' THEN 1 END) * 100.0 / COUNT(f.flight_id), 1) as on_time_percent
     FROM flights f
     JOIN airline a ON f.airline_id = a.airline_id
+    WHERE {flight_filter('f')}
     GROUP BY a.airline_id, a.airline_name, a.airline_country
     HAVING COUNT(f.flight_id) >= 5
     ORDER BY total_flights DESC
     LIMIT 10;
-    """
+    """,
     
-    df_bar = execute_query_to_df(query_bar, "Топ авиакомпаний")
-    if df_bar is not None and len(df_bar) > 0:
-        plt.figure(figsize=(14, 8))
-        
-        # Создаем столбчатую диаграмму
-        bars = plt.bar(range(len(df_bar)), df_bar['total_flights'], 
-                      color=plt.cm.viridis(np.linspace(0, 1, len(df_bar))),
-                      alpha=0.8, edgecolor='black', linewidth=0.5)
-        
-        # Настраиваем оси и подписи
-        plt.xticks(range(len(df_bar)), [name[:20] + '...' if len(name) > 20 else name 
-                                      for name in df_bar['airline_name']], rotation=45, ha='right')
-        plt.ylabel('Количество рейсов', fontsize=12, fontweight='bold')
-        plt.xlabel('Авиакомпании', fontsize=12, fontweight='bold')
-        plt.title('ТОП-10 АВИАКОМПАНИЙ ПО КОЛИЧЕСТВУ РЕЙСОВ', fontsize=16, fontweight='bold')
-        
-        # Добавляем значения на столбцы
-        for i, (bar, count, percent) in enumerate(zip(bars, df_bar['total_flights'], df_bar['on_time_percent'])):
-            plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + max(df_bar['total_flights'])*0.01,
-                    f'{int(count)}\n({percent}%)', ha='center', va='bottom', fontsize=9, fontweight='bold')
-        
-        plt.grid(axis='y', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('charts/bar_chart_top_airlines.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: bar_chart_top_airlines.png")
-
-    # 3. ГОРИЗОНТАЛЬНАЯ СТОЛБЧАТАЯ ДИАГРАММА - Загруженность аэропортов
-    print("\n" + "="*80)
-    print("3. ГОРИЗОНТАЛЬНАЯ СТОЛБЧАТАЯ: Загруженность аэропортов")
-    
-    query_hbar = """
+    'busiest_airports': f"""
+    WITH legs AS (
+        -- Вылеты и прилеты агрегируются по аэропорту до объединения (как airport_traffic в db.py)
+        SELECT f.departure_airport_id as airport_id,
+               COUNT(*) as departures, 0 as arrivals, COUNT(*) as flights_count
+        FROM flights f
+        WHERE {flight_filter('f')}
+        GROUP BY f.departure_airport_id
+        UNION ALL
+        SELECT f.arrival_airport_id as airport_id,
+               0 as departures, COUNT(*) as arrivals,
+               COUNT(*) FILTER (WHERE f.departure_airport_id IS DISTINCT FROM f.arrival_airport_id) as flights_count
+        FROM flights f
+        WHERE {flight_filter('f')}
+        GROUP BY f.arrival_airport_id
+    ),
+    traffic AS (
+        SELECT 
+            airport_id,
+            SUM(flights_count)::bigint as total_flights,
+            SUM(departures)::bigint as departures,
+            SUM(arrivals)::bigint as arrivals
+        FROM legs
+        GROUP BY airport_id
+    )
     SELECT 
         ap.airport_name,
         ap.city,
         ap.country,
-        COUNT(DISTINCT f.flight_id) as total_flights,
-        COUNT(DISTINCT CASE WHEN f.departure_airport_id = ap.airport_id THEN f.flight_id END) as departures,
-        COUNT(DISTINCT CASE WHEN f.arrival_airport_id = ap.airport_id THEN f.flight_id END) as arrivals
-    FROM airport ap
-    LEFT JOIN flights f ON ap.airport_id = f.departure_airport_id OR ap.airport_id = f.arrival_airport_id
-    GROUP BY ap.airport_id, ap.airport_name, ap.city, ap.country
-    HAVING COUNT(DISTINCT f.flight_id) > 0
+        t.total_flights,
+        t.departures,
+        t.arrivals
+    FROM traffic t
+    JOIN airport ap ON ap.airport_id = t.airport_id
     ORDER BY total_flights DESC
     LIMIT 15;
-    """
-    
-    df_hbar = execute_query_to_df(query_hbar, "Загруженность аэропортов")
-    if df_hbar is not None and len(df_hbar) > 0:
-        plt.figure(figsize=(14, 10))
-        
-        y_pos = np.arange(len(df_hbar))
-        
-        # Создаем групповую горизонтальную диаграмму
-        plt.barh(y_pos - 0.2, df_hbar['departures'], height=0.4, label='Вылеты', alpha=0.8, color='#FF6B6B')
-        plt.barh(y_pos + 0.2, df_hbar['arrivals'], height=0.4, label='Прилеты', alpha=0.8, color='#4ECDC4')
-        
-        # Настраиваем ось Y
-        plt.yticks(y_pos, [f"{row['airport_name']}\n({row['city']})" 
-                          for _, row in df_hbar.iterrows()])
-        plt.xlabel('Количество рейсов', fontsize=12, fontweight='bold')
-        plt.title('ТОП-15 САМЫХ ЗАГРУЖЕННЫХ АЭРОПОРТОВ\n(разделение по вылетам и прилетам)', 
-                 fontsize=16, fontweight='bold', pad=20)
-        plt.legend()
-        plt.gca().invert_yaxis()
-        plt.grid(axis='x', alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('charts/hbar_chart_busiest_airports.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: hbar_chart_busiest_airports.png")
-
-    # 4. ЛИНЕЙНЫЙ ГРАФИК - Сезонность перевозок (исправленный)
-    print("\n" + "="*80)
-    print("4. ЛИНЕЙНЫЙ ГРАФИК: Сезонность перевозок")
+    """,
     
-    query_line = """
+    'seasonality': f"""
     WITH month_flights AS (
         SELECT 
             EXTRACT(MONTH FROM b.created_at) as month_num,
@@ -184,86 +101,27 @@ def create_visualizations():
         JOIN booking_flight bf ON b.booking_id = bf.booking_id
         JOIN flights f ON bf.flight_id = f.flight_id
         WHERE b.created_at IS NOT NULL
+          AND {booking_filter(passenger=None)}
         GROUP BY EXTRACT(MONTH FROM b.created_at), TO_CHAR(b.created_at, 'Month')
     )
     SELECT month_num, month_name, bookings_count
     FROM month_flights
     ORDER BY month_num;
-    """
-    
-    df_line = execute_query_to_df(query_line, "Бронирования по месяцам")
-    if df_line is not None and len(df_line) > 0:
-        plt.figure(figsize=(14, 8))
-        
-        # Создаем линейный график
-        plt.plot(df_line['month_num'], df_line['bookings_count'], 
-                marker='o', linewidth=3, markersize=8, markerfacecolor='red', 
-                markeredgecolor='black', markeredgewidth=1)
-        
-        # Настраиваем график
-        plt.xticks(df_line['month_num'], df_line['month_name'].str.strip())
-        plt.ylabel('Количество бронирований', fontsize=12, fontweight='bold')
-        plt.xlabel('Месяц', fontsize=12, fontweight='bold')
-        plt.title('СЕЗОННОСТЬ АВИАПЕРЕВОЗОК\n(по количеству бронирований)', 
-                 fontsize=16, fontweight='bold', pad=20)
-        plt.grid(True, alpha=0.3)
-        
-        # Добавляем значения точек
-        for x, y in zip(df_line['month_num'], df_line['bookings_count']):
-            plt.text(x, y + max(df_line['bookings_count']) * 0.02, f'{int(y)}', 
-                    ha='center', va='bottom', fontweight='bold', fontsize=10)
-        
-        plt.tight_layout()
-        plt.savefig('charts/line_chart_seasonality.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: line_chart_seasonality.png")
-
-    # 5. ГИСТОГРАММА - Распределение количества рейсов на пассажира
-    print("\n" + "="*80)
-    print("5. ГИСТОГРАММА: Активность пассажиров")
+    """,
     
-    query_hist = """
+    'passenger_activity': f"""
     SELECT 
         p.passenger_id,
         COUNT(DISTINCT bf.flight_id) as flights_count
     FROM passengers p
     JOIN booking b ON p.passenger_id = b.passenger_id
     JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE {booking_filter()}
     GROUP BY p.passenger_id
     HAVING COUNT(DISTINCT bf.flight_id) > 0;
-    """
-    
-    df_hist = execute_query_to_df(query_hist, "Активность пассажиров")
-    if df_hist is not None and len(df_hist) > 0:
-        plt.figure(figsize=(14, 8))
-        
-        # Создаем гистограмму
-        n, bins, patches = plt.hist(df_hist['flights_count'], bins=15, 
-                                   alpha=0.7, color='#9B59B6', edgecolor='black', linewidth=0.5)
-        
-        plt.xlabel('Количество рейсов на пассажира', fontsize=12, fontweight='bold')
-        plt.ylabel('Количество пассажиров', fontsize=12, fontweight='bold')
-        plt.title('РАСПРЕДЕЛЕНИЕ АКТИВНОСТИ ПАССАЖИРОВ\n(сколько рейсов совершает один пассажир)', 
-                 fontsize=16, fontweight='bold', pad=20)
-        plt.grid(True, alpha=0.3)
-        
-        # Добавляем статистику
-        mean_val = df_hist['flights_count'].mean()
-        median_val = df_hist['flights_count'].median()
-        plt.axvline(mean_val, color='red', linestyle='--', linewidth=2, label=f'Среднее: {mean_val:.1f}')
-        plt.axvline(median_val, color='green', linestyle='--', linewidth=2, label=f'Медиана: {median_val:.1f}')
-        plt.legend()
-        
-        plt.tight_layout()
-        plt.savefig('charts/histogram_passenger_activity.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: histogram_passenger_activity.png")
-
-    # 6. ДИАГРАММА РАССЕЯНИЯ - Связь между рейсами и пассажирами по странам
-    print("\n" + "="*80)
-    print("6. ДИАГРАММА РАССЕЯНИЯ: Активность по странам")
+    """,
     
-    query_scatter = """
+    'country_activity': f"""
     SELECT 
         p.country_of_residence as country,
         COUNT(DISTINCT p.passenger_id) as passengers_count,
@@ -272,65 +130,462 @@ def create_visualizations():
     FROM passengers p
     JOIN booking b ON p.passenger_id = b.passenger_id
     JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE {booking_filter()}
     GROUP BY p.country_of_residence
     HAVING COUNT(DISTINCT p.passenger_id) >= 3
     ORDER BY passengers_count DESC;
     """
+}
+
+# Число столбцов гистограммы активности пассажиров
+HIST_BINS = 15
+
+# Гистограмма, посчитанная в базе: те же HIST_BINS равных интервалов от минимума
+# до максимума, что и у plt.hist (максимум попадает в последний интервал),
+# плюс среднее и медиана. На клиент приходит не больше HIST_BINS строк.
+HIST_BINNED_QUERY = f"""
+WITH per_passenger AS (
+    SELECT 
+        p.passenger_id,
+        COUNT(DISTINCT bf.flight_id) as flights_count
+    FROM passengers p
+    JOIN booking b ON p.passenger_id = b.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE {booking_filter()}
+    GROUP BY p.passenger_id
+    HAVING COUNT(DISTINCT bf.flight_id) > 0
+),
+stats AS (
+    SELECT 
+        MIN(flights_count) as min_value,
+        MAX(flights_count) as max_value,
+        AVG(flights_count) as mean_value,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY flights_count) as median_value
+    FROM per_passenger
+)
+SELECT 
+    CASE WHEN s.max_value = s.min_value THEN 1
+         ELSE LEAST(width_bucket(pp.flights_count::numeric, s.min_value, s.max_value, {HIST_BINS}), {HIST_BINS})
+    END as bin,
+    COUNT(*) as passengers_count,
+    s.min_value,
+    s.max_value,
+    s.mean_value,
+    s.median_value
+FROM per_passenger pp
+CROSS JOIN stats s
+GROUP BY 1, s.min_value, s.max_value, s.mean_value, s.median_value
+ORDER BY bin;
+"""
+
+# Режим гистограммы: binned - интервалы считаются в базе, raw - строка на каждого пассажира
+HIST_MODES = ('binned', 'raw')
+HIST_MODE = os.environ.get('AIRPORT_HIST_MODE', 'binned')
+
+# Запросы с результатом на каждого пассажира читаются пачками с серверного курсора
+STREAMED_CHART_QUERIES = {'passenger_activity'}
+
+def execute_query_to_df(query, description, stream=None, batch_size=None, params=None):
+    """
+    Выполняет SQL-запрос через общий пул подключений и возвращает DataFrame
     
-    df_scatter = execute_query_to_df(query_scatter, "Активность по странам")
-    if df_scatter is not None and len(df_scatter) > 0:
-        plt.figure(figsize=(14, 10))
-        
-        # Создаем диаграмму рассеяния
-        scatter = plt.scatter(df_scatter['passengers_count'], 
-                             df_scatter['unique_flights'],
-                             s=df_scatter['total_bookings']*2,  # Размер точек по бронированиям
-                             c=df_scatter['total_bookings'],    # Цвет по бронированиям
-                             alpha=0.6, cmap='viridis', edgecolors='black', linewidth=0.5)
-        
-        plt.xlabel('Количество пассажиров из страны', fontsize=12, fontweight='bold')
-        plt.ylabel('Количество уникальных рейсов', fontsize=12, fontweight='bold')
-        plt.title('АКТИВНОСТЬ ПАССАЖИРОВ ПО СТРАНАМ\n(размер точки = количество бронирований)', 
-                 fontsize=16, fontweight='bold', pad=20)
-        
-        # Добавляем цветовую шкалу
-        cbar = plt.colorbar(scatter)
-        cbar.set_label('Количество бронирований', fontweight='bold')
-        
-        # Добавляем подписи для крупных стран
-        for i, row in df_scatter.iterrows():
-            if row['passengers_count'] > df_scatter['passengers_count'].median():
-                plt.annotate(row['country'], 
-                            (row['passengers_count'], row['unique_flights']),
-                            xytext=(5, 5), textcoords='offset points',
-                            fontsize=8, fontweight='bold', alpha=0.8)
-        
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.savefig('charts/scatter_country_activity.png', dpi=300, bbox_inches='tight')
-        plt.close()
-        print("✓ Создан график: scatter_country_activity.png")
+    При stream=True результат читается пачками по batch_size строк (fetchmany)
+    и сразу раскладывается по колонкам, без промежуточного списка всех строк.
+    params - параметры фильтра (ReportFilter.params()).
+    """
+    try:
+        df = run_query(query, description, params=params, stream=stream, batch_size=batch_size)
+        print(f"✓ {description}: получено {len(df)} строк")
+        return df
+    except Exception as e:
+        print(f"✗ Ошибка в запросе '{description}': {e}")
+        return None
+
+def render_status_distribution(df_pie):
+    """Круговая диаграмма распределения статусов рейсов"""
+    plt.figure(figsize=(12, 8))
+    
+    # Создаем круговую диаграмму
+    colors = ['#4CAF50', '#FF9800', '#F44336', '#2196F3']  # Зеленый, оранжевый, красный, синий
+    wedges, texts, autotexts = plt.pie(df_pie['count_flights'], 
+                                      labels=df_pie['status'],
+                                      autopct='%1.1f%%',
+                                      startangle=90,
+                                      colors=colors[:len(df_pie)],
+                                      explode=[0.05] * len(df_pie))
+    
+    # Улучшаем подписи
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+        autotext.set_fontsize(10)
+    
+    plt.title('РАСПРЕДЕЛЕНИЕ СТАТУСОВ РЕЙСОВ\n(все авиакомпании)', 
+             fontsize=16, fontweight='bold', pad=20)
+    plt.savefig(os.path.join(CHARTS_DIR, 'pie_chart_status_distribution.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'pie_chart_status_distribution.png'
+
+def render_top_airlines(df_bar):
+    """Столбчатая диаграмма топ-10 авиакомпаний"""
+    plt.figure(figsize=(14, 8))
+    
+    # Создаем столбчатую диаграмму
+    bars = plt.bar(range(len(df_bar)), df_bar['total_flights'], 
+                  color=plt.cm.viridis(np.linspace(0, 1, len(df_bar))),
+                  alpha=0.8, edgecolor='black', linewidth=0.5)
+    
+    # Настраиваем оси и подписи
+    plt.xticks(range(len(df_bar)), [name[:20] + '...' if len(name) > 20 else name 
+                                  for name in df_bar['airline_name']], rotation=45, ha='right')
+    plt.ylabel('Количество рейсов', fontsize=12, fontweight='bold')
+    plt.xlabel('Авиакомпании', fontsize=12, fontweight='bold')
+    plt.title('ТОП-10 АВИАКОМПАНИЙ ПО КОЛИЧЕСТВУ РЕЙСОВ', fontsize=16, fontweight='bold')
+    
+    # Добавляем значения на столбцы
+    for i, (bar, count, percent) in enumerate(zip(bars, df_bar['total_flights'], df_bar['on_time_percent'])):
+        plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + max(df_bar['total_flights'])*0.01,
+                f'{int(count)}\n({percent}%)', ha='center', va='bottom', fontsize=9, fontweight='bold')
+    
+    plt.grid(axis='y', alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(os.path.join(CHARTS_DIR, 'bar_chart_top_airlines.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'bar_chart_top_airlines.png'
+
+def render_busiest_airports(df_hbar):
+    """Горизонтальная диаграмма загруженности аэропортов"""
+    plt.figure(figsize=(14, 10))
+    
+    y_pos = np.arange(len(df_hbar))
+    
+    # Создаем групповую горизонтальную диаграмму
+    plt.barh(y_pos - 0.2, df_hbar['departures'], height=0.4, label='Вылеты', alpha=0.8, color='#FF6B6B')
+    plt.barh(y_pos + 0.2, df_hbar['arrivals'], height=0.4, label='Прилеты', alpha=0.8, color='#4ECDC4')
+    
+    # Настраиваем ось Y
+    plt.yticks(y_pos, [f"{row['airport_name']}\n({row['city']})" 
+                      for _, row in df_hbar.iterrows()])
+    plt.xlabel('Количество рейсов', fontsize=12, fontweight='bold')
+    plt.title('ТОП-15 САМЫХ ЗАГРУЖЕННЫХ АЭРОПОРТОВ\n(разделение по вылетам и прилетам)', 
+             fontsize=16, fontweight='bold', pad=20)
+    plt.legend()
+    plt.gca().invert_yaxis()
+    plt.grid(axis='x', alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(os.path.join(CHARTS_DIR, 'hbar_chart_busiest_airports.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'hbar_chart_busiest_airports.png'
+
+def render_seasonality(df_line):
+    """Линейный график сезонности бронирований"""
+    plt.figure(figsize=(14, 8))
+    
+    # Создаем линейный график
+    plt.plot(df_line['month_num'], df_line['bookings_count'], 
+            marker='o', linewidth=3, markersize=8, markerfacecolor='red', 
+            markeredgecolor='black', markeredgewidth=1)
+    
+    # Настраиваем график
+    plt.xticks(df_line['month_num'], df_line['month_name'].str.strip())
+    plt.ylabel('Количество бронирований', fontsize=12, fontweight='bold')
+    plt.xlabel('Месяц', fontsize=12, fontweight='bold')
+    plt.title('СЕЗОННОСТЬ АВИАПЕРЕВОЗОК\n(по количеству бронирований)', 
+             fontsize=16, fontweight='bold', pad=20)
+    plt.grid(True, alpha=0.3)
+    
+    # Добавляем значения точек
+    for x, y in zip(df_line['month_num'], df_line['bookings_count']):
+        plt.text(x, y + max(df_line['bookings_count']) * 0.02, f'{int(y)}', 
+                ha='center', va='bottom', fontweight='bold', fontsize=10)
+    
+    plt.tight_layout()
+    plt.savefig(os.path.join(CHARTS_DIR, 'line_chart_seasonality.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'line_chart_seasonality.png'
+
+def render_passenger_activity(df_hist):
+    """
+    Гистограмма активности пассажиров
+    
+    Принимает либо строки по пассажирам (flights_count), либо готовые
+    интервалы из HIST_BINNED_QUERY (bin, passengers_count, ...).
+    """
+    plt.figure(figsize=(14, 8))
+    
+    # Создаем гистограмму
+    if 'bin' in df_hist.columns:
+        # Границы интервалов как у plt.hist(bins=HIST_BINS); одинаковые значения - интервал ±0.5
+        min_value, max_value = float(df_hist['min_value'].iloc[0]), float(df_hist['max_value'].iloc[0])
+        if min_value == max_value:
+            min_value, max_value = min_value - 0.5, max_value + 0.5
+        edges = np.linspace(min_value, max_value, HIST_BINS + 1)
+        counts = np.zeros(HIST_BINS)
+        counts[df_hist['bin'].to_numpy(dtype=int) - 1] = df_hist['passengers_count'].to_numpy(dtype=float)
+        n, bins, patches = plt.hist(edges[:-1], bins=edges, weights=counts,
+                                   alpha=0.7, color='#9B59B6', edgecolor='black', linewidth=0.5)
+    else:
+        n, bins, patches = plt.hist(df_hist['flights_count'], bins=HIST_BINS, 
+                                   alpha=0.7, color='#9B59B6', edgecolor='black', linewidth=0.5)
+    
+    plt.xlabel('Количество рейсов на пассажира', fontsize=12, fontweight='bold')
+    plt.ylabel('Количество пассажиров', fontsize=12, fontweight='bold')
+    plt.title('РАСПРЕДЕЛЕНИЕ АКТИВНОСТИ ПАССАЖИРОВ\n(сколько рейсов совершает один пассажир)', 
+             fontsize=16, fontweight='bold', pad=20)
+    plt.grid(True, alpha=0.3)
+    
+    # Добавляем статистику
+    if 'bin' in df_hist.columns:
+        mean_val = float(df_hist['mean_value'].iloc[0])
+        median_val = float(df_hist['median_value'].iloc[0])
+    else:
+        mean_val = df_hist['flights_count'].mean()
+        median_val = df_hist['flights_count'].median()
+    plt.axvline(mean_val, color='red', linestyle='--', linewidth=2, label=f'Среднее: {mean_val:.1f}')
+    plt.axvline(median_val, color='green', linestyle='--', linewidth=2, label=f'Медиана: {median_val:.1f}')
+    plt.legend()
+    
+    plt.tight_layout()
+    plt.savefig(os.path.join(CHARTS_DIR, 'histogram_passenger_activity.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'histogram_passenger_activity.png'
+
+def render_country_activity(df_scatter):
+    """Диаграмма рассеяния активности по странам"""
+    plt.figure(figsize=(14, 10))
+    
+    # Создаем диаграмму рассеяния
+    scatter = plt.scatter(df_scatter['passengers_count'], 
+                         df_scatter['unique_flights'],
+                         s=df_scatter['total_bookings']*2,  # Размер точек по бронированиям
+                         c=df_scatter['total_bookings'],    # Цвет по бронированиям
+                         alpha=0.6, cmap='viridis', edgecolors='black', linewidth=0.5)
+    
+    plt.xlabel('Количество пассажиров из страны', fontsize=12, fontweight='bold')
+    plt.ylabel('Количество уникальных рейсов', fontsize=12, fontweight='bold')
+    plt.title('АКТИВНОСТЬ ПАССАЖИРОВ ПО СТРАНАМ\n(размер точки = количество бронирований)', 
+             fontsize=16, fontweight='bold', pad=20)
+    
+    # Добавляем цветовую шкалу
+    cbar = plt.colorbar(scatter)
+    cbar.set_label('Количество бронирований', fontweight='bold')
+    
+    # Добавляем подписи для крупных стран
+    for i, row in df_scatter.iterrows():
+        if row['passengers_count'] > df_scatter['passengers_count'].median():
+            plt.annotate(row['country'], 
+                        (row['passengers_count'], row['unique_flights']),
+                        xytext=(5, 5), textcoords='offset points',
+                        fontsize=8, fontweight='bold', alpha=0.8)
+    
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(os.path.join(CHARTS_DIR, 'scatter_country_activity.png'), dpi=CHART_STYLE['dpi'], bbox_inches='tight')
+    plt.close()
+    return 'scatter_country_activity.png'
+
+# Задания на отрисовку: ключ данных, заголовок, описание запроса, функция отрисовки
+CHART_JOBS = [
+    ('status_distribution', "1. КРУГОВАЯ ДИАГРАММА: Распределение статусов рейсов", "Статусы рейсов", render_status_distribution),
+    ('top_airlines', "2. СТОЛБЧАТАЯ ДИАГРАММА: Топ авиакомпаний по рейсам", "Топ авиакомпаний", render_top_airlines),
+    ('busiest_airports', "3. ГОРИЗОНТАЛЬНАЯ СТОЛБЧАТАЯ: Загруженность аэропортов", "Загруженность аэропортов", render_busiest_airports),
+    ('seasonality', "4. ЛИНЕЙНЫЙ ГРАФИК: Сезонность перевозок", "Бронирования по месяцам", render_seasonality),
+    ('passenger_activity', "5. ГИСТОГРАММА: Активность пассажиров", "Активность пассажиров", render_passenger_activity),
+    ('country_activity', "6. ДИАГРАММА РАССЕЯНИЯ: Активность по странам", "Активность по странам", render_country_activity),
+]
+RENDERERS = {name: render for name, _, _, render in CHART_JOBS}
+
+def prepare_charts_dir():
+    """Создает папку CHARTS_DIR; прежние графики остаются для кэша отрисовки"""
+    os.makedirs(CHARTS_DIR, exist_ok=True)
+
+def _init_render_worker(charts_dir=None):
+    """Инициализация процесса-отрисовщика: неинтерактивный backend, общий стиль и папка графиков"""
+    global CHARTS_DIR
+    CHARTS_DIR = charts_dir or CHARTS_DIR
+    matplotlib.use('Agg')
+    plt.style.use(CHART_STYLE['style'])
+    sns.set_palette(CHART_STYLE['palette'])
+
+def _render_job(name, df):
+    """Отрисовывает один график; возвращает имя файла и время отрисовки"""
+    start = time.perf_counter()
+    filename = RENDERERS[name](df)
+    return filename, time.perf_counter() - start
+
+def create_visualizations(use_summary=False, frames=None, jobs=1, stream_fetch=None, fetch_batch=None,
+                          hist_mode=None, use_cache=None, report_filter=None):
+    """
+    Создает 6 различных визуализаций
+    
+    Данные всех графиков загружаются заранее, затем графики отрисовываются
+    независимо друг от друга - последовательно или в пуле процессов.
+    
+    Args:
+        use_summary (bool): Читать данные из сводных таблиц (см. summary.py)
+        frames (dict): Готовые данные графиков (например, из extract.chart_frames);
+            если заданы, SQL-запросы не выполняются
+        jobs (int): Число процессов для отрисовки (1 - в текущем процессе)
+        stream_fetch (bool): Читать все запросы пачками с серверного курсора
+            (по умолчанию AIRPORT_STREAM_FETCH; STREAMED_CHART_QUERIES читаются так всегда)
+        fetch_batch (int): Размер пачки строк (по умолчанию AIRPORT_FETCH_BATCH)
+        hist_mode (str): 'binned' - интервалы гистограммы считаются в базе,
+            'raw' - строка на каждого пассажира (по умолчанию AIRPORT_HIST_MODE)
+        use_cache (bool): Не перерисовывать графики, у которых не изменились данные
+            и стиль (по умолчанию AIRPORT_RENDER_CACHE, см. render_cache.py)
+        report_filter (ReportFilter): Период, авиакомпании, аэропорты и страны
+            (для frames фильтр уже должен быть применен при выгрузке)
+    """
+    report_filter = report_filter or ReportFilter()
+    if use_summary and not report_filter.is_empty:
+        raise ValueError("Фильтры не поддерживаются для графиков по сводным таблицам (--use-summary)")
+    
+    prepare_charts_dir()
+    if use_cache is None:
+        use_cache = render_cache.CACHE_ENABLED
+    manifest = render_cache.load_manifest(CHARTS_DIR)
+    
+    # Для гистограммы сводной версии нет - она всегда читает исходные таблицы
+    queries = {**CHART_QUERIES, **SUMMARY_CHART_QUERIES} if use_summary else dict(CHART_QUERIES)
+    hist_mode = hist_mode or HIST_MODE
+    if hist_mode == 'binned':
+        queries['passenger_activity'] = HIST_BINNED_QUERY
+    
+    print("\n" + "="*80)
+    print("📥 ЗАГРУЗКА ДАННЫХ ДЛЯ ГРАФИКОВ")
+    print(f"🔎 Фильтр: {report_filter.describe()}")
+    chart_data = {}
+    timings = {}
+    for name, _, description, _ in CHART_JOBS:
+        start = time.perf_counter()
+        with tracing.span(f"chart:{name}:data") as stage:
+            if frames is not None:
+                df = frames.get(name)
+            else:
+                stream = True if name in STREAMED_CHART_QUERIES and hist_mode == 'raw' else stream_fetch
+                df = execute_query_to_df(queries[name], description, stream=stream, batch_size=fetch_batch,
+                                         params=report_filter.params())
+            stage['rows'] = len(df) if df is not None else None
+        timings[name] = {'query': time.perf_counter() - start, 'render': None, 'file': None, 'cached': False}
+        if df is not None and len(df) > 0:
+            chart_data[name] = df
+        elif df is not None:
+            # Папка графиков не очищается: график прошлого запуска больше не соответствует данным
+            removed = render_cache.forget(manifest, CHARTS_DIR, name)
+            if removed is not None:
+                print(f"🗑️  {description}: нет данных, удален прежний график {removed}")
+    
+    # Графики, у которых ключ (данные + стиль + код отрисовки) не изменился, не перерисовываются
+    keys = {name: render_cache.render_key(df, CHART_STYLE, RENDERERS[name]) for name, df in chart_data.items()}
+    for name, title, _, _ in CHART_JOBS:
+        cached_file = render_cache.lookup(manifest, CHARTS_DIR, name, keys[name]) if use_cache and name in keys else None
+        if cached_file is not None:
+            del chart_data[name]
+            timings[name].update(file=cached_file, cached=True)
+            print(f"♻️  {title}: данные не изменились, используется {cached_file}")
+    
+    if jobs > 1 and len(chart_data) > 1:
+        print(f"\n🧵 Отрисовка в {jobs} процессах")
+        # spawn вместо fork: при вызове из потока (airport_analytics.py) fork копирует
+        # блокировки, захваченные другими потоками, и процесс-отрисовщик может зависнуть
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_render_worker, initargs=(CHARTS_DIR,),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {name: executor.submit(_render_job, name, chart_data[name])
+                       for name, _, _, _ in CHART_JOBS if name in chart_data}
+            for name, title, _, _ in CHART_JOBS:
+                if name not in futures:
+                    continue
+                print("\n" + "="*80)
+                print(title)
+                try:
+                    filename, seconds = futures[name].result()
+                except Exception as e:
+                    print(f"✗ Ошибка при отрисовке '{name}': {e}")
+                    continue
+                timings[name].update(render=seconds, file=filename)
+                render_cache.remember(manifest, name, keys[name], filename)
+                # Отрисовка шла в другом процессе - замер передается в трассировку готовым
+                tracing.record(f"chart:{name}:render", seconds, rows=len(chart_data[name]),
+                               bytes_written=os.path.getsize(os.path.join(CHARTS_DIR, filename)))
+                print(f"✓ Создан график: {filename}")
+    else:
+        for name, title, _, _ in CHART_JOBS:
+            if name not in chart_data:
+                continue
+            print("\n" + "="*80)
+            print(title)
+            with tracing.span(f"chart:{name}:render") as stage:
+                filename, seconds = _render_job(name, chart_data[name])
+                stage['rows'] = len(chart_data[name])
+                stage['bytes'] = os.path.getsize(os.path.join(CHARTS_DIR, filename))
+            timings[name].update(render=seconds, file=filename)
+            render_cache.remember(manifest, name, keys[name], filename)
+            print(f"✓ Создан график: {filename}")
+    
+    render_cache.save_manifest(CHARTS_DIR, manifest)
+    print_chart_timings(timings)
+    return timings
+
+def print_chart_timings(timings):
+    """Выводит время загрузки данных и отрисовки по каждому графику"""
+    print("\n⏱️  ВРЕМЯ ПО ГРАФИКАМ:")
+    print(f"   {'График':<22} {'Данные (с)':>11} {'Отрисовка (с)':>14}")
+    for name, stat in timings.items():
+        if stat['cached']:
+            render = f"{'кэш':>14}"
+        else:
+            render = f"{stat['render']:>14.3f}" if stat['render'] is not None else f"{'—':>14}"
+        print(f"   {name:<22} {stat['query']:>11.3f} {render}")
+    total_render = sum(stat['render'] or 0 for stat in timings.values())
+    print(f"   {'ВСЕГО':<22} {sum(stat['query'] for stat in timings.values()):>11.3f} {total_render:>14.3f}")
 
-def main():
+def main(use_summary=False, jobs=1, stream_fetch=None, fetch_batch=None, hist_mode=None, use_cache=None,
+         report_filter=None):
     print("🚀 НАЧИНАЕМ СОЗДАНИЕ ГРАФИКОВ...")
     print("="*80)
     
     try:
-        create_visualizations()
+        create_visualizations(use_summary=use_summary, jobs=jobs, stream_fetch=stream_fetch,
+                              fetch_batch=fetch_batch, hist_mode=hist_mode, use_cache=use_cache,
+                              report_filter=report_filter)
         
         print("\n" + "="*80)
         print("✅ ВСЕ ГРАФИКИ УСПЕШНО СОЗДАНЫ!")
-        print("📁 Папка 'charts' содержит:")
+        print(f"📁 Папка '{CHARTS_DIR}' содержит:")
         
-        if os.path.exists('charts'):
-            files = os.listdir('charts')
+        if os.path.exists(CHARTS_DIR):
+            files = os.listdir(CHARTS_DIR)
             for i, file in enumerate(files, 1):
                 print(f"   {i}. {file}")
         else:
-            print("   Папка charts не найдена")
+            print(f"   Папка {CHARTS_DIR} не найдена")
             
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
+    finally:
+        print_query_stats()
+        tracing.print_trace_summary()
+        close_pool()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Создание статичных графиков")
+    parser.add_argument('--use-summary', action='store_true',
+                        help="читать данные из сводных таблиц (обновляются командой python summary.py)")
+    parser.add_argument('--jobs', type=int, default=CHART_JOBS_DEFAULT,
+                        help="число процессов для отрисовки графиков (по умолчанию AIRPORT_CHART_JOBS или 1)")
+    parser.add_argument('--stream-fetch', action='store_true', default=None,
+                        help="читать все запросы пачками с серверного курсора (fetchmany)")
+    parser.add_argument('--fetch-batch', type=int, default=None,
+                        help="размер пачки строк при потоковом чтении (по умолчанию AIRPORT_FETCH_BATCH)")
+    parser.add_argument('--hist-mode', choices=HIST_MODES, default=HIST_MODE,
+                        help="binned - интервалы гистограммы считаются в PostgreSQL, raw - строка на пассажира")
+    parser.add_argument('--no-render-cache', dest='use_cache', action='store_false', default=None,
+                        help="перерисовать все графики, даже если данные не изменились")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    report_filter = filter_from_args(parser, args)
+    if args.use_summary and not report_filter.is_empty:
+        parser.error("фильтры не поддерживаются вместе с --use-summary")
+    main(use_summary=args.use_summary, jobs=max(1, args.jobs), stream_fetch=args.stream_fetch,
+         fetch_batch=args.fetch_batch, hist_mode=args.hist_mode, use_cache=args.use_cache,
+         report_filter=report_filter)
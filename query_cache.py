@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'parquet'
+except ImportError:
+    # Без pyarrow результаты сохраняются в pickle
+    CACHE_FORMAT = 'pickle'
+
+try:
+    import fcntl
+except ImportError:
+    # На Windows модуля fcntl нет - индекс защищен только от потоков своего процесса
+    fcntl = None
+
+CACHE_ENABLED = os.environ.get('AIRPORT_QUERY_CACHE', '0').lower() in ('1', 'true', 'yes')
+CACHE_DIR = os.environ.get('AIRPORT_CACHE_DIR', os.path.join('.cache', 'queries'))
+CACHE_TTL = int(os.environ.get('AIRPORT_CACHE_TTL', '86400'))
+CACHE_MAX_BYTES = int(os.environ.get('AIRPORT_CACHE_MAX_MB', '512')) * 1024 * 1024
+# Как долго (в секундах) переиспользуется результат проверки версии данных внутри процесса
+DATA_VERSION_TTL = int(os.environ.get('AIRPORT_DATA_VERSION_TTL', '30'))
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+
+# Дешевая проверка версии данных: счетчики изменений по всем таблицам
+# плюс максимальные идентификаторы, которые видны сразу после коммита
+DATA_VERSION_QUERY = """
+SELECT
+    (SELECT md5(string_agg(relname || ':' || n_tup_ins || ':' || n_tup_upd || ':' || n_tup_del, ',' ORDER BY relname))
+     FROM pg_stat_user_tables),
+    (SELECT MAX(flight_id) FROM flights),
+    (SELECT MAX(created_at) FROM booking);
+"""
+
+_lock = threading.Lock()
+_version = {'value': None, 'checked_at': 0.0}
+
+
+def normalize_sql(query):
+    """Приводит SQL к каноническому виду: без лишних пробелов и завершающей точки с запятой"""
+    return re.sub(r'\s+', ' ', query).strip().rstrip(';').strip()
+
+
+def cache_key(query, params=None, context=None):
+    """
+    Ключ кэша по нормализованному тексту запроса, параметрам и контексту выполнения
+
+    context - все, от чего кроме SQL зависит результат (источник данных, приведение типов):
+    один и тот же запрос к PostgreSQL и к DuckDB или с compact и без него хранится отдельно.
+    """
+    payload = (normalize_sql(query) + '\n' + json.dumps(params, sort_keys=True, default=str)
+               + '\n' + json.dumps(context, sort_keys=True, default=str))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def data_version(conn):
+    """Возвращает текущую версию данных (результат кэшируется на DATA_VERSION_TTL секунд)"""
+    now = time.monotonic()
+    with _lock:
+        if _version['value'] is not None and now - _version['checked_at'] < DATA_VERSION_TTL:
+            return _version['value']
+
+    with conn.cursor() as cursor:
+        cursor.execute(DATA_VERSION_QUERY)
+        row = cursor.fetchone()
+    version = hashlib.sha256(repr(row).encode('utf-8')).hexdigest()[:16]
+
+    with _lock:
+        _version['value'] = version
+        _version['checked_at'] = now
+    return version
+
+
+def _index_path():
+    return os.path.join(CACHE_DIR, INDEX_FILE)
+
+
+def _data_path(key):
+    extension = 'parquet' if CACHE_FORMAT == 'parquet' else 'pkl'
+    return os.path.join(CACHE_DIR, f"{key}.{extension}")
+
+
+@contextmanager
+def _index_lock():
+    """
+    Блокировка индекса на чтение-изменение-запись: между потоками процесса и,
+    через flock на index.lock, между процессами (db.py, import.py, benchmark.py)
+    """
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, LOCK_FILE), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_atomic(path, write):
+    """Пишет файл во временный файл с уникальным именем и подменяет им path"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _load_index():
+    try:
+        with open(_index_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    # Атомарная запись: другой процесс не увидит наполовину записанный файл
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+    _write_atomic(_index_path(), write)
+
+
+def _remove_entry(index, key):
+    entry = index.pop(key, None)
+    if entry is not None:
+        try:
+            os.remove(os.path.join(CACHE_DIR, entry['file']))
+        except FileNotFoundError:
+            pass
+
+
+def get(key, version):
+    """Возвращает DataFrame из кэша или None, если запись устарела или отсутствует"""
+    if not os.path.exists(_index_path()):
+        return None
+    with _index_lock():
+        index = _load_index()
+        entry = index.get(key)
+        if entry is None:
+            return None
+
+        expired = time.time() - entry['created_at'] > CACHE_TTL
+        if expired or entry['data_version'] != version:
+            _remove_entry(index, key)
+            _save_index(index)
+            return None
+
+        path = os.path.join(CACHE_DIR, entry['file'])
+        try:
+            df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+        except (OSError, ValueError):
+            _remove_entry(index, key)
+            _save_index(index)
+            return None
+
+        entry['last_access'] = time.time()
+        _save_index(index)
+        return df
+
+
+def put(key, version, df, description=''):
+    """Сохраняет DataFrame в кэш и вытесняет давно не использованные записи при превышении лимита"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _data_path(key)
+    # Данные сериализуются вне блокировки: индекс занят только на время его обновления
+    if CACHE_FORMAT == 'parquet':
+        _write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+    else:
+        _write_atomic(path, df.to_pickle)
+
+    with _index_lock():
+        index = _load_index()
+        now = time.time()
+        index[key] = {
+            'file': os.path.basename(path),
+            'description': description,
+            'data_version': version,
+            'size': os.path.getsize(path),
+            'created_at': now,
+            'last_access': now,
+        }
+
+        total_size = sum(entry['size'] for entry in index.values())
+        for old_key in sorted(index, key=lambda k: index[k]['last_access']):
+            if total_size <= CACHE_MAX_BYTES or old_key == key:
+                break
+            total_size -= index[old_key]['size']
+            _remove_entry(index, old_key)
+
+        _save_index(index)
+
+
+def clear():
+    """Удаляет все записи кэша"""
+    if not os.path.exists(CACHE_DIR):
+        return
+    with _index_lock():
+        index = _load_index()
+        for key in list(index):
+            _remove_entry(index, key)
+        _save_index(index)
+
+
+def print_cache_stats():
+    """Выводит содержимое кэша"""
+    index = _load_index()
+    total_size = sum(entry['size'] for entry in index.values())
+    print(f"📦 Кэш запросов: {CACHE_DIR} ({CACHE_FORMAT})")
+    print(f"   Записей: {len(index)}, размер: {total_size / 1024:.1f} KB из {CACHE_MAX_BYTES / 1024 / 1024:.0f} MB")
+    for entry in sorted(index.values(), key=lambda e: e['last_access'], reverse=True):
+        age = time.time() - entry['created_at']
+        print(f"   • {entry['description'][:40]:<40} {entry['size'] / 1024:>8.1f} KB, возраст {age / 60:.0f} мин")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Управление кэшем результатов запросов")
+    parser.add_argument('--clear', action='store_true', help="очистить кэш")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+        print("🧹 Кэш запросов очищен")
+    print_cache_stats()
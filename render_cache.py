@@ -0,0 +1,77 @@
+import hashlib
+import inspect
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+# Кэш отрисованных графиков включен по умолчанию: PNG перерисовывается, только если изменились
+# данные, параметры стиля или код функции отрисовки
+CACHE_ENABLED = os.environ.get('AIRPORT_RENDER_CACHE', '1').lower() in ('1', 'true', 'yes')
+
+MANIFEST_FILE = 'render_manifest.json'
+
+
+def render_key(df, style, renderer=None):
+    """
+    Ключ графика: хэш данных (pd.util.hash_pandas_object), параметров стиля
+    и исходного кода функции отрисовки
+    """
+    digest = hashlib.sha256(json.dumps(style, sort_keys=True, default=str).encode('utf-8'))
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    if renderer is not None:
+        digest.update(inspect.getsource(renderer).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def load_manifest(charts_dir):
+    try:
+        with open(os.path.join(charts_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(charts_dir, manifest):
+    # Атомарная запись: параллельный запуск не увидит наполовину записанный файл
+    path = os.path.join(charts_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def lookup(manifest, charts_dir, name, key):
+    """Имя готового файла графика, если его ключ не изменился и файл на месте; иначе None"""
+    entry = manifest.get(name)
+    if entry is None or entry.get('key') != key:
+        return None
+    if not os.path.exists(os.path.join(charts_dir, entry['file'])):
+        return None
+    return entry['file']
+
+
+def remember(manifest, name, key, filename):
+    manifest[name] = {
+        'key': key,
+        'file': filename,
+        'rendered_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def forget(manifest, charts_dir, name):
+    """
+    Удаляет запись графика из манифеста вместе с его файлом (например, когда для графика
+    больше нет данных); возвращает имя удаленного файла или None
+    """
+    entry = manifest.pop(name, None)
+    if entry is None:
+        return None
+    try:
+        os.remove(os.path.join(charts_dir, entry['file']))
+    except FileNotFoundError:
+        pass
+    return entry['file']
@@ -0,0 +1,139 @@
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+
+@dataclass(frozen=True)
+class ReportFilter:
+    """
+    Фильтр отчетов, графиков и анимаций
+
+    Пустые поля выборку не ограничивают. Период применяется к дате вылета в запросах
+    по рейсам и к дате бронирования в запросах по бронированиям; date_to включительно.
+    Авиакомпании и аэропорты задаются названиями (airline_name, airport_name), аэропорт
+    подходит и для вылета, и для прилета. Страны (country_of_residence) ограничивают
+    только запросы по пассажирам и бронированиям.
+    """
+    date_from: date | None = None
+    date_to: date | None = None
+    airlines: tuple = ()
+    airports: tuple = ()
+    countries: tuple = ()
+
+    def __post_init__(self):
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValueError(f"Начало периода {self.date_from} позже конца {self.date_to}")
+        # Списки хранятся кортежами, чтобы фильтр оставался неизменяемым
+        for name in ('airlines', 'airports', 'countries'):
+            object.__setattr__(self, name, tuple(getattr(self, name) or ()))
+
+    @classmethod
+    def last_days(cls, days, today=None, **kwargs):
+        """Фильтр за последние days дней, включая сегодняшний"""
+        today = today or date.today()
+        return cls(date_from=today - timedelta(days=days - 1), date_to=today, **kwargs)
+
+    @property
+    def is_empty(self):
+        return not (self.date_from or self.date_to or self.airlines or self.airports or self.countries)
+
+    def params(self):
+        """Параметры запроса для run_query: пустые поля передаются как NULL"""
+        return {
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'airlines': list(self.airlines) or None,
+            'airports': list(self.airports) or None,
+            'countries': list(self.countries) or None,
+        }
+
+    def describe(self):
+        """Описание фильтра для вывода в консоль"""
+        if self.is_empty:
+            return "вся история, без фильтров"
+        parts = []
+        if self.date_from or self.date_to:
+            parts.append(f"период {self.date_from or '…'} — {self.date_to or '…'}")
+        for title, values in (("авиакомпании", self.airlines), ("аэропорты", self.airports),
+                              ("страны", self.countries)):
+            if values:
+                parts.append(f"{title}: {', '.join(values)}")
+        return "; ".join(parts)
+
+
+# --- Условия для SQL ---
+# Условия записаны так, что пустой параметр (NULL) превращает их в TRUE. PostgreSQL
+# сворачивает такие константы при планировании, поэтому при заданном фильтре остается
+# обычное сравнение, для которого используются индексы по scheduled_departure и created_at.
+
+def _flight_scope(alias):
+    return f"""(%(airlines)s::text[] IS NULL OR {alias}.airline_id IN (
+            SELECT airline_id FROM airline WHERE airline_name = ANY(%(airlines)s)))
+        AND (%(airports)s::text[] IS NULL
+             OR {alias}.departure_airport_id IN (SELECT airport_id FROM airport WHERE airport_name = ANY(%(airports)s))
+             OR {alias}.arrival_airport_id IN (SELECT airport_id FROM airport WHERE airport_name = ANY(%(airports)s)))"""
+
+
+def flight_filter(alias='f'):
+    """Условие на рейсы: дата вылета, авиакомпании и аэропорты вылета или прилета"""
+    return f"""(%(date_from)s::date IS NULL OR {alias}.scheduled_departure >= %(date_from)s::date)
+        AND (%(date_to)s::date IS NULL OR {alias}.scheduled_departure < %(date_to)s::date + INTERVAL '1 day')
+        AND {_flight_scope(alias)}"""
+
+
+def booking_filter(booking='b', booking_flight='bf', passenger='p'):
+    """
+    Условие на сегменты бронирований: дата бронирования, страна пассажира
+    и рейсы выбранных авиакомпаний и аэропортов
+
+    Если таблица passengers в запросе не соединяется, передайте passenger=None.
+    """
+    if passenger is not None:
+        country = f"{passenger}.country_of_residence = ANY(%(countries)s)"
+    else:
+        country = (f"{booking}.passenger_id IN (SELECT passenger_id FROM passengers "
+                   f"WHERE country_of_residence = ANY(%(countries)s))")
+    return f"""(%(date_from)s::date IS NULL OR {booking}.created_at >= %(date_from)s::date)
+        AND (%(date_to)s::date IS NULL OR {booking}.created_at < %(date_to)s::date + INTERVAL '1 day')
+        AND (%(countries)s::text[] IS NULL OR {country})
+        AND ((%(airlines)s::text[] IS NULL AND %(airports)s::text[] IS NULL)
+             OR {booking_flight}.flight_id IN (SELECT fx.flight_id FROM flights fx WHERE {_flight_scope('fx')}))"""
+
+
+# --- Аргументы командной строки ---
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается дата в формате ГГГГ-ММ-ДД: {value}")
+
+
+def add_filter_arguments(parser):
+    """Добавляет в parser общие флаги фильтра (--date-from, --last-days, --airline, ...)"""
+    group = parser.add_argument_group("фильтры")
+    group.add_argument('--date-from', type=_parse_date, help="начало периода, ГГГГ-ММ-ДД")
+    group.add_argument('--date-to', type=_parse_date, help="конец периода включительно, ГГГГ-ММ-ДД")
+    group.add_argument('--last-days', type=int, help="последние N дней (вместо --date-from/--date-to)")
+    group.add_argument('--airline', dest='airlines', action='append', default=[], metavar='НАЗВАНИЕ',
+                       help="авиакомпания; флаг можно повторять")
+    group.add_argument('--airport', dest='airports', action='append', default=[], metavar='НАЗВАНИЕ',
+                       help="аэропорт вылета или прилета; флаг можно повторять")
+    group.add_argument('--country', dest='countries', action='append', default=[], metavar='СТРАНА',
+                       help="страна проживания пассажиров; флаг можно повторять")
+    return group
+
+
+def filter_from_args(parser, args):
+    """Собирает ReportFilter из аргументов add_filter_arguments; ошибки выводятся через parser.error"""
+    scope = {'airlines': args.airlines, 'airports': args.airports, 'countries': args.countries}
+    try:
+        if args.last_days is not None:
+            if args.date_from or args.date_to:
+                parser.error("--last-days не сочетается с --date-from/--date-to")
+            if args.last_days < 1:
+                parser.error("--last-days должен быть положительным")
+            return ReportFilter.last_days(args.last_days, **scope)
+        return ReportFilter(date_from=args.date_from, date_to=args.date_to, **scope)
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,416 @@
+import argparse
+import importlib
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime
+
+from connection import get_connection, close_pool, BACKEND
+from report_filter import ReportFilter, add_filter_arguments, filter_from_args
+
+# Рекомендуемые индексы: (имя, таблица, колонки).
+# Покрывают соединения и фильтры запросов отчета, графиков и анимаций
+RECOMMENDED_INDEXES = [
+    ('flights_scheduled_departure_idx', 'flights', 'scheduled_departure'),
+    ('flights_airline_id_idx', 'flights', 'airline_id'),
+    ('flights_departure_airport_id_idx', 'flights', 'departure_airport_id'),
+    ('flights_arrival_airport_id_idx', 'flights', 'arrival_airport_id'),
+    ('booking_created_at_idx', 'booking', 'created_at'),
+    ('booking_passenger_id_idx', 'booking', 'passenger_id'),
+    ('booking_flight_booking_id_idx', 'booking_flight', 'booking_id'),
+    ('booking_flight_flight_id_idx', 'booking_flight', 'flight_id'),
+]
+
+# Помесячное секционирование: таблица -> (ключ секционирования, идентификатор).
+# Первичный ключ секционированной таблицы обязан включать ключ секционирования,
+# поэтому он становится составным: (идентификатор, ключ)
+PARTITIONED_TABLES = {
+    'flights': ('scheduled_departure', 'flight_id'),
+    'booking': ('created_at', 'booking_id'),
+}
+# Сколько месяцев вперед создаются секции для новых рейсов и бронирований
+PARTITION_MONTHS_AHEAD = int(os.environ.get('AIRPORT_PARTITION_AHEAD', '12'))
+
+EXPLAIN_DIR = 'benchmarks'
+
+
+# --- Индексы ---
+
+def _relkind(cursor, table):
+    """'r' - обычная таблица, 'p' - секционированная, None - таблицы нет"""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def index_ddl(name, table, column, partitioned=False):
+    """
+    DDL индекса: CONCURRENTLY не блокирует запись в таблицу, но для секционированной
+    таблицы не поддерживается - там индекс строится обычным образом на каждой секции
+    """
+    concurrently = '' if partitioned else 'CONCURRENTLY '
+    return f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({column});"
+
+
+def install_indexes(conn, indexes=None, dry_run=False):
+    """
+    Создает недостающие индексы и обновляет статистику таблиц
+
+    Returns:
+        list: Имена созданных индексов
+    """
+    indexes = indexes or RECOMMENDED_INDEXES
+    created = []
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    conn.commit()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for name, table, column in indexes:
+                kind = _relkind(cursor, table)
+                if kind is None:
+                    print(f"⚠️  {name}: таблицы {table} нет")
+                    continue
+                cursor.execute("""
+                SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s)
+                """, (name,))
+                row = cursor.fetchone()
+                if row and row[0]:
+                    print(f"✓ {name}: уже есть")
+                    continue
+                ddl = index_ddl(name, table, column, partitioned=kind == 'p')
+                if dry_run:
+                    print(f"   {ddl}")
+                    continue
+                if row:
+                    # Прерванная сборка CONCURRENTLY оставляет невалидный индекс, IF NOT EXISTS его пропустит
+                    print(f"⚠️  {name}: невалидный индекс после прерванной сборки, пересоздаем")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+                start = datetime.now()
+                cursor.execute(ddl)
+                print(f"✓ {name}: создан за {(datetime.now() - start).total_seconds():.1f} с")
+                created.append(name)
+            if created:
+                tables = sorted({table for name, table, _ in indexes if name in created})
+                cursor.execute("ANALYZE " + ", ".join(tables))
+    finally:
+        conn.autocommit = False
+    return created
+
+
+# --- Секционирование ---
+
+def _partition_name(table, month):
+    return f"{table}_y{month:%Y}m{month:%m}"
+
+
+def _month_starts(first, last):
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def _partition_blockers(cursor, table, key):
+    """
+    Причины, по которым таблицу нельзя секционировать автоматически
+
+    Внешние ключи других таблиц ссылаются на первичный ключ из одного идентификатора,
+    а у секционированной таблицы он составной - такие ссылки не перенести.
+    Строки без ключа секционирования не пройдут NOT NULL первичного ключа.
+    """
+    blockers = []
+    cursor.execute("""
+    SELECT conrelid::regclass::text, conname
+    FROM pg_constraint
+    WHERE contype = 'f' AND confrelid = %s::regclass
+    ORDER BY 1, 2
+    """, (table,))
+    for referencing, name in cursor.fetchall():
+        blockers.append(f"внешний ключ {referencing}.{name} ссылается на {table}")
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {key} IS NULL")
+    nulls = cursor.fetchone()[0]
+    if nulls:
+        blockers.append(f"{nulls:,} строк без {key}")
+    return blockers
+
+
+def partition_table(conn, table, dry_run=False):
+    """
+    Переводит таблицу на помесячное секционирование по диапазону
+
+    Данные копируются в новую секционированную таблицу, затем таблицы меняются
+    именами в одной транзакции. На время копирования таблица блокируется
+    на запись (LOCK ... IN EXCLUSIVE MODE, чтение не блокируется), поэтому строки,
+    записанные во время переноса, не теряются; запускать нужно в окно обслуживания.
+
+    Первичный ключ новой таблицы - (<идентификатор>, <ключ секционирования>),
+    внешние ключи на другие таблицы создаются заново, последовательность
+    идентификатора переходит к новой таблице. Если на таблицу ссылаются внешние ключи
+    или есть строки без ключа секционирования, таблица не меняется.
+    Прежняя таблица остается как <таблица>_unpartitioned (вместе с индексами) для отката;
+    строки вне диапазона секций попадают в секцию <таблица>_default.
+
+    Returns:
+        bool: Таблица была секционирована сейчас
+    """
+    key, id_column = PARTITIONED_TABLES[table]
+    with conn.cursor() as cursor:
+        kind = _relkind(cursor, table)
+        if kind == 'p':
+            print(f"✓ {table}: уже секционирована")
+            return False
+        if kind is None:
+            print(f"⚠️  {table}: таблицы нет")
+            return False
+
+        blockers = _partition_blockers(cursor, table, key)
+        if blockers:
+            print(f"\n⚠️  {table}: секционирование пропущено")
+            for reason in blockers:
+                print(f"   • {reason}")
+            return False
+
+        cursor.execute(f"""
+        SELECT date_trunc('month', MIN({key}))::date,
+               (date_trunc('month', GREATEST(MAX({key}), now())) + %s * INTERVAL '1 month')::date
+        FROM {table}
+        """, (PARTITION_MONTHS_AHEAD,))
+        first, last = cursor.fetchone()
+        months = list(_month_starts(first, last)) if first else []
+
+        cursor.execute("SELECT conname FROM pg_constraint WHERE contype = 'p' AND conrelid = %s::regclass",
+                       (table,))
+        row = cursor.fetchone()
+        old_pkey = row[0] if row else None
+        # LIKE не копирует внешние ключи - они создаются на новой таблице заново
+        cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = %s::regclass
+        ORDER BY conname
+        """, (table,))
+        foreign_keys = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, id_column))
+        sequence = cursor.fetchone()[0]
+
+        staging = f"{table}_partitioned"
+        statements = [
+            f"DROP TABLE IF EXISTS {staging};",
+            f"CREATE TABLE {staging} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS, "
+            f"CONSTRAINT {staging}_pkey PRIMARY KEY ({id_column}, {key})) "
+            f"PARTITION BY RANGE ({key});",
+        ]
+        for month, next_month in zip(months, months[1:]):
+            statements.append(f"CREATE TABLE {_partition_name(table, month)} PARTITION OF {staging} "
+                              f"FOR VALUES FROM ('{month}') TO ('{next_month}');")
+        statements += [
+            f"CREATE TABLE {table}_default PARTITION OF {staging} DEFAULT;",
+            # Запись в таблицу ждет до конца транзакции, чтение продолжается
+            f"LOCK TABLE {table} IN EXCLUSIVE MODE;",
+            f"INSERT INTO {staging} SELECT * FROM {table};",
+            f"ALTER TABLE {table} RENAME TO {table}_unpartitioned;",
+        ]
+        if old_pkey:
+            statements.append(f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {old_pkey} "
+                              f"TO {table}_unpartitioned_pkey;")
+        # Индексы прежней таблицы переименовываются, иначе IF NOT EXISTS не создаст их на новой
+        for name, index_table, _ in RECOMMENDED_INDEXES:
+            if index_table == table:
+                statements.append(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_unpartitioned;")
+        statements += [
+            f"ALTER TABLE {staging} RENAME TO {table};",
+            f"ALTER TABLE {table} RENAME CONSTRAINT {staging}_pkey TO {table}_pkey;",
+        ]
+        for name, definition in foreign_keys:
+            statements.append(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition};")
+        if sequence:
+            # Иначе DROP TABLE {table}_unpartitioned удалит последовательность вместе с DEFAULT новой таблицы
+            statements.append(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{id_column};")
+
+        print(f"\n🧱 {table}: {max(len(months) - 1, 0)} помесячных секций по {key} + {table}_default")
+        if dry_run:
+            print(f"   • первичный ключ: ({id_column}, {key}) - {id_column} уникален только в паре с {key}")
+            print(f"   • запись в {table} блокируется до конца переноса, чтение - нет")
+            print(f"   • внешних ключей на другие таблицы: {len(foreign_keys)}, создаются заново")
+            print(f"   • последовательность {id_column}: "
+                  f"{sequence + ' переходит к новой таблице' if sequence else 'нет'}")
+            for sql in statements:
+                print(f"   {sql}")
+            return False
+        start = datetime.now()
+        for sql in statements:
+            cursor.execute(sql)
+        cursor.execute(f"ANALYZE {table}")
+    conn.commit()
+    print(f"✓ {table}: секционирована за {(datetime.now() - start).total_seconds():.1f} с "
+          f"(прежняя таблица: {table}_unpartitioned)")
+    return True
+
+
+# --- EXPLAIN ---
+
+def tuning_queries():
+    """Запросы отчета (execute_complex_queries) и графиков (create_visualizations)"""
+    import db
+    # import.py нельзя импортировать обычным import - имя совпадает с ключевым словом
+    charts = importlib.import_module('import')
+    queries = {f"report:{name}": query for name, query in db.REPORT_QUERIES.items()}
+    queries.update({f"chart:{name}": query for name, query in charts.CHART_QUERIES.items()})
+    queries['chart:passenger_activity:binned'] = charts.HIST_BINNED_QUERY
+    return queries
+
+
+def _scan_name(node):
+    # Секции сворачиваются в имя родительской таблицы
+    relation = re.sub(r'_(y\d{4}m\d{2}|default)$', '', node['Relation Name'])
+    return f"{node['Node Type']} {node.get('Index Name') or relation}"
+
+
+def summarize_plan(plan):
+    """Время, стоимость, буферы и способы чтения таблиц из EXPLAIN (FORMAT JSON)"""
+    root = plan['Plan']
+    scans = Counter()
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        if 'Relation Name' in node:
+            scans[_scan_name(node)] += 1
+        nodes.extend(node.get('Plans', []))
+    return {
+        'execution_ms': plan['Execution Time'],
+        'planning_ms': plan['Planning Time'],
+        'total_cost': root['Total Cost'],
+        'shared_hit': root.get('Shared Hit Blocks', 0),
+        'shared_read': root.get('Shared Read Blocks', 0),
+        'seq_scans': sum(count for scan, count in scans.items() if scan.startswith('Seq Scan')),
+        'scans': dict(sorted(scans.items())),
+    }
+
+
+def explain_queries(conn, queries, params, repeat=3):
+    """
+    Выполняет EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) для каждого запроса
+
+    Время берется лучшее из repeat запусков (первый запуск прогревает кэш).
+
+    Returns:
+        dict: {запрос: сводка summarize_plan или {'error': текст}}
+    """
+    results = {}
+    with conn.cursor() as cursor:
+        for name, query in queries.items():
+            sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.strip().rstrip(';')
+            try:
+                runs = []
+                for _ in range(repeat):
+                    cursor.execute(sql, params)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    runs.append(summarize_plan(plan[0]))
+                results[name] = min(runs, key=lambda run: run['execution_ms'])
+                print(f"   {name:<40} {results[name]['execution_ms']:>10.1f} мс")
+            except Exception as e:
+                conn.rollback()
+                results[name] = {'error': str(e)}
+                print(f"   {name:<40} ❌ {e}")
+    return results
+
+
+def print_comparison(before, after):
+    """Печатает сравнение планов и времени выполнения до и после изменений схемы"""
+    print("\n📏 СРАВНЕНИЕ ПЛАНОВ (лучшее время из повторов):")
+    print(f"   {'Запрос':<40} {'До, мс':>10} {'После, мс':>10} {'Ускор.':>7} {'Seq Scan':>9} {'Блоки':>17}")
+    for name, old in before.items():
+        new = after.get(name, {})
+        if 'error' in old or 'error' in new:
+            error = old.get('error') or new.get('error') or ''
+            print(f"   {name:<40} ❌ {error.strip().splitlines()[0] if error.strip() else 'ошибка'}")
+            continue
+        speedup = old['execution_ms'] / new['execution_ms'] if new['execution_ms'] else float('inf')
+        blocks_old = old['shared_hit'] + old['shared_read']
+        blocks_new = new['shared_hit'] + new['shared_read']
+        print(f"   {name:<40} {old['execution_ms']:>10.1f} {new['execution_ms']:>10.1f} {speedup:>6.1f}x "
+              f"{old['seq_scans']:>4}→{new['seq_scans']:<4} {blocks_old:>8}→{blocks_new:<8}")
+        if old['scans'] != new['scans']:
+            removed = sorted(set(old['scans']) - set(new['scans']))
+            added = sorted(set(new['scans']) - set(old['scans']))
+            if removed:
+                print(f"      - {', '.join(removed)}")
+            if added:
+                print(f"      + {', '.join(added)}")
+
+
+def tune_schema(partition=False, dry_run=False, explain=True, repeat=3, report_filter=None):
+    """
+    Устанавливает рекомендуемые индексы (и секционирование) и сравнивает планы запросов
+
+    Args:
+        partition (bool): Секционировать flights и booking по месяцам
+        dry_run (bool): Только показать DDL, ничего не меняя
+        explain (bool): Замерить планы до и после изменений
+        repeat (int): Сколько раз выполнять каждый EXPLAIN ANALYZE
+        report_filter (ReportFilter): Параметры фильтра для запросов
+
+    Returns:
+        dict: {'before', 'after'} - сводки планов (пустой, если замер не выполнялся)
+    """
+    params = (report_filter or ReportFilter()).params()
+    explain = explain and not dry_run
+    report = {}
+    with get_connection() as conn:
+        if explain:
+            queries = tuning_queries()
+            print(f"\n🔍 ПЛАНЫ ДО ИЗМЕНЕНИЙ ({len(queries)} запросов):")
+            report['before'] = explain_queries(conn, queries, params, repeat)
+
+        if partition:
+            print("\n🧱 СЕКЦИОНИРОВАНИЕ ПО МЕСЯЦАМ")
+            for table in PARTITIONED_TABLES:
+                partition_table(conn, table, dry_run=dry_run)
+
+        print("\n📇 ИНДЕКСЫ")
+        install_indexes(conn, dry_run=dry_run)
+
+        if explain:
+            print("\n🔍 ПЛАНЫ ПОСЛЕ ИЗМЕНЕНИЙ:")
+            report['after'] = explain_queries(conn, queries, params, repeat)
+            print_comparison(report['before'], report['after'])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Рекомендуемые индексы и секционирование с проверкой через EXPLAIN")
+    parser.add_argument('--partition', action='store_true',
+                        help="секционировать flights и booking по месяцам (прежние таблицы сохраняются "
+                             "как <таблица>_unpartitioned)")
+    parser.add_argument('--dry-run', action='store_true', help="только показать DDL, ничего не меняя")
+    parser.add_argument('--no-explain', dest='explain', action='store_false',
+                        help="не сравнивать планы запросов до и после")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="сколько раз выполнять каждый EXPLAIN ANALYZE (берется лучшее время)")
+    parser.add_argument('--output', help="файл сравнения планов (по умолчанию benchmarks/explain_<время>.json)")
+    add_filter_arguments(parser)
+    args = parser.parse_args()
+    report_filter = filter_from_args(parser, args)
+    if BACKEND != 'postgres':
+        parser.error(f"индексы и секционирование настраиваются только в PostgreSQL (сейчас AIRPORT_BACKEND={BACKEND})")
+
+    print("🚀 НАСТРОЙКА СХЕМЫ БАЗЫ ДАННЫХ...")
+    print(f"🔎 Фильтр для запросов: {report_filter.describe()}")
+    print("="*80)
+    try:
+        report = tune_schema(partition=args.partition, dry_run=args.dry_run, explain=args.explain,
+                             repeat=max(1, args.repeat), report_filter=report_filter)
+    finally:
+        close_pool()
+
+    if report:
+        os.makedirs(EXPLAIN_DIR, exist_ok=True)
+        output = args.output or os.path.join(EXPLAIN_DIR, f"explain_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Сравнение планов сохранено: {output}")
+    print("\n✅ НАСТРОЙКА СХЕМЫ ЗАВЕРШЕНА")
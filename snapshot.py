@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from connection import get_connection, close_pool, BACKEND, POOL_MAX_CONN
+from duckdb_backend import SNAPSHOT_DIR
+from tracing import span, print_trace_summary
+
+# Таблицы снимка и колонка, по месяцам которой таблица делится на партиции (None - без партиций)
+SNAPSHOT_TABLES = {
+    'flights': 'scheduled_departure',
+    'booking': 'created_at',
+    'booking_flight': None,
+    'passengers': None,
+    'airline': None,
+    'airport': None,
+}
+
+# Сколько строк COPY держится в памяти одновременно (и попадает в один Parquet-файл)
+CHUNK_ROWS = int(os.environ.get('AIRPORT_SNAPSHOT_CHUNK', '500000'))
+# Число таблиц, выгружаемых одновременно (каждая - на своем подключении)
+SNAPSHOT_WORKERS = int(os.environ.get('AIRPORT_SNAPSHOT_WORKERS', '4'))
+
+STATE_FILE = '_snapshot.json'
+SUCCESS_FILE = '_SUCCESS'
+# Партиции пишутся во временную папку и подменяют готовые только целиком
+STAGING_DIR = '_staging'
+NULL_PARTITION = 'month=unknown'
+
+INTEGER_TYPES = {'smallint', 'integer', 'bigint'}
+FLOAT_TYPES = {'numeric', 'real', 'double precision'}
+DATETIME_TYPES = {'date', 'timestamp without time zone', 'timestamp with time zone'}
+
+COLUMNS_QUERY = """
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = %(table)s
+ORDER BY ordinal_position;
+"""
+
+
+def _column_types(conn, table):
+    """
+    Типы колонок для чтения CSV: целые - nullable Int64, чтобы тип не зависел
+    от того, есть ли в пачке пустые значения
+
+    Returns:
+        tuple: (список колонок, dtype для read_csv, колонки с датами)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(COLUMNS_QUERY, {'table': table})
+        columns = cursor.fetchall()
+    if not columns:
+        raise ValueError(f"Таблица {table} не найдена")
+
+    dtypes = {}
+    parse_dates = []
+    for name, data_type in columns:
+        if data_type in INTEGER_TYPES:
+            dtypes[name] = 'Int64'
+        elif data_type in FLOAT_TYPES:
+            dtypes[name] = 'float64'
+        elif data_type == 'boolean':
+            dtypes[name] = 'boolean'
+        elif data_type in DATETIME_TYPES:
+            parse_dates.append(name)
+        else:
+            dtypes[name] = 'object'
+    return [name for name, _ in columns], dtypes, parse_dates
+
+
+def month_partitions(values):
+    """Имена папок партиций для значений даты: month=YYYY-MM, для пустых - NULL_PARTITION"""
+    return pd.to_datetime(values).dt.strftime('month=%Y-%m').fillna(NULL_PARTITION)
+
+
+def copy_chunks(conn, sql, columns, dtypes, parse_dates, chunk_rows):
+    """
+    Выполняет COPY ... TO STDOUT и отдает результат пачками DataFrame
+
+    COPY пишет в канал (os.pipe) в отдельном потоке, а pandas читает CSV из канала
+    по chunk_rows строк, поэтому память ограничена размером пачки.
+    """
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, 'wb') as sink, conn.cursor() as cursor:
+                cursor.copy_expert(sql, sink)
+        except Exception as e:
+            errors.append(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        with os.fdopen(read_fd, 'rb') as source:
+            try:
+                reader = pd.read_csv(source, names=columns, header=None, dtype=dtypes, parse_dates=parse_dates,
+                                     true_values=['t'], false_values=['f'], chunksize=chunk_rows)
+                yield from reader
+            except pd.errors.EmptyDataError:
+                # COPY не вернул ни одной строки
+                pass
+    finally:
+        # Если чтение прервано, COPY получит ошибку записи в закрытый канал и завершится
+        producer.join()
+    if errors:
+        raise errors[0]
+
+
+def _swap_in(staging_path, final_path):
+    """Подменяет готовую партицию новой: старая удаляется только после переименования новой"""
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    old_path = staging_path + '.old'
+    if os.path.exists(final_path):
+        os.replace(final_path, old_path)
+    os.replace(staging_path, final_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def export_table(table, output_dir, run_id, chunk_rows=None, snapshot_id=None):
+    """
+    Выгружает таблицу в <output_dir>/<table>/[month=YYYY-MM/]part-NNNNN.parquet
+
+    Таблица читается одним COPY (одно последовательное чтение вместо прохода на каждый
+    месяц) и всегда целиком из одного снимка: партиции, готовые после прерванного
+    запуска, перезаписываются, чтобы не смешивать данные разных снимков.
+
+    Returns:
+        dict: строки, файлы, партиции и время
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    table_dir = os.path.join(output_dir, table)
+    stats = {'rows': 0, 'files': 0, 'partitions': 0}
+    start = time.perf_counter()
+
+    with span(f"snapshot:{table}") as stage, get_connection() as conn:
+        if snapshot_id is not None:
+            # Все таблицы читаются из одного снимка данных PostgreSQL
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+
+        columns, dtypes, parse_dates = _column_types(conn, table)
+        column = SNAPSHOT_TABLES[table]
+        select = f"SELECT {', '.join(columns)} FROM {table}"
+        if column is not None:
+            # Таблица читается одним проходом, а строки раскладываются по месяцам на клиенте.
+            # Сортировка по месяцу дает каждую партицию одним непрерывным куском:
+            # как только пошел следующий месяц, предыдущий готов и подменяет прежний
+            select += f" ORDER BY date_trunc('month', {column}) NULLS LAST"
+        sql = f"COPY ({select}) TO STDOUT WITH (FORMAT csv)"
+
+        def stage_path(partition):
+            return os.path.join(output_dir, STAGING_DIR, table, partition or 'table')
+
+        def open_partition(partition):
+            path = stage_path(partition)
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+            return {'name': partition, 'rows': 0, 'files': 0}
+
+        def finish(partition):
+            path = stage_path(partition['name'])
+            if partition['files'] == 0:
+                # Пустой файл со схемой, чтобы таблица оставалась в снимке
+                empty = pd.DataFrame({name: pd.Series(dtype=dtypes.get(name, 'datetime64[ns]')) for name in columns})
+                empty.to_parquet(os.path.join(path, "part-00000.parquet"), index=False)
+                partition['files'] = 1
+            with open(os.path.join(path, SUCCESS_FILE), 'w', encoding='utf-8') as f:
+                f.write(run_id)
+            name = partition['name']
+            _swap_in(path, os.path.join(table_dir, name) if name else table_dir)
+            stats['rows'] += partition['rows']
+            stats['files'] += partition['files']
+            stats['partitions'] += 1
+            print(f"✓ {table}{'/' + name if name else ''}: {partition['rows']:,} строк")
+
+        current = None
+        written = set()
+        for chunk in copy_chunks(conn, sql, columns, dtypes, parse_dates, chunk_rows):
+            if column is None:
+                pieces = [(None, chunk)]
+            else:
+                pieces = chunk.groupby(month_partitions(chunk[column]), sort=False)
+            for name, piece in pieces:
+                if current is None or current['name'] != name:
+                    if current is not None:
+                        finish(current)
+                    current = open_partition(name)
+                    written.add(name)
+                piece.to_parquet(os.path.join(stage_path(name), f"part-{current['files']:05d}.parquet"), index=False)
+                current['rows'] += len(piece)
+                current['files'] += 1
+        if current is None:
+            # Пустая таблица: одна партиция без строк (у таблиц с месяцами - NULL_PARTITION)
+            current = open_partition(None if column is None else NULL_PARTITION)
+            written.add(current['name'])
+        finish(current)
+
+        if column is not None:
+            # Месяцы, которых больше нет в таблице, и файлы прежнего формата удаляются
+            for name in os.listdir(table_dir) if os.path.isdir(table_dir) else []:
+                if name not in written:
+                    path = os.path.join(table_dir, name)
+                    shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+        stage['rows'] = stats['rows']
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def _load_state(output_dir):
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(output_dir, state):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def _resume_state(output_dir, tables, restart=False):
+    """
+    Состояние выгрузки: продолжение незавершенного запуска или новый запуск
+
+    Returns:
+        tuple: (состояние, таблицы, уже выгруженные прерванным запуском)
+    """
+    state = _load_state(output_dir)
+    if state.get('run_id') and not state.get('finished_at') and not restart:
+        done = [table for table in tables if table in state['tables']]
+        print(f"↩️  Продолжаем незавершенную выгрузку от {state['started_at']}")
+        if done:
+            print(f"   Уже выгружены: {', '.join(done)}. Остальные таблицы выгружаются из нового снимка -")
+            print("   согласованность между таблицами не гарантируется (--restart выгрузит все заново)")
+        return state, done
+    state = {'run_id': uuid.uuid4().hex, 'started_at': datetime.now().isoformat(timespec='seconds'),
+             'finished_at': None, 'tables': {}}
+    _save_state(output_dir, state)
+    return state, []
+
+
+def export_snapshot(output_dir=None, tables=None, workers=None, chunk_rows=None, restart=False):
+    """
+    Выгружает таблицы airport_db в Parquet с разбиением по месяцам
+
+    Таблицы выгружаются параллельно из одного снимка данных PostgreSQL.
+    Если предыдущий запуск не завершился, полностью выгруженные им таблицы
+    пропускаются, а остальные выгружаются заново целиком (restart=True начинает
+    выгрузку всех таблиц заново). Снимок PostgreSQL прерванного запуска уже закрыт,
+    поэтому после продолжения каждая таблица согласована сама по себе, но таблицы
+    из разных запусков могут не совпадать между собой (например, бронирования
+    без рейсов); согласованный между таблицами снимок дает только --restart.
+
+    Args:
+        output_dir (str): Папка снимка (по умолчанию AIRPORT_SNAPSHOT_DIR)
+        tables (list): Выгружать только эти таблицы
+        workers (int): Число таблиц, выгружаемых одновременно
+        chunk_rows (int): Строк в одной пачке (и в одном Parquet-файле)
+        restart (bool): Не продолжать незавершенный запуск
+    """
+    if BACKEND != 'postgres':
+        raise RuntimeError(f"Снимок выгружается из PostgreSQL (сейчас AIRPORT_BACKEND={BACKEND})")
+
+    if POOL_MAX_CONN < 2:
+        raise RuntimeError("Для выгрузки нужно минимум два подключения в пуле (AIRPORT_DB_POOL_MAX)")
+
+    output_dir = output_dir or SNAPSHOT_DIR
+    tables = tables or list(SNAPSHOT_TABLES)
+    os.makedirs(output_dir, exist_ok=True)
+
+    state, done = _resume_state(output_dir, tables, restart)
+
+    # Одно подключение держит снимок данных, остальные выгружают таблицы
+    pending = [table for table in tables if table not in done]
+    workers = max(1, min(workers or SNAPSHOT_WORKERS, len(pending) or 1, POOL_MAX_CONN - 1))
+    print(f"📦 Выгрузка {len(pending)} таблиц в {os.path.abspath(output_dir)}, потоков: {workers}")
+
+    failed = []
+    with get_connection() as coordinator:
+        with coordinator.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot_id = cursor.fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {table: executor.submit(export_table, table, output_dir, state['run_id'],
+                                              chunk_rows, snapshot_id)
+                       for table in pending}
+            for table, future in futures.items():
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"✗ Ошибка выгрузки '{table}': {e}")
+                    failed.append(table)
+                    continue
+                state['tables'][table] = {**stats, 'finished_at': datetime.now().isoformat(timespec='seconds')}
+                _save_state(output_dir, state)
+
+    shutil.rmtree(os.path.join(output_dir, STAGING_DIR), ignore_errors=True)
+    if failed:
+        print(f"\n❌ Не выгружены таблицы: {', '.join(failed)}. Повторный запуск продолжит с места сбоя")
+        return False
+
+    state['finished_at'] = datetime.now().isoformat(timespec='seconds')
+    _save_state(output_dir, state)
+
+    print("\n📊 СНИМОК ТАБЛИЦ:")
+    print(f"   {'Таблица':<16} {'Строк':>12} {'Партиций':>9} {'Файлов':>7} {'Время (с)':>10}  Запуск")
+    for table in tables:
+        stats = state['tables'][table]
+        run = 'прежний' if table in done else 'текущий'
+        print(f"   {table:<16} {stats['rows']:>12,} {stats['partitions']:>9} {stats['files']:>7} "
+              f"{stats['seconds']:>10.1f}  {run}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка таблиц airport_db в Parquet с разбиением по месяцам")
+    parser.add_argument('--output', default=None, help=f"папка снимка (по умолчанию {SNAPSHOT_DIR})")
+    parser.add_argument('--tables', nargs='+', choices=list(SNAPSHOT_TABLES), help="выгружать только эти таблицы")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"число таблиц, выгружаемых одновременно (по умолчанию {SNAPSHOT_WORKERS})")
+    parser.add_argument('--chunk-rows', type=int, default=None,
+                        help=f"строк в пачке и в одном файле (по умолчанию {CHUNK_ROWS})")
+    parser.add_argument('--restart', action='store_true',
+                        help="начать заново, даже если предыдущая выгрузка не завершилась")
+    args = parser.parse_args()
+
+    try:
+        success = export_snapshot(output_dir=args.output, tables=args.tables, workers=args.workers,
+                                  chunk_rows=args.chunk_rows, restart=args.restart)
+        print_trace_summary()
+    finally:
+        close_pool()
+    if not success:
+        raise SystemExit(1)
@@ -0,0 +1,494 @@
+import argparse
+import os
+
+from connection import get_connection, close_pool, BACKEND
+
+# Сколько последних дней вылетов пересчитывается при каждом обновлении:
+# статусы рейсов (задержка, отмена) меняются уже после их создания
+FLIGHT_LOOKBACK_DAYS = int(os.environ.get('AIRPORT_SUMMARY_LOOKBACK_DAYS', '7'))
+
+# Сводные таблицы создаются через CREATE TABLE AS ... WITH NO DATA,
+# чтобы типы колонок совпадали с исходными таблицами
+SUMMARY_DDL = """
+CREATE TABLE IF NOT EXISTS summary_watermark (
+    source TEXT PRIMARY KEY,
+    last_id BIGINT,
+    last_ts TIMESTAMP,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Рейсы по дням, авиакомпаниям, аэропортам и статусам
+CREATE TABLE IF NOT EXISTS summary_flight_daily AS
+SELECT
+    f.scheduled_departure::date as flight_day,
+    f.airline_id,
+    f.departure_airport_id,
+    f.arrival_airport_id,
+    f.status,
+    COUNT(*) as flights_count,
+    SUM(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600) as duration_hours_sum,
+    COUNT(f.scheduled_arrival - f.scheduled_departure) as duration_count
+FROM flights f
+GROUP BY 1, 2, 3, 4, 5
+WITH NO DATA;
+CREATE INDEX IF NOT EXISTS summary_flight_daily_day_idx ON summary_flight_daily (flight_day);
+
+-- Бронирования (имеющие хотя бы один сегмент) по дням и странам проживания
+CREATE TABLE IF NOT EXISTS summary_booking_daily AS
+SELECT
+    b.created_at::date as booking_day,
+    p.country_of_residence,
+    COUNT(DISTINCT b.booking_id) as bookings_count,
+    COUNT(b.booking_id) as booking_legs
+FROM booking b
+JOIN passengers p ON b.passenger_id = p.passenger_id
+JOIN booking_flight bf ON b.booking_id = bf.booking_id
+GROUP BY 1, 2
+WITH NO DATA;
+CREATE INDEX IF NOT EXISTS summary_booking_daily_day_idx ON summary_booking_daily (booking_day);
+
+-- Уникальные пассажиры и рейсы не суммируются между днями,
+-- поэтому для них храним множества (страна/месяц, идентификатор)
+CREATE TABLE IF NOT EXISTS summary_country_passenger AS
+SELECT p.country_of_residence, p.passenger_id FROM passengers p WITH NO DATA;
+
+CREATE TABLE IF NOT EXISTS summary_country_flight AS
+SELECT p.country_of_residence, bf.flight_id
+FROM passengers p, booking_flight bf WITH NO DATA;
+
+CREATE TABLE IF NOT EXISTS summary_month_passenger AS
+SELECT date_trunc('month', b.created_at)::date as booking_month, b.passenger_id
+FROM booking b WITH NO DATA;
+
+CREATE TABLE IF NOT EXISTS summary_month_flight AS
+SELECT date_trunc('month', b.created_at)::date as booking_month, bf.flight_id
+FROM booking b, booking_flight bf WITH NO DATA;
+"""
+
+# Пересчет рейсов за дни начиная с %(since)s (NULL - полный пересчет)
+REFRESH_FLIGHTS_SQL = [
+    ("summary_flight_daily: удаление", """
+    DELETE FROM summary_flight_daily
+    WHERE %(since)s::date IS NULL OR flight_day >= %(since)s::date OR flight_day IS NULL;
+    """),
+    ("summary_flight_daily: вставка", """
+    INSERT INTO summary_flight_daily
+    SELECT
+        f.scheduled_departure::date,
+        f.airline_id,
+        f.departure_airport_id,
+        f.arrival_airport_id,
+        f.status,
+        COUNT(*),
+        SUM(EXTRACT(EPOCH FROM (f.scheduled_arrival - f.scheduled_departure))/3600),
+        COUNT(f.scheduled_arrival - f.scheduled_departure)
+    FROM flights f
+    WHERE %(since)s::date IS NULL OR f.scheduled_departure >= %(since)s::date OR f.scheduled_departure IS NULL
+    GROUP BY 1, 2, 3, 4, 5;
+    """),
+]
+
+# Пересчет бронирований, созданных начиная с дня %(since)s (NULL - полный пересчет)
+REFRESH_BOOKINGS_SQL = [
+    ("summary_booking_daily: удаление", """
+    DELETE FROM summary_booking_daily
+    WHERE %(since)s::date IS NULL OR booking_day >= %(since)s::date;
+    """),
+    ("summary_booking_daily: вставка", """
+    INSERT INTO summary_booking_daily
+    SELECT
+        b.created_at::date,
+        p.country_of_residence,
+        COUNT(DISTINCT b.booking_id),
+        COUNT(b.booking_id)
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE %(since)s::date IS NULL OR b.created_at >= %(since)s::date
+    GROUP BY 1, 2;
+    """),
+    ("summary_country_passenger", """
+    INSERT INTO summary_country_passenger
+    SELECT DISTINCT p.country_of_residence, p.passenger_id
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE %(since)s::date IS NULL OR b.created_at >= %(since)s::date
+    EXCEPT
+    SELECT country_of_residence, passenger_id FROM summary_country_passenger;
+    """),
+    ("summary_country_flight", """
+    INSERT INTO summary_country_flight
+    SELECT DISTINCT p.country_of_residence, bf.flight_id
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE %(since)s::date IS NULL OR b.created_at >= %(since)s::date
+    EXCEPT
+    SELECT country_of_residence, flight_id FROM summary_country_flight;
+    """),
+    ("summary_month_passenger", """
+    INSERT INTO summary_month_passenger
+    SELECT DISTINCT date_trunc('month', b.created_at)::date, p.passenger_id
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE b.created_at IS NOT NULL
+      AND (%(since)s::date IS NULL OR b.created_at >= %(since)s::date)
+    EXCEPT
+    SELECT booking_month, passenger_id FROM summary_month_passenger;
+    """),
+    ("summary_month_flight", """
+    INSERT INTO summary_month_flight
+    SELECT DISTINCT date_trunc('month', b.created_at)::date, bf.flight_id
+    FROM booking b
+    JOIN passengers p ON b.passenger_id = p.passenger_id
+    JOIN booking_flight bf ON b.booking_id = bf.booking_id
+    WHERE b.created_at IS NOT NULL
+      AND (%(since)s::date IS NULL OR b.created_at >= %(since)s::date)
+    EXCEPT
+    SELECT booking_month, flight_id FROM summary_month_flight;
+    """),
+]
+
+SUMMARY_TABLES = [
+    'summary_flight_daily', 'summary_booking_daily',
+    'summary_country_passenger', 'summary_country_flight',
+    'summary_month_passenger', 'summary_month_flight',
+]
+
+# Запросы отчета db.py поверх сводных таблиц (те же листы и колонки).
+# Выполняются с параметрами ReportFilter, поэтому знак процента экранирован: %%
+SUMMARY_REPORT_QUERIES = {
+    'airline_performance': """
+    SELECT
+        al.airline_name as "Авиакомпания",
+        al.airline_country as "Страна",
+        SUM(s.flights_count)::bigint as "Всего рейсов",
+        COALESCE(SUM(s.flights_count) FILTER (WHERE s.status = 'On Time'), 0)::bigint as "Пунктуальные рейсы",
+        ROUND(COALESCE(SUM(s.flights_count) FILTER (WHERE s.status = 'On Time'), 0) * 100.0 / SUM(s.flights_count), 2) as "Пунктуальность %%",
+        COALESCE(SUM(s.flights_count) FILTER (WHERE s.status = 'Delayed'), 0)::bigint as "Задержанные рейсы",
+        COALESCE(SUM(s.flights_count) FILTER (WHERE s.status = 'Cancelled'), 0)::bigint as "Отмененные рейсы",
+        ROUND(SUM(s.duration_hours_sum) / NULLIF(SUM(s.duration_count), 0), 2) as "Ср. продолжительность (ч)"
+    FROM summary_flight_daily s
+    JOIN airline al ON s.airline_id = al.airline_id
+    GROUP BY al.airline_id, al.airline_name, al.airline_country
+    HAVING SUM(s.flights_count) > 0
+    ORDER BY "Всего рейсов" DESC;
+    """,
+
+    'airport_traffic': """
+    WITH legs AS (
+        SELECT s.departure_airport_id as airport_id, s.airline_id,
+               s.flights_count as departures, 0 as arrivals, s.flights_count as flights_count
+        FROM summary_flight_daily s
+        UNION ALL
+        -- Рейс с вылетом и прилетом в одном аэропорту учитывается один раз
+        SELECT s.arrival_airport_id as airport_id, s.airline_id,
+               0 as departures, s.flights_count as arrivals,
+               CASE WHEN s.arrival_airport_id = s.departure_airport_id THEN 0 ELSE s.flights_count END as flights_count
+        FROM summary_flight_daily s
+    ),
+    traffic AS (
+        SELECT
+            l.airport_id,
+            SUM(l.departures)::bigint as departures,
+            SUM(l.arrivals)::bigint as arrivals,
+            SUM(l.flights_count)::bigint as total_flights,
+            COUNT(DISTINCT al.airline_id) as airlines_count
+        FROM legs l
+        LEFT JOIN airline al ON l.airline_id = al.airline_id
+        GROUP BY l.airport_id
+    )
+    SELECT
+        a.airport_name as "Аэропорт",
+        a.city as "Город",
+        a.country as "Страна",
+        t.departures as "Рейсы на вылет",
+        t.arrivals as "Рейсы на прилет",
+        t.total_flights as "Общее количество рейсов",
+        t.airlines_count as "Количество авиакомпаний"
+    FROM traffic t
+    JOIN airport a ON a.airport_id = t.airport_id
+    ORDER BY "Общее количество рейсов" DESC;
+    """,
+
+    'passenger_activity': """
+    WITH country_bookings AS (
+        SELECT country_of_residence, SUM(booking_legs)::bigint as booking_legs
+        FROM summary_booking_daily
+        GROUP BY country_of_residence
+    ),
+    country_passengers AS (
+        SELECT country_of_residence, COUNT(passenger_id) as passengers_count
+        FROM summary_country_passenger
+        GROUP BY country_of_residence
+    ),
+    country_flights AS (
+        SELECT country_of_residence, COUNT(flight_id) as flights_count
+        FROM summary_country_flight
+        GROUP BY country_of_residence
+    )
+    SELECT
+        cb.country_of_residence as "Страна проживания",
+        cp.passengers_count as "Количество пассажиров",
+        cb.booking_legs as "Всего бронирований",
+        COALESCE(cf.flights_count, 0) as "Уникальных рейсов",
+        ROUND(cb.booking_legs * 1.0 / cp.passengers_count, 2) as "Ср. бронирований на пассажира",
+        ROUND(COALESCE(cf.flights_count, 0) * 1.0 / cp.passengers_count, 2) as "Ср. рейсов на пассажира"
+    FROM country_bookings cb
+    JOIN country_passengers cp ON cp.country_of_residence IS NOT DISTINCT FROM cb.country_of_residence
+    LEFT JOIN country_flights cf ON cf.country_of_residence IS NOT DISTINCT FROM cb.country_of_residence
+    WHERE cp.passengers_count > 1
+    ORDER BY "Всего бронирований" DESC;
+    """,
+
+    'monthly_statistics': """
+    WITH month_bookings AS (
+        SELECT date_trunc('month', booking_day)::date as booking_month, SUM(bookings_count)::bigint as bookings_count
+        FROM summary_booking_daily
+        WHERE booking_day IS NOT NULL
+        GROUP BY 1
+    ),
+    month_passengers AS (
+        SELECT booking_month, COUNT(passenger_id) as passengers_count
+        FROM summary_month_passenger
+        GROUP BY booking_month
+    ),
+    month_flights AS (
+        SELECT booking_month, COUNT(flight_id) as flights_count
+        FROM summary_month_flight
+        GROUP BY booking_month
+    )
+    SELECT
+        TO_CHAR(mb.booking_month, 'YYYY-MM') as "Месяц",
+        TO_CHAR(mb.booking_month, 'Month YYYY') as "Период",
+        mb.bookings_count as "Количество бронирований",
+        mp.passengers_count as "Уникальные пассажиры",
+        COALESCE(mf.flights_count, 0) as "Уникальные рейсы",
+        ROUND(mb.bookings_count * 1.0 / mp.passengers_count, 2) as "Активность пассажиров"
+    FROM month_bookings mb
+    JOIN month_passengers mp ON mp.booking_month = mb.booking_month
+    LEFT JOIN month_flights mf ON mf.booking_month = mb.booking_month
+    ORDER BY "Месяц";
+    """,
+
+    'route_popularity': """
+    SELECT
+        dep.airport_name as "Аэропорт вылета",
+        dep.city as "Город вылета",
+        arr.airport_name as "Аэропорт прилета",
+        arr.city as "Город прилета",
+        SUM(s.flights_count)::bigint as "Количество рейсов",
+        COUNT(DISTINCT al.airline_id) as "Количество авиакомпаний",
+        ROUND(SUM(s.duration_hours_sum) / NULLIF(SUM(s.duration_count), 0), 2) as "Ср. время в пути (ч)"
+    FROM summary_flight_daily s
+    JOIN airport dep ON s.departure_airport_id = dep.airport_id
+    JOIN airport arr ON s.arrival_airport_id = arr.airport_id
+    JOIN airline al ON s.airline_id = al.airline_id
+    GROUP BY dep.airport_name, dep.city, arr.airport_name, arr.city
+    HAVING SUM(s.flights_count) > 1
+    ORDER BY "Количество рейсов" DESC
+    LIMIT 50;
+    """
+}
+
+# Запросы графиков import.py поверх сводных таблиц. Гистограмма активности
+# пассажиров требует данных по каждому пассажиру и всегда читает исходные таблицы
+SUMMARY_CHART_QUERIES = {
+    'status_distribution': """
+    SELECT
+        status,
+        SUM(flights_count)::bigint as count_flights,
+        ROUND(SUM(flights_count) * 100.0 / (SELECT SUM(flights_count) FROM summary_flight_daily), 1) as percentage
+    FROM summary_flight_daily
+    WHERE status IS NOT NULL
+    GROUP BY status
+    ORDER BY count_flights DESC;
+    """,
+
+    'top_airlines': """
+    SELECT
+        a.airline_name,
+        a.airline_country,
+        SUM(s.flights_count)::bigint as total_flights,
+        ROUND(COALESCE(SUM(s.flights_count) FILTER (WHERE s.status = 'On Time'), 0) * 100.0 / SUM(s.flights_count), 1) as on_time_percent
+    FROM summary_flight_daily s
+    JOIN airline a ON s.airline_id = a.airline_id
+    GROUP BY a.airline_id, a.airline_name, a.airline_country
+    HAVING SUM(s.flights_count) >= 5
+    ORDER BY total_flights DESC
+    LIMIT 10;
+    """,
+
+    'busiest_airports': """
+    WITH legs AS (
+        SELECT s.departure_airport_id as airport_id,
+               s.flights_count as departures, 0 as arrivals, s.flights_count as flights_count
+        FROM summary_flight_daily s
+        UNION ALL
+        SELECT s.arrival_airport_id as airport_id,
+               0 as departures, s.flights_count as arrivals,
+               CASE WHEN s.arrival_airport_id = s.departure_airport_id THEN 0 ELSE s.flights_count END as flights_count
+        FROM summary_flight_daily s
+    ),
+    traffic AS (
+        SELECT
+            airport_id,
+            SUM(flights_count)::bigint as total_flights,
+            SUM(departures)::bigint as departures,
+            SUM(arrivals)::bigint as arrivals
+        FROM legs
+        GROUP BY airport_id
+    )
+    SELECT
+        ap.airport_name,
+        ap.city,
+        ap.country,
+        t.total_flights,
+        t.departures,
+        t.arrivals
+    FROM traffic t
+    JOIN airport ap ON ap.airport_id = t.airport_id
+    ORDER BY total_flights DESC
+    LIMIT 15;
+    """,
+
+    'seasonality': """
+    SELECT
+        EXTRACT(MONTH FROM booking_day) as month_num,
+        TO_CHAR(booking_day, 'Month') as month_name,
+        SUM(bookings_count)::bigint as bookings_count
+    FROM summary_booking_daily
+    WHERE booking_day IS NOT NULL
+    GROUP BY EXTRACT(MONTH FROM booking_day), TO_CHAR(booking_day, 'Month')
+    ORDER BY month_num;
+    """,
+
+    'country_activity': """
+    WITH country_bookings AS (
+        SELECT country_of_residence, SUM(booking_legs)::bigint as total_bookings
+        FROM summary_booking_daily
+        GROUP BY country_of_residence
+    ),
+    country_passengers AS (
+        SELECT country_of_residence, COUNT(passenger_id) as passengers_count
+        FROM summary_country_passenger
+        GROUP BY country_of_residence
+    ),
+    country_flights AS (
+        SELECT country_of_residence, COUNT(flight_id) as unique_flights
+        FROM summary_country_flight
+        GROUP BY country_of_residence
+    )
+    SELECT
+        cb.country_of_residence as country,
+        cp.passengers_count,
+        COALESCE(cf.unique_flights, 0) as unique_flights,
+        cb.total_bookings
+    FROM country_bookings cb
+    JOIN country_passengers cp ON cp.country_of_residence IS NOT DISTINCT FROM cb.country_of_residence
+    LEFT JOIN country_flights cf ON cf.country_of_residence IS NOT DISTINCT FROM cb.country_of_residence
+    WHERE cp.passengers_count >= 3
+    ORDER BY passengers_count DESC;
+    """
+}
+
+
+def _read_watermarks(cursor):
+    cursor.execute("SELECT source, last_id, last_ts FROM summary_watermark")
+    return {source: (last_id, last_ts) for source, last_id, last_ts in cursor.fetchall()}
+
+
+def _save_watermark(cursor, source, last_id=None, last_ts=None):
+    cursor.execute("""
+    INSERT INTO summary_watermark (source, last_id, last_ts, refreshed_at)
+    VALUES (%(source)s, %(last_id)s, %(last_ts)s, now())
+    ON CONFLICT (source) DO UPDATE
+    SET last_id = EXCLUDED.last_id, last_ts = EXCLUDED.last_ts, refreshed_at = EXCLUDED.refreshed_at;
+    """, {'source': source, 'last_id': last_id, 'last_ts': last_ts})
+
+
+def _run_steps(cursor, steps, params):
+    for description, sql in steps:
+        cursor.execute(sql, params)
+        print(f"✓ {description}: {cursor.rowcount} строк")
+
+
+def refresh_summaries(conn, full=False, lookback_days=None):
+    """
+    Обновляет сводные таблицы
+
+    Рейсы пересчитываются за дни начиная с самого раннего из: дня вылета новых рейсов
+    (flight_id больше сохраненного) и последних lookback_days дней. Бронирования
+    пересчитываются начиная с дня последнего обработанного booking.created_at.
+    Бронирования без created_at учитываются только при полном пересчете.
+
+    Args:
+        conn: Подключение к базе данных
+        full (bool): Полностью пересобрать сводные таблицы
+        lookback_days (int): Сколько последних дней вылетов пересчитать заново
+    """
+    if lookback_days is None:
+        lookback_days = FLIGHT_LOOKBACK_DAYS
+
+    with conn.cursor() as cursor:
+        cursor.execute(SUMMARY_DDL)
+        watermarks = {} if full else _read_watermarks(cursor)
+
+        # Рейсы
+        last_flight_id = watermarks.get('flights', (None, None))[0]
+        if last_flight_id is None:
+            flights_since = None
+        else:
+            cursor.execute("""
+            SELECT LEAST(
+                CURRENT_DATE - %(lookback)s::int,
+                (SELECT MIN(scheduled_departure)::date FROM flights WHERE flight_id > %(last_id)s)
+            );
+            """, {'lookback': lookback_days, 'last_id': last_flight_id})
+            flights_since = cursor.fetchone()[0]
+        print(f"\n✈️  РЕЙСЫ: пересчет {'полный' if flights_since is None else f'с {flights_since}'}")
+        _run_steps(cursor, REFRESH_FLIGHTS_SQL, {'since': flights_since})
+        cursor.execute("SELECT MAX(flight_id) FROM flights")
+        _save_watermark(cursor, 'flights', last_id=cursor.fetchone()[0])
+
+        # Бронирования
+        last_created_at = watermarks.get('booking', (None, None))[1]
+        if last_created_at is None:
+            # Множества уникальных значений пересобираются с нуля
+            for table in SUMMARY_TABLES[2:]:
+                cursor.execute(f"TRUNCATE {table}")
+            bookings_since = None
+        else:
+            # Последний день пересчитывается целиком: SQL приводит водяной знак к дате
+            bookings_since = last_created_at
+        print(f"\n🎫 БРОНИРОВАНИЯ: пересчет {'полный' if bookings_since is None else f'с {bookings_since:%Y-%m-%d}'}")
+        _run_steps(cursor, REFRESH_BOOKINGS_SQL, {'since': bookings_since})
+        cursor.execute("SELECT MAX(created_at) FROM booking")
+        _save_watermark(cursor, 'booking', last_ts=cursor.fetchone()[0])
+
+        cursor.execute("ANALYZE " + ", ".join(SUMMARY_TABLES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обновление сводных таблиц для отчетов и графиков")
+    parser.add_argument('--full', action='store_true',
+                        help="полностью пересобрать сводные таблицы")
+    parser.add_argument('--lookback-days', type=int, default=None,
+                        help=f"сколько последних дней вылетов пересчитать (по умолчанию {FLIGHT_LOOKBACK_DAYS})")
+    args = parser.parse_args()
+    if BACKEND != 'postgres':
+        # Сводные таблицы живут в рабочей базе; в снимок они попадают вместе с остальными таблицами
+        parser.error(f"сводные таблицы обновляются только в PostgreSQL (сейчас AIRPORT_BACKEND={BACKEND})")
+
+    print("🚀 ОБНОВЛЕНИЕ СВОДНЫХ ТАБЛИЦ...")
+    print("="*80)
+    try:
+        with get_connection() as conn:
+            refresh_summaries(conn, full=args.full, lookback_days=args.lookback_days)
+        print("\n✅ СВОДНЫЕ ТАБЛИЦЫ ОБНОВЛЕНЫ")
+    except Exception as e:
+        print(f"❌ Ошибка обновления сводных таблиц: {e}")
+    finally:
+        close_pool()
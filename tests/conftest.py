@@ -0,0 +1,45 @@
+"""
+Общие фикстуры: синтетический снимок таблиц (generate_data.py --target parquet)
+и переключение connection.py на DuckDB поверх этого снимка
+
+Тестам на снимке PostgreSQL не нужен; без pandas, pyarrow или duckdb они пропускаются.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Объем синтетической базы: несколько тысяч рейсов и бронирований за два года
+SNAPSHOT_ROWS = 20_000
+
+
+@pytest.fixture(scope='session')
+def snapshot_dir(tmp_path_factory):
+    """Папка со снимком таблиц в Parquet (одна на все тесты)"""
+    pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    import generate_data
+
+    path = tmp_path_factory.mktemp('snapshot')
+    generate_data.generate(SNAPSHOT_ROWS, target='parquet', output_dir=str(path))
+    return path
+
+
+@pytest.fixture
+def duckdb_snapshot(snapshot_dir, tmp_path, monkeypatch):
+    """Запросы run_query выполняются в DuckDB над снимком; кэш запросов - во временной папке"""
+    pytest.importorskip('duckdb')
+    pytest.importorskip('psycopg2')
+    import connection
+    import duckdb_backend
+    import query_cache
+
+    connection.close_pool()
+    monkeypatch.setattr(connection, 'BACKEND', 'duckdb')
+    monkeypatch.setattr(duckdb_backend, 'SNAPSHOT_DIR', str(snapshot_dir))
+    monkeypatch.setattr(query_cache, 'CACHE_ENABLED', False)
+    monkeypatch.setattr(query_cache, 'CACHE_DIR', str(tmp_path / 'query_cache'))
+    yield snapshot_dir
+    connection.close_pool()
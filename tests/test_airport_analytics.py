@@ -0,0 +1,98 @@
+"""
+Граф задач airport_analytics.py: порядок выполнения, передача результатов,
+отказы зависимостей и критический путь
+"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('pandas')
+pytest.importorskip('matplotlib')
+pytest.importorskip('psycopg2')
+
+from airport_analytics import Task, run_graph, critical_path  # noqa: E402
+
+
+def _graph(*tasks):
+    return {task.name: task for task in tasks}
+
+
+def test_results_flow_to_dependents():
+    tasks = _graph(
+        Task('a', lambda inputs: 1),
+        Task('b', lambda inputs: 2),
+        Task('sum', lambda inputs: inputs['a'] + inputs['b'], deps=('a', 'b')),
+        Task('double', lambda inputs: inputs['sum'] * 2, deps=('sum',)),
+    )
+    run_graph(tasks, workers=2)
+    assert all(task.error is None for task in tasks.values())
+    assert tasks['double'].result == 6
+    # Промежуточный результат освобождается, когда его получили все потребители
+    assert tasks['a'].result is None and tasks['sum'].result is None
+    assert tasks['sum'].start >= max(tasks['a'].end, tasks['b'].end)
+
+
+def test_independent_tasks_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+    tasks = _graph(Task('left', lambda inputs: barrier.wait()), Task('right', lambda inputs: barrier.wait()))
+    run_graph(tasks, workers=2)
+    # С одним потоком барьер не дождался бы второй задачи
+    assert tasks['left'].error is None and tasks['right'].error is None
+
+
+def test_failure_skips_dependents_only():
+    def fail(inputs):
+        raise ValueError("нет данных")
+
+    tasks = _graph(
+        Task('query', fail),
+        Task('report', lambda inputs: 'xlsx', deps=('query',)),
+        Task('publish', lambda inputs: 'ok', deps=('report',)),
+        Task('other', lambda inputs: 'png'),
+    )
+    run_graph(tasks, workers=2)
+    assert tasks['query'].error == "нет данных"
+    assert tasks['report'].error == tasks['publish'].error == "не выполнена зависимость"
+    assert tasks['report'].start is None
+    assert tasks['other'].error is None and tasks['other'].result == 'png'
+
+
+def test_cycle_is_reported():
+    tasks = _graph(Task('a', lambda inputs: 1, deps=('b',)), Task('b', lambda inputs: 2, deps=('a',)))
+    run_graph(tasks, workers=1)
+    assert tasks['a'].error == tasks['b'].error == "цикл в графе задач"
+
+
+def _sleep(seconds):
+    return lambda inputs: time.sleep(seconds)
+
+
+def test_critical_path_follows_latest_dependency():
+    tasks = _graph(
+        Task('fast', _sleep(0.01)),
+        Task('slow', _sleep(0.2)),
+        Task('join', _sleep(0.01), deps=('fast', 'slow')),
+        Task('side', _sleep(0.01)),
+    )
+    run_graph(tasks, workers=4)
+    assert [task.name for task in critical_path(tasks)] == ['slow', 'join']
+
+
+def test_critical_path_of_graph_that_did_not_run():
+    assert critical_path(_graph(Task('a', lambda inputs: 1))) == []
+
+
+def test_run_builds_timeline_once(duckdb_snapshot, tmp_path, monkeypatch):
+    import airport_analytics
+    monkeypatch.chdir(tmp_path)
+    html_dir = tmp_path / 'html'
+
+    assert airport_analytics.run(['timeline'], html_dir=str(html_dir))
+    dashboard = html_dir / 'dashboard.html'
+    mtime = dashboard.stat().st_mtime_ns
+    assert '"type":"pie"' in dashboard.read_text(encoding='utf-8')
+
+    # Данные и код не изменились - артефакт не пересобирается
+    assert airport_analytics.run(['timeline'], html_dir=str(html_dir))
+    assert dashboard.stat().st_mtime_ns == mtime
@@ -0,0 +1,123 @@
+"""
+Регрессионный тест: трафик аэропортов через UNION ALL вылетов и прилетов
+дает тот же результат, что и прежний запрос с OR в условии соединения
+
+Тест загружает синтетические данные (generate_data.py) в отдельную базу и очищает ее таблицы,
+поэтому база задается явно: AIRPORT_TEST_DB_NAME (остальные параметры - как AIRPORT_DB_*).
+Без нее или без доступа к PostgreSQL тест пропускается.
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('psycopg2')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import connection  # noqa: E402
+from report_filter import ReportFilter  # noqa: E402
+
+TEST_DB = os.environ.get('AIRPORT_TEST_DB_NAME')
+
+# Запросы до перехода на UNION ALL
+OLD_AIRPORT_TRAFFIC = """
+SELECT
+    a.airport_name as "Аэропорт",
+    a.city as "Город",
+    a.country as "Страна",
+    COUNT(DISTINCT CASE WHEN f.departure_airport_id = a.airport_id THEN f.flight_id END) as "Рейсы на вылет",
+    COUNT(DISTINCT CASE WHEN f.arrival_airport_id = a.airport_id THEN f.flight_id END) as "Рейсы на прилет",
+    COUNT(DISTINCT f.flight_id) as "Общее количество рейсов",
+    COUNT(DISTINCT al.airline_id) as "Количество авиакомпаний"
+FROM airport a
+LEFT JOIN flights f ON a.airport_id = f.departure_airport_id OR a.airport_id = f.arrival_airport_id
+LEFT JOIN airline al ON f.airline_id = al.airline_id
+GROUP BY a.airport_id, a.airport_name, a.city, a.country
+HAVING COUNT(DISTINCT f.flight_id) > 0
+ORDER BY "Общее количество рейсов" DESC;
+"""
+
+OLD_BUSIEST_AIRPORTS = """
+SELECT
+    ap.airport_name,
+    ap.city,
+    ap.country,
+    COUNT(DISTINCT f.flight_id) as total_flights,
+    COUNT(DISTINCT CASE WHEN f.departure_airport_id = ap.airport_id THEN f.flight_id END) as departures,
+    COUNT(DISTINCT CASE WHEN f.arrival_airport_id = ap.airport_id THEN f.flight_id END) as arrivals
+FROM airport ap
+LEFT JOIN flights f ON ap.airport_id = f.departure_airport_id OR ap.airport_id = f.arrival_airport_id
+GROUP BY ap.airport_id, ap.airport_name, ap.city, ap.country
+HAVING COUNT(DISTINCT f.flight_id) > 0
+ORDER BY total_flights DESC
+LIMIT 15;
+"""
+
+# Крайние случаи, которых может не оказаться в синтетических данных:
+# вылет и прилет в одном аэропорту, неизвестный аэропорт, неизвестная авиакомпания
+EDGE_FLIGHTS_SQL = """
+INSERT INTO flights (flight_id, flight_no, airline_id, departure_airport_id, arrival_airport_id,
+                     scheduled_departure, scheduled_arrival, status)
+SELECT m.max_id + v.n, 'TST' || v.n, v.airline_id, v.dep, v.arr,
+       TIMESTAMP '2024-06-01 10:00', TIMESTAMP '2024-06-01 12:00', 'On Time'
+FROM (SELECT COALESCE(MAX(flight_id), 0) as max_id FROM flights) m,
+     (VALUES (1, 1, 1, 1), (2, 1, NULL, 2), (3, 1, 2, NULL), (4, -1, 1, 2)) as v(n, airline_id, dep, arr);
+"""
+
+
+@pytest.fixture(scope='module')
+def generated_db():
+    if not TEST_DB:
+        pytest.skip("AIRPORT_TEST_DB_NAME не задана")
+    if TEST_DB == connection.DB_CONFIG['database']:
+        pytest.skip("AIRPORT_TEST_DB_NAME совпадает с AIRPORT_DB_NAME - тест очищает таблицы")
+
+    connection.close_pool()
+    original_db = connection.DB_CONFIG['database']
+    connection.DB_CONFIG['database'] = TEST_DB
+    try:
+        try:
+            with connection.get_connection():
+                pass
+        except Exception as e:
+            pytest.skip(f"PostgreSQL недоступен: {e}")
+
+        import generate_data
+        generate_data.generate(20_000, target='postgres', create_schema=True, truncate=True)
+        with connection.get_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(EDGE_FLIGHTS_SQL)
+            cursor.execute("ANALYZE;")
+        yield
+    finally:
+        connection.close_pool()
+        connection.DB_CONFIG['database'] = original_db
+
+
+def _fetch(query, params=None):
+    df = connection.run_query(query, "test", params=params, use_cache=False, compact=False)
+    # Порядок строк с одинаковым числом рейсов не определен
+    return df.sort_values(list(df.columns), kind='mergesort').reset_index(drop=True)
+
+
+def _without_limit(query):
+    # Граница LIMIT при равном числе рейсов может пройти по разным аэропортам
+    return query.replace('LIMIT 15', '')
+
+
+def test_airport_traffic_matches_or_join(generated_db):
+    import db
+    new = _fetch(db.REPORT_QUERIES['airport_traffic'], ReportFilter().params())
+    old = _fetch(OLD_AIRPORT_TRAFFIC)
+    assert len(new) > 0
+    pd.testing.assert_frame_equal(new, old)
+
+
+def test_busiest_airports_matches_or_join(generated_db):
+    charts = importlib.import_module('import')
+    new = _fetch(_without_limit(charts.CHART_QUERIES['busiest_airports']), ReportFilter().params())
+    old = _fetch(_without_limit(OLD_BUSIEST_AIRPORTS))
+    assert len(new) > 0
+    pd.testing.assert_frame_equal(new, old)
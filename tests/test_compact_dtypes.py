@@ -0,0 +1,76 @@
+"""
+compact_dtypes: приведение результатов запросов к компактным типам
+"""
+import datetime as dt
+from decimal import Decimal
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+np = pytest.importorskip('numpy')
+
+import compact_dtypes  # noqa: E402
+from compact_dtypes import compact_dtypes as compact  # noqa: E402
+
+
+@pytest.mark.parametrize('dtype', [object, None])
+def test_repeated_text_becomes_ordered_category(monkeypatch, dtype):
+    # dtype=None - тип по умолчанию: object в pandas 2, строковый 'str' в pandas 3
+    monkeypatch.setattr(compact_dtypes, 'CATEGORY_MIN_ROWS', 10)
+    df = pd.DataFrame({'status': ['Scheduled', 'Delayed', None, 'Arrived'] * 5}, dtype=dtype)
+    result = compact(df)
+    assert isinstance(result['status'].dtype, pd.CategoricalDtype)
+    assert result['status'].cat.ordered
+    assert list(result['status'].cat.categories) == ['Arrived', 'Delayed', 'Scheduled']
+    # Значения, пропуски, min/max и сортировка - как у строк
+    assert result['status'].isna().sum() == 5
+    assert result['status'].max() == 'Scheduled'
+    assert result['status'].astype(object).fillna('').tolist() == df['status'].fillna('').tolist()
+
+
+def test_small_or_unique_text_is_not_categorized(monkeypatch):
+    monkeypatch.setattr(compact_dtypes, 'CATEGORY_MIN_ROWS', 10)
+    small = pd.DataFrame({'name': ['a', 'b', 'a']})
+    unique = pd.DataFrame({'name': [f"n{i}" for i in range(20)]})
+    assert compact(small)['name'].dtype == small['name'].dtype
+    assert compact(unique)['name'].dtype == unique['name'].dtype
+
+
+def test_integers_downcast_to_int32_only_when_they_fit():
+    df = pd.DataFrame({'small': np.array([1, -5, 2**31 - 1], dtype='int64'),
+                       'large': np.array([1, 2, 2**40], dtype='int64')})
+    result = compact(df)
+    assert result['small'].dtype == 'int32'
+    assert result['large'].dtype == 'int64'
+    assert result['small'].tolist() == df['small'].tolist()
+
+
+def test_decimal_and_dates():
+    df = pd.DataFrame({
+        'price': [Decimal('1.25'), None, Decimal('3.50')],
+        'created_at': [dt.datetime(2024, 1, 1, 10), None, dt.datetime(2024, 2, 1)],
+        'day': [dt.date(2024, 1, 1), dt.date(2024, 1, 2), None],
+    })
+    result = compact(df)
+    assert result['price'].dtype == 'float64'
+    assert result['price'].iloc[2] == 3.5
+    assert pd.api.types.is_datetime64_dtype(result['created_at'])
+    assert pd.api.types.is_datetime64_dtype(result['day'])
+    assert result['created_at'].isna().sum() == 1
+
+
+def test_timezone_aware_values_are_left_as_is():
+    tz = dt.timezone(dt.timedelta(hours=3))
+    df = pd.DataFrame({'at': [dt.datetime(2024, 1, 1, tzinfo=tz), dt.datetime(2024, 1, 2, tzinfo=dt.timezone.utc)]},
+                      dtype=object)
+    assert compact(df)['at'].dtype == object
+
+
+def test_source_frame_is_not_modified_and_memory_shrinks(monkeypatch):
+    monkeypatch.setattr(compact_dtypes, 'CATEGORY_MIN_ROWS', 10)
+    df = pd.DataFrame({'status': ['On Time', 'Delayed'] * 500, 'flights': np.arange(1000, dtype='int64')})
+    dtypes = df.dtypes.copy()
+    result = compact(df)
+    assert df.dtypes.equals(dtypes)
+    assert list(result.columns) == list(df.columns)
+    assert compact_dtypes.memory_bytes(result) < compact_dtypes.memory_bytes(df)
@@ -0,0 +1,80 @@
+"""
+Перевод запросов из диалекта PostgreSQL в DuckDB (duckdb_backend.translate):
+текст запроса и результат его выполнения во встроенной DuckDB
+"""
+import pytest
+
+from duckdb_backend import translate
+
+
+@pytest.fixture(scope='module')
+def duck():
+    duckdb = pytest.importorskip('duckdb')
+    conn = duckdb.connect(database=':memory:')
+    yield conn
+    conn.close()
+
+
+def _scalar(duck, query, params=None):
+    sql, values = translate(query, params)
+    return duck.execute(sql, values).fetchone()[0]
+
+
+def test_named_params_become_dollar_params():
+    sql, params = translate("SELECT %(a)s, 7 %% 2", {'a': 1, 'unused': 2})
+    assert sql == "SELECT $a, 7 % 2"
+    # DuckDB не принимает параметры, которых нет в запросе
+    assert params == {'a': 1}
+
+
+def test_positional_params():
+    sql, params = translate("SELECT %s + %s", (1, 2))
+    assert sql == "SELECT ? + ?"
+    assert params == [1, 2]
+
+
+def test_percent_kept_without_params():
+    # Без параметров psycopg2 не трогает %, поэтому и перевод оставляет %% как есть
+    assert translate("SELECT 'a%%b'") == ("SELECT 'a%%b'", None)
+
+
+def test_any_becomes_list_contains(duck):
+    sql, _ = translate("SELECT 1 WHERE f.airline_name = ANY(%(airlines)s)", {'airlines': ['A']})
+    assert sql == "SELECT 1 WHERE list_contains($airlines, f.airline_name)"
+    assert _scalar(duck, "SELECT 'b' = ANY(%(names)s)", {'names': ['a', 'b']}) is True
+    assert _scalar(duck, "SELECT 'c' = ANY(%(names)s)", {'names': ['a', 'b']}) is False
+
+
+@pytest.mark.parametrize('template, expected', [
+    ('YYYY-MM', '2024-05'),
+    ('DD.MM.YYYY HH24:MI:SS', '03.05.2024 14:07:09'),
+    # 'Month' дополняется пробелами до 9 символов, как в PostgreSQL
+    ('Month YYYY', 'May       2024'),
+    ('FMMonth', 'May'),
+])
+def test_to_char(duck, template, expected):
+    query = f"SELECT TO_CHAR(TIMESTAMP '2024-05-03 14:07:09', '{template}')"
+    assert _scalar(duck, query) == expected
+
+
+def test_to_char_nested_call(duck):
+    query = "SELECT TO_CHAR(date_trunc('month', TIMESTAMP '2024-05-03 14:07:09'), 'YYYY-MM-DD')"
+    assert _scalar(duck, query) == '2024-05-01'
+
+
+def test_extract_epoch(duck):
+    query = "SELECT EXTRACT(EPOCH FROM (TIMESTAMP '2024-01-01 02:30' - TIMESTAMP '2024-01-01 00:00'))"
+    assert _scalar(duck, query) == 9000
+    # Остальные поля EXTRACT DuckDB понимает сам
+    assert _scalar(duck, "SELECT EXTRACT(MONTH FROM DATE '2024-05-03')") == 5
+
+
+@pytest.mark.parametrize('value, bucket', [(-1, 0), (0, 1), (3.9, 2), (9.99, 5), (10, 6), (25, 6)])
+def test_width_bucket_matches_postgres(duck, value, bucket):
+    assert _scalar(duck, f"SELECT width_bucket({value}, 0, 10, 5)") == bucket
+
+
+def test_percentile_cont(duck):
+    query = ("SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY x) "
+             "FROM (VALUES (1), (2), (3), (10)) as t(x)")
+    assert _scalar(duck, query) == 2.5
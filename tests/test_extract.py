@@ -0,0 +1,123 @@
+"""
+Базовая выгрузка (extract.py) дает те же таблицы отчета, графиков и анимаций,
+что и отдельные SQL-запросы db.py, import.py и airport_timeline.py
+
+Запросы выполняются в DuckDB над синтетическим снимком.
+"""
+import importlib
+from datetime import date
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('duckdb')
+pytest.importorskip('psycopg2')
+
+import extract  # noqa: E402
+from report_filter import ReportFilter  # noqa: E402
+
+# Запросы с LIMIT: строки с тем же значением, что у последней строки, могут отобраться по-разному
+LIMIT_ORDER = {
+    'top_airlines': 'total_flights',
+    'busiest_airports': 'total_flights',
+    'route_popularity': "Количество рейсов",
+}
+
+
+def _plain(df):
+    """Категории -> исходные значения, строки - в одном порядке"""
+    df = df.copy()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+    return df.sort_values(list(df.columns), kind='mergesort').reset_index(drop=True)
+
+
+def assert_same_frame(name, from_sql, from_extract):
+    assert list(from_extract.columns) == list(from_sql.columns), name
+    assert len(from_extract) == len(from_sql), name
+    order = LIMIT_ORDER.get(name.rsplit(':', 1)[-1])
+    if order is not None:
+        assert sorted(from_extract[order]) == sorted(from_sql[order]), name
+        boundary = from_sql[order].min()
+        from_sql = from_sql[from_sql[order] > boundary]
+        from_extract = from_extract[from_extract[order] > boundary]
+    pd.testing.assert_frame_equal(_plain(from_extract), _plain(from_sql), check_dtype=False,
+                                  obj=name)
+
+
+def _sql_frames(queries, report_filter):
+    import connection
+    return {name: connection.run_query(query, name, params=report_filter.params(), use_cache=False)
+            for name, query in queries.items()}
+
+
+def check_parity(report_filter):
+    """Сравнивает все таблицы выгрузки с запросами при заданном фильтре"""
+    import airport_timeline
+    import db
+    charts = importlib.import_module('import')
+
+    base = extract.load_base_extract(report_filter=report_filter)
+    expected = {
+        'report': (_sql_frames(db.REPORT_QUERIES, report_filter), extract.report_frames(base)),
+        'charts': (_sql_frames(charts.CHART_QUERIES, report_filter), extract.chart_frames(base)),
+        'timeline': (_sql_frames({'monthly': airport_timeline.TIMELINE_AGG_QUERY}, report_filter),
+                     {'monthly': extract.timeline_monthly_frame(base)}),
+    }
+    for kind, (from_sql, from_extract) in expected.items():
+        assert set(from_extract) == set(from_sql), kind
+        for name in from_sql:
+            assert_same_frame(f"{kind}:{name}", from_sql[name], from_extract[name])
+    return expected
+
+
+def test_extract_matches_queries(duckdb_snapshot):
+    frames = check_parity(ReportFilter())
+    # Синтетические данные покрывают все таблицы
+    for kind, (from_sql, _) in frames.items():
+        for name, df in from_sql.items():
+            assert len(df) > 0, f"{kind}:{name}"
+
+
+def _report_filter(kind, snapshot_dir):
+    airlines = pd.read_parquet(snapshot_dir / 'airline')['airline_name']
+    airports = pd.read_parquet(snapshot_dir / 'airport')['airport_name']
+    passengers = pd.read_parquet(snapshot_dir / 'passengers')['country_of_residence']
+    return {
+        'dates': ReportFilter(date_from=date(2024, 3, 1), date_to=date(2024, 8, 31)),
+        'airlines': ReportFilter(airlines=tuple(airlines[:2])),
+        'airports': ReportFilter(airports=tuple(airports[:2])),
+        'countries': ReportFilter(countries=tuple(passengers.value_counts().index[:2])),
+        'combined': ReportFilter(date_from=date(2024, 5, 1), airlines=tuple(airlines[:3]),
+                                 countries=tuple(passengers.value_counts().index[:3])),
+    }[kind]
+
+
+@pytest.mark.parametrize('kind', ['dates', 'airlines', 'airports', 'countries', 'combined'])
+def test_extract_matches_queries_with_filter(duckdb_snapshot, kind):
+    report_filter = _report_filter(kind, duckdb_snapshot)
+    frames = check_parity(report_filter)
+    from_sql, _ = frames['charts']
+    assert len(from_sql['seasonality']) > 0
+
+
+def test_run_all_passes_filter_to_renderers(duckdb_snapshot, monkeypatch):
+    import airport_timeline
+    import db
+    charts = importlib.import_module('import')
+    calls = {}
+
+    def record(name):
+        return lambda **kwargs: calls.setdefault(name, kwargs)
+
+    monkeypatch.setattr(db, 'generate_comprehensive_report', record('report'))
+    monkeypatch.setattr(charts, 'create_visualizations', record('charts'))
+    monkeypatch.setattr(airport_timeline, 'create_correct_timeline', record('timeline'))
+
+    report_filter = _report_filter('dates', duckdb_snapshot)
+    extract.run_all(report_filter=report_filter)
+    assert set(calls) == {'report', 'charts', 'timeline'}
+    for kwargs in calls.values():
+        # Подписи и описание фильтра в отчете, графиках и анимациях - того же фильтра
+        assert kwargs['report_filter'] == report_filter
@@ -0,0 +1,82 @@
+"""
+Кэш результатов запросов: ключи, попадания, промахи и сброс при изменении данных
+"""
+import os
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import query_cache  # noqa: E402
+
+QUERY = "SELECT status, COUNT(*) as flights FROM flights f GROUP BY status ORDER BY status;"
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_cache, 'CACHE_DIR', str(tmp_path / 'queries'))
+    return tmp_path / 'queries'
+
+
+def test_key_ignores_whitespace_but_not_params_or_context():
+    key = query_cache.cache_key(QUERY, {'a': 1}, {'backend': 'duckdb', 'compact': True})
+    assert key == query_cache.cache_key("  " + QUERY.replace(' ', '\n  ').rstrip(';'), {'a': 1},
+                                        {'compact': True, 'backend': 'duckdb'})
+    assert key != query_cache.cache_key(QUERY, {'a': 2}, {'backend': 'duckdb', 'compact': True})
+    assert key != query_cache.cache_key(QUERY, {'a': 1}, {'backend': 'postgres', 'compact': True})
+    assert key != query_cache.cache_key(QUERY, {'a': 1}, {'backend': 'duckdb', 'compact': False})
+
+
+def test_put_get_and_version_change(cache_dir):
+    df = pd.DataFrame({'status': ['Delayed', 'On Time'], 'flights': [3, 5]})
+    key = query_cache.cache_key(QUERY)
+    assert query_cache.get(key, 'v1') is None
+
+    query_cache.put(key, 'v1', df, "test")
+    pd.testing.assert_frame_equal(query_cache.get(key, 'v1'), df)
+
+    # Другая версия данных - промах, запись удаляется вместе с файлом
+    assert query_cache.get(key, 'v2') is None
+    assert query_cache.get(key, 'v1') is None
+    assert [name for name in os.listdir(cache_dir) if name.startswith(key)] == []
+
+
+def test_clear(cache_dir):
+    query_cache.put(query_cache.cache_key(QUERY), 'v1', pd.DataFrame({'a': [1]}))
+    query_cache.clear()
+    assert query_cache.get(query_cache.cache_key(QUERY), 'v1') is None
+
+
+def _cache_hits(count):
+    """Попадания в кэш у последних count запросов (по статистике connection.QUERY_STATS)"""
+    import connection
+    return [stat['description'].endswith('(кэш)') for stat in connection.QUERY_STATS[-count:]]
+
+
+def test_run_query_hits_cache_until_snapshot_changes(duckdb_snapshot, tmp_path, monkeypatch):
+    import shutil
+
+    import connection
+    import duckdb_backend
+
+    # Копия снимка: тест дописывает в нее файл
+    snapshot = tmp_path / 'snapshot'
+    shutil.copytree(duckdb_snapshot, snapshot)
+    monkeypatch.setattr(duckdb_backend, 'SNAPSHOT_DIR', str(snapshot))
+
+    first = connection.run_query(QUERY, "статусы", use_cache=True)
+    second = connection.run_query(QUERY, "статусы", use_cache=True)
+    assert _cache_hits(2) == [False, True]
+    pd.testing.assert_frame_equal(first, second, check_categorical=False)
+
+    # Без приведения типов - другой ключ, результат не берется из кэша compact=True
+    connection.run_query(QUERY, "статусы", use_cache=True, compact=False)
+    assert _cache_hits(1) == [False]
+
+    # Новый файл в снимке меняет версию данных
+    flights = pd.read_parquet(snapshot / 'flights').head(10)
+    flights.to_parquet(snapshot / 'flights' / 'part-extra.parquet', index=False)
+    connection.close_pool()
+    third = connection.run_query(QUERY, "статусы", use_cache=True)
+    assert _cache_hits(1) == [False]
+    assert third['flights'].sum() == first['flights'].sum() + 10
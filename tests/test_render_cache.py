@@ -0,0 +1,97 @@
+"""
+Кэш отрисованных графиков: ключ по данным, стилю и коду функции отрисовки,
+поиск готового файла и удаление записи
+"""
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import render_cache  # noqa: E402
+
+STYLE = {'style': 'seaborn-v0_8', 'dpi': 300}
+
+
+def render_bars(df):
+    return len(df)
+
+
+def render_pie(df):
+    return -len(df)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'status': ['On Time', 'Delayed'], 'count': [10, 3]})
+
+
+def test_key_depends_on_data_style_and_renderer(df):
+    key = render_cache.render_key(df, STYLE, render_bars)
+    assert key == render_cache.render_key(df.copy(), dict(STYLE), render_bars)
+    assert key != render_cache.render_key(df.assign(count=[10, 4]), STYLE, render_bars)
+    assert key != render_cache.render_key(df.rename(columns={'count': 'flights'}), STYLE, render_bars)
+    assert key != render_cache.render_key(df, {**STYLE, 'dpi': 150}, render_bars)
+    assert key != render_cache.render_key(df, STYLE, render_pie)
+    # Пустой результат тоже дает ключ (по колонкам и стилю)
+    assert render_cache.render_key(df.head(0), STYLE) != render_cache.render_key(df.head(0)[['status']], STYLE)
+
+
+def test_lookup_remember_and_invalidate(df, tmp_path):
+    charts_dir = str(tmp_path)
+    key = render_cache.render_key(df, STYLE, render_bars)
+    manifest = render_cache.load_manifest(charts_dir)
+    assert manifest == {}
+    assert render_cache.lookup(manifest, charts_dir, 'bars', key) is None
+
+    (tmp_path / 'bars.png').write_bytes(b'png')
+    render_cache.remember(manifest, 'bars', key, 'bars.png')
+    render_cache.save_manifest(charts_dir, manifest)
+
+    manifest = render_cache.load_manifest(charts_dir)
+    assert render_cache.lookup(manifest, charts_dir, 'bars', key) == 'bars.png'
+    # Другие данные или удаленный файл - перерисовка
+    assert render_cache.lookup(manifest, charts_dir, 'bars', 'other') is None
+    (tmp_path / 'bars.png').unlink()
+    assert render_cache.lookup(manifest, charts_dir, 'bars', key) is None
+
+
+def test_forget_removes_file_and_entry(df, tmp_path):
+    charts_dir = str(tmp_path)
+    manifest = {}
+    (tmp_path / 'bars.png').write_bytes(b'png')
+    render_cache.remember(manifest, 'bars', 'key', 'bars.png')
+
+    assert render_cache.forget(manifest, charts_dir, 'bars') == 'bars.png'
+    assert manifest == {}
+    assert not (tmp_path / 'bars.png').exists()
+    assert render_cache.forget(manifest, charts_dir, 'bars') is None
+
+
+def test_broken_manifest_is_ignored(tmp_path):
+    (tmp_path / render_cache.MANIFEST_FILE).write_text('{broken', encoding='utf-8')
+    assert render_cache.load_manifest(str(tmp_path)) == {}
+
+
+def test_create_visualizations_skips_unchanged_charts(tmp_path, monkeypatch):
+    import importlib
+    pytest.importorskip('matplotlib')
+    pytest.importorskip('psycopg2')
+    charts = importlib.import_module('import')
+    monkeypatch.setattr(charts, 'CHARTS_DIR', str(tmp_path))
+    frames = {'status_distribution': pd.DataFrame({'status': ['On Time', 'Delayed'], 'count_flights': [10, 3],
+                                                   'percentage': [76.9, 23.1]})}
+
+    charts.create_visualizations(frames=frames, use_cache=True)
+    entry = render_cache.load_manifest(str(tmp_path))['status_distribution']
+    png = tmp_path / entry['file']
+    mtime = png.stat().st_mtime_ns
+
+    # Те же данные - файл не перерисовывается
+    charts.create_visualizations(frames=frames, use_cache=True)
+    assert png.stat().st_mtime_ns == mtime
+    assert render_cache.load_manifest(str(tmp_path))['status_distribution'] == entry
+
+    # Пустой результат - прежний график удаляется
+    charts.create_visualizations(frames={'status_distribution': frames['status_distribution'].head(0)},
+                                 use_cache=True)
+    assert not png.exists()
+    assert 'status_distribution' not in render_cache.load_manifest(str(tmp_path))
@@ -0,0 +1,114 @@
+"""
+ReportFilter: параметры запросов и условия flight_filter / booking_filter
+
+Условия проверяются на синтетическом снимке (DuckDB) против того же отбора в pandas.
+"""
+from datetime import date
+
+import pytest
+
+from report_filter import ReportFilter, flight_filter, booking_filter
+
+pd = pytest.importorskip('pandas')
+
+
+def test_empty_filter_params_are_null():
+    report_filter = ReportFilter()
+    assert report_filter.is_empty
+    assert report_filter.params() == {'date_from': None, 'date_to': None, 'airlines': None,
+                                       'airports': None, 'countries': None}
+    assert report_filter.describe() == "вся история, без фильтров"
+
+
+def test_params_and_describe():
+    report_filter = ReportFilter(date_from=date(2024, 1, 1), airlines=['S7 Airlines'], countries=('Russia',))
+    assert not report_filter.is_empty
+    # Списки хранятся кортежами, в параметры уходят списками
+    assert report_filter.airlines == ('S7 Airlines',)
+    assert report_filter.params() == {'date_from': date(2024, 1, 1), 'date_to': None,
+                                       'airlines': ['S7 Airlines'], 'airports': None, 'countries': ['Russia']}
+    assert report_filter.describe() == "период 2024-01-01 — …; авиакомпании: S7 Airlines; страны: Russia"
+
+
+def test_last_days_includes_today():
+    report_filter = ReportFilter.last_days(7, today=date(2024, 3, 10))
+    assert (report_filter.date_from, report_filter.date_to) == (date(2024, 3, 4), date(2024, 3, 10))
+
+
+def test_reversed_period_is_rejected():
+    with pytest.raises(ValueError):
+        ReportFilter(date_from=date(2024, 2, 1), date_to=date(2024, 1, 1))
+
+
+def _table(snapshot_dir, name):
+    return pd.read_parquet(snapshot_dir / name)
+
+
+def _flight_ids(report_filter):
+    import connection
+    df = connection.run_query(f"SELECT f.flight_id FROM flights f WHERE {flight_filter('f')}",
+                              "test", params=report_filter.params())
+    return set(df['flight_id'])
+
+
+def _expected_flight_ids(snapshot_dir, report_filter):
+    flights = _table(snapshot_dir, 'flights')
+    mask = pd.Series(True, index=flights.index)
+    departure = pd.to_datetime(flights['scheduled_departure'])
+    if report_filter.date_from:
+        mask &= departure >= pd.Timestamp(report_filter.date_from)
+    if report_filter.date_to:
+        mask &= departure < pd.Timestamp(report_filter.date_to) + pd.Timedelta(days=1)
+    if report_filter.airlines:
+        airlines = _table(snapshot_dir, 'airline')
+        ids = airlines.loc[airlines['airline_name'].isin(report_filter.airlines), 'airline_id']
+        mask &= flights['airline_id'].isin(ids)
+    if report_filter.airports:
+        airports = _table(snapshot_dir, 'airport')
+        ids = airports.loc[airports['airport_name'].isin(report_filter.airports), 'airport_id']
+        mask &= flights['departure_airport_id'].isin(ids) | flights['arrival_airport_id'].isin(ids)
+    return set(flights.loc[mask, 'flight_id'])
+
+
+def _filters(snapshot_dir):
+    airlines = _table(snapshot_dir, 'airline')['airline_name']
+    airports = _table(snapshot_dir, 'airport')['airport_name']
+    return [
+        ReportFilter(),
+        ReportFilter(date_from=date(2024, 3, 1), date_to=date(2024, 8, 31)),
+        ReportFilter(airlines=tuple(airlines[:2])),
+        ReportFilter(airports=(airports.iloc[0],)),
+        ReportFilter(date_to=date(2024, 6, 30), airlines=(airlines.iloc[0],), airports=tuple(airports[:3])),
+    ]
+
+
+def test_flight_filter_matches_pandas(duckdb_snapshot):
+    for report_filter in _filters(duckdb_snapshot):
+        expected = _expected_flight_ids(duckdb_snapshot, report_filter)
+        assert expected, report_filter
+        assert _flight_ids(report_filter) == expected, report_filter
+
+
+def test_booking_filter_with_and_without_passengers_join(duckdb_snapshot):
+    import connection
+    report_filter = ReportFilter(date_from=date(2024, 2, 1), date_to=date(2024, 10, 31),
+                                 countries=('Russia', 'Germany'), airports=tuple(
+                                     _table(duckdb_snapshot, 'airport')['airport_name'][:5]))
+    joined = connection.run_query(f"""
+        SELECT b.booking_id, bf.flight_id
+        FROM booking b
+        JOIN passengers p ON b.passenger_id = p.passenger_id
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        WHERE {booking_filter()}""", "test", params=report_filter.params(), compact=False)
+    subquery = connection.run_query(f"""
+        SELECT b.booking_id, bf.flight_id
+        FROM booking b
+        JOIN booking_flight bf ON b.booking_id = bf.booking_id
+        WHERE {booking_filter(passenger=None)}""", "test", params=report_filter.params(), compact=False)
+
+    assert len(joined) > 0
+    pd.testing.assert_frame_equal(joined.sort_values(['booking_id', 'flight_id'], ignore_index=True),
+                                  subquery.sort_values(['booking_id', 'flight_id'], ignore_index=True))
+    # Сегменты ограничены рейсами выбранных аэропортов (без учета периода рейсов)
+    scope = ReportFilter(airports=report_filter.airports)
+    assert set(joined['flight_id']) <= _expected_flight_ids(duckdb_snapshot, scope)
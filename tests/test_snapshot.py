@@ -0,0 +1,129 @@
+"""
+Снимок таблиц (snapshot.py): партиции по месяцам, продолжение прерванной выгрузки
+и выгрузка таблицы одним проходом
+
+COPY из PostgreSQL заменяется пачками из синтетического снимка, отсортированными
+так же, как в запросе выгрузки (по месяцу, пустые даты - последними).
+"""
+import contextlib
+import json
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+pytest.importorskip('psycopg2')
+
+import snapshot  # noqa: E402
+
+RUN_ID = 'test-run'
+
+
+def test_month_partitions():
+    values = pd.Series([pd.Timestamp('2024-01-31 23:59'), None, pd.Timestamp('2024-12-01')])
+    assert snapshot.month_partitions(values).tolist() == ['month=2024-01', snapshot.NULL_PARTITION, 'month=2024-12']
+
+
+def _state(path, **state):
+    (path / snapshot.STATE_FILE).write_text(json.dumps(state), encoding='utf-8')
+
+
+def test_new_run_when_there_is_no_state(tmp_path):
+    state, done = snapshot._resume_state(str(tmp_path), ['flights', 'booking'])
+    assert done == [] and state['tables'] == {} and state['finished_at'] is None
+    # Состояние нового запуска сохраняется сразу
+    assert snapshot._load_state(str(tmp_path))['run_id'] == state['run_id']
+
+
+def test_unfinished_run_is_resumed(tmp_path):
+    _state(tmp_path, run_id='old', started_at='2024-01-01T00:00:00', finished_at=None,
+           tables={'airline': {'rows': 1}, 'flights': {'rows': 2}})
+    state, done = snapshot._resume_state(str(tmp_path), ['flights', 'booking', 'airline'])
+    assert state['run_id'] == 'old'
+    assert done == ['flights', 'airline']
+
+
+@pytest.mark.parametrize('finished_at, restart', [('2024-01-01T01:00:00', False), (None, True)])
+def test_finished_run_or_restart_starts_over(tmp_path, finished_at, restart):
+    _state(tmp_path, run_id='old', started_at='2024-01-01T00:00:00', finished_at=finished_at,
+           tables={'flights': {'rows': 2}})
+    state, done = snapshot._resume_state(str(tmp_path), ['flights'], restart=restart)
+    assert state['run_id'] != 'old'
+    assert done == [] and state['tables'] == {}
+
+
+@pytest.fixture
+def fake_copy(monkeypatch):
+    """export_table читает таблицу из DataFrame вместо COPY; возвращает словарь {таблица: DataFrame}"""
+    sources = {}
+
+    def column_types(conn, table):
+        df = sources[table]
+        dtypes = {name: 'Int64' if pd.api.types.is_integer_dtype(df[name]) else 'object'
+                  for name in df.columns if not pd.api.types.is_datetime64_any_dtype(df[name])}
+        parse_dates = [name for name in df.columns if name not in dtypes]
+        return list(df.columns), dtypes, parse_dates
+
+    def copy_chunks(conn, sql, columns, dtypes, parse_dates, chunk_rows):
+        table = sql.split(' FROM ')[1].split()[0].rstrip(')')
+        df = sources[table]
+        column = snapshot.SNAPSHOT_TABLES[table]
+        if column is not None:
+            assert f"ORDER BY date_trunc('month', {column}) NULLS LAST" in sql
+            month = df[column].dt.to_period('M')
+            df = df.assign(_month=month).sort_values('_month', kind='mergesort', na_position='last')
+            df = df.drop(columns='_month')
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].astype(dtypes).reset_index(drop=True)
+
+    monkeypatch.setattr(snapshot, 'get_connection', lambda: contextlib.nullcontext(None))
+    monkeypatch.setattr(snapshot, '_column_types', column_types)
+    monkeypatch.setattr(snapshot, 'copy_chunks', copy_chunks)
+    return sources
+
+
+def _read(path):
+    return pd.read_parquet(path)
+
+
+def test_export_table_partitions_by_month(fake_copy, snapshot_dir, tmp_path):
+    flights = _read(snapshot_dir / 'flights')
+    flights['scheduled_departure'] = pd.to_datetime(flights['scheduled_departure'])
+    # Рейс без даты вылета попадает в NULL_PARTITION
+    flights.loc[0, 'scheduled_departure'] = pd.NaT
+    fake_copy['flights'] = flights
+
+    output = tmp_path / 'out'
+    stale = output / 'flights' / 'month=1999-01'
+    stale.mkdir(parents=True)
+    (stale / 'part-00000.parquet').write_bytes(b'old')
+
+    stats = snapshot.export_table('flights', str(output), RUN_ID, chunk_rows=700)
+    months = flights['scheduled_departure'].dt.strftime('month=%Y-%m').fillna(snapshot.NULL_PARTITION)
+    partitions = sorted(path.name for path in (output / 'flights').iterdir())
+    assert partitions == sorted(months.unique())
+    assert stats['rows'] == len(flights) and stats['partitions'] == months.nunique()
+    assert not stale.exists()
+
+    for partition in partitions:
+        assert (output / 'flights' / partition / snapshot.SUCCESS_FILE).read_text(encoding='utf-8') == RUN_ID
+        part = _read(output / 'flights' / partition)
+        assert set(part['flight_id']) == set(flights.loc[months == partition, 'flight_id'])
+
+    # Повторная выгрузка подменяет партиции целиком, без дублей
+    snapshot.export_table('flights', str(output), RUN_ID, chunk_rows=5000)
+    assert len(_read(output / 'flights')) == len(flights)
+
+
+def test_export_empty_table(fake_copy, tmp_path):
+    fake_copy['booking'] = pd.DataFrame({'booking_id': pd.Series(dtype='int64'),
+                                         'created_at': pd.Series(dtype='datetime64[ns]')})
+    fake_copy['airline'] = pd.DataFrame({'airline_id': pd.Series(dtype='int64'),
+                                         'airline_name': pd.Series(dtype=object)})
+
+    booking = snapshot.export_table('booking', str(tmp_path), RUN_ID)
+    airline = snapshot.export_table('airline', str(tmp_path), RUN_ID)
+    assert booking['rows'] == airline['rows'] == 0
+    # Пустая таблица остается в снимке: один файл со схемой
+    assert [path.name for path in (tmp_path / 'booking').iterdir()] == [snapshot.NULL_PARTITION]
+    assert list(_read(tmp_path / 'airline').columns) == ['airline_id', 'airline_name']
@@ -0,0 +1,108 @@
+import cProfile
+import fnmatch
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# JSON lines с каждым завершенным этапом (если задан путь)
+TRACE_FILE = os.environ.get('AIRPORT_TRACE_FILE')
+# Шаблон имени этапа для cProfile (например 'report:export_excel' или 'chart:*:render')
+PROFILE_STAGE = os.environ.get('AIRPORT_PROFILE_STAGE')
+PROFILE_DIR = os.environ.get('AIRPORT_PROFILE_DIR', 'profiles')
+
+# Завершенные этапы: имя, время, строки, байты, изменение памяти
+SPANS = []
+_spans_lock = threading.Lock()
+
+
+def current_rss_mb():
+    """Текущий объем памяти процесса в MB (None, если измерить нельзя)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def record(name, seconds, rows=None, bytes_written=None, memory_delta_mb=None):
+    """Сохраняет замер этапа, выполненного вне span (например, в другом процессе)"""
+    entry = {
+        'name': name,
+        'seconds': seconds,
+        'rows': rows,
+        'bytes': bytes_written,
+        'memory_delta_mb': memory_delta_mb,
+        'finished_at': datetime.now().isoformat(timespec='milliseconds'),
+    }
+    with _spans_lock:
+        SPANS.append(entry)
+        if TRACE_FILE:
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return entry
+
+
+@contextmanager
+def span(name):
+    """
+    Замеряет этап: время, изменение памяти и (если заданы внутри блока) строки и байты
+
+    Пример:
+        with span('report:export_excel') as stage:
+            ...
+            stage['rows'] = len(df)
+            stage['bytes'] = os.path.getsize(path)
+
+    Если имя этапа подходит под AIRPORT_PROFILE_STAGE, этап профилируется cProfile,
+    результат сохраняется в AIRPORT_PROFILE_DIR/<этап>.prof.
+    """
+    stage = {'rows': None, 'bytes': None}
+    profiler = None
+    if PROFILE_STAGE and fnmatch.fnmatch(name, PROFILE_STAGE):
+        profiler = cProfile.Profile()
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield stage
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        rss_after = current_rss_mb()
+        delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        record(name, elapsed, stage['rows'], stage['bytes'], delta)
+
+        if profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_path = os.path.join(PROFILE_DIR, f"{name.replace(':', '_').replace('*', '_')}.prof")
+            profiler.dump_stats(profile_path)
+            print(f"🔬 Профиль этапа '{name}' сохранен: {profile_path}")
+
+
+def print_trace_summary():
+    """Выводит сводную таблицу по этапам"""
+    if not SPANS:
+        return
+
+    print("\n🧭 ЭТАПЫ ВЫПОЛНЕНИЯ:")
+    print(f"   {'Этап':<40} {'Время (с)':>10} {'Строк':>10} {'Записано KB':>12} {'Память MB':>10}")
+    for entry in SPANS:
+        rows = entry['rows'] if entry['rows'] is not None else '—'
+        size = f"{entry['bytes'] / 1024:.1f}" if entry['bytes'] is not None else '—'
+        memory = f"{entry['memory_delta_mb']:+.1f}" if entry['memory_delta_mb'] is not None else '—'
+        print(f"   {entry['name'][:40]:<40} {entry['seconds']:>10.3f} {rows:>10} {size:>12} {memory:>10}")
+    if TRACE_FILE:
+        print(f"   Журнал этапов (JSON lines): {TRACE_FILE}")